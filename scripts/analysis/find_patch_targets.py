@@ -1,87 +1,87 @@
 #!/usr/bin/env python3
-import re
-import subprocess
-import struct
+import os
+import sys
 
-def search_capacity_limits():
+# Add tools directory to path for shared modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'tools'))
+
+from capacity_words import classify
+from firmware_image import FirmwareImage
+from pattern_scanner import ConstantScanner, parse_constant_args
+from strings_extractor import CAPACITY_PATTERNS, search_capacity_strings
+from string_index import StringIndex
+from tracing import span
+
+ELF_PATH = '../../extracted/secondary.elf'
+
+def search_capacity_limits(image):
     """Search for potential capacity limits to patch"""
     
     print("=== SEARCHING FOR PATCH TARGETS ===\n")
     
-    # Get strings from secondary.elf
-    elf_path = '../../extracted/secondary.elf'
-    result = subprocess.run(['strings', elf_path], capture_output=True, text=True)
-    strings_output = result.stdout
-    
-    # Look for capacity-related patterns
-    capacity_patterns = [
-        r'.*[0-9]+\s*[TG]B.*',
-        r'.*[Ll]imit.*[0-9]+.*',
-        r'.*[Mm]ax.*[Cc]apacity.*',
-        r'.*[Ee]xceed.*[Cc]apacity.*',
-        r'.*[Tt]oo.*[Ll]arge.*',
-        r'.*[Dd]rive.*[Ss]ize.*[Ll]imit.*',
-    ]
+    # Single streaming pass over the mapped image with all patterns combined
+    shown = [0] * len(CAPACITY_PATTERNS)
     
     print("Potential capacity/size limits:")
-    for pattern in capacity_patterns:
-        matches = re.findall(pattern, strings_output, re.IGNORECASE)
-        for match in matches[:5]:
-            print(f"  {match.strip()}")
+    with span('find_targets:capacity_strings') as stage:
+        for offset, text, index in search_capacity_strings(image.data):
+            if shown[index] >= 5:
+                continue
+            shown[index] += 1
+            print(f"  0x{offset:08x}  {text.strip()}")
+        stage.add_bytes(len(image))
 
-def find_2tb_constants():
-    """Find 2TB constants in binary"""
+def find_2tb_constants(image, extra_constants=None):
+    """Find every occurrence of the 2TB/32TB constants in one pass"""
     
     print("\n=== SEARCHING FOR 2TB CONSTANTS ===")
     
-    with open('../../extracted/secondary.elf', 'rb') as f:
-        data = f.read()
-    
-    constants = {
-        "2TB_sectors": 4294967296,      # 0x100000000
-        "2TB_binary": 2199023255552,    # 0x20000000000
-        "2TB_decimal": 2000000000000,   # 0x1D1A94A200000
-    }
+    scanner = ConstantScanner(extra_constants)
     
     found_locations = []
-    for name, value in constants.items():
-        pattern = struct.pack('<Q', value) if value > 0xFFFFFFFF else struct.pack('<I', value)
-        offset = data.find(pattern)
-        if offset != -1:
-            found_locations.append((name, value, offset))
-            print(f"Found {name} (0x{value:x}) at offset: 0x{offset:x}")
+    with span('find_targets:constants', constants=len(scanner.constants)) as stage:
+        for hit in scanner.scan(image.data):
+            found_locations.append((hit.name, hit.value, hit.offset))
+            print(f"Found {hit.name} (0x{hit.value:x}, {hit.fmt}) at offset: 0x{hit.offset:x}")
+        stage.add_bytes(len(image))
     
+    print(f"Total constant hits: {len(found_locations)}")
     return found_locations
 
-def search_near_2tb_message():
-    """Search for constants near 2TB error message"""
-    
-    with open('../../extracted/secondary.elf', 'rb') as f:
-        data = f.read()
+def search_near_2tb_message(image):
+    """Rank capacity-valued words of the whole image by distance to the 2TB message"""
     
     target_string = "DPM::discoverDis: >2TB drive: Setting dislocation to 2TB"
-    message_offset = data.find(target_string.encode())
+    
+    # Cached per-image string index; only the first run scans the image
+    with span('find_targets:string_index'), StringIndex.for_image(image) as index:
+        message_offset = index.find(target_string)
     
     if message_offset != -1:
         print(f"\n=== FOUND 2TB ERROR MESSAGE ===")
         print(f"Message at offset: 0x{message_offset:x}")
         
-        # Search nearby for constants
-        search_start = max(0, message_offset - 5000)
-        search_end = min(len(data), message_offset + 5000)
-        search_data = data[search_start:search_end]
+        # One vectorized sweep over every u32/u64 word of the image
+        with span('find_targets:capacity_words') as stage:
+            words = classify(image.data, [message_offset])
+            stage.add_bytes(len(image))
         
-        candidates = [4294967296, 2199023255552]  # Common 2TB values
-        
-        for value in candidates:
-            pattern = struct.pack('<Q', value)
-            pos = search_data.find(pattern)
-            if pos != -1:
-                actual_offset = search_start + pos
-                distance = actual_offset - message_offset
-                print(f"Found 0x{value:x} at 0x{actual_offset:x} (distance: {distance:+d})")
+        for word in words[:10]:
+            distance = word.offset - message_offset
+            print(f"Found 0x{word.value:x} ({word.label}, u{word.width * 8}) at 0x{word.offset:x} "
+                  f"(distance: {distance:+d})")
 
 if __name__ == "__main__":
-    search_capacity_limits()
-    find_2tb_constants()
-    search_near_2tb_message()
+    # Optional extra constants to scan for, e.g. 4TB_bytes=0x40000000000
+    try:
+        extra_constants = parse_constant_args(sys.argv[1:])
+    except ValueError as e:
+        print(f"Error: {e}")
+        print("Usage: python3 find_patch_targets.py [NAME=VALUE ...]")
+        sys.exit(1)
+    
+    # Map secondary.elf once and share it between the scanners
+    with FirmwareImage(ELF_PATH) as image:
+        search_capacity_limits(image)
+        find_2tb_constants(image, extra_constants)
+        search_near_2tb_message(image)
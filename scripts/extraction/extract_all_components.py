@@ -1,20 +1,63 @@
 #!/usr/bin/env python3
 import os
+import sys
 
-def extract_all_drobo_components(filename):
-    """Extract all identified components from Drobo firmware"""
+# Add tools directory to path for shared modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'tools'))
+
+from firmware_image import FirmwareImage
+from offsets import OffsetRegistry
+from extraction_cache import ExtractionCache
+from stream_copy import extract_range
+from tracing import span
+
+# Output file and description for each TDF component in the offsets data
+COMPONENT_OUTPUTS = {
+    'main_vxworks_elf': ("main_vxworks.elf", "Main VxWorks ELF binary"),
+    'secondary_elf': ("secondary.elf", "Secondary ELF binary"),
+    'vxworks_kernel_bin': ("vxworks_kernel.bin", "VxWorks WIND kernel"),
+}
+
+def component_table(image):
+    """(offset, size, output name, description) with exact bounds
+    
+    Component offsets come from the offset set matching the container's
+    TDIH firmware version.
+    """
+    
+    file_size = len(image)
+    offset_set = OffsetRegistry.default().for_image(image)
+    print(f"Offsets for firmware version: {offset_set.version}")
     
-    # Components identified by binwalk analysis
     components = [
-        (556, "main_vxworks.elf", "Main VxWorks ELF binary"),
-        (3158308, "secondary.elf", "Secondary ELF binary"),
-        (16096252, "vxworks_kernel.bin", "VxWorks WIND kernel")
+        (offset,) + COMPONENT_OUTPUTS.get(name, (f"{name}.bin", name))
+        for name, offset in offset_set.components()
     ]
     
-    file_size = os.path.getsize(filename)
+    table = []
+    for i, (offset, output_name, description) in enumerate(components):
+        # Each component ends where the next one starts (or at end of file)
+        end = components[i + 1][0] if i < len(components) - 1 else file_size
+        size = max(0, min(end, file_size) - offset)
+        table.append((offset, size, output_name, description))
+    return table
+
+def extract_all_drobo_components(filename, use_cache=True):
+    """Extract all identified components from Drobo firmware
+    
+    Components of a container seen before are served from the extraction
+    cache (keyed by container SHA-256 and component offset/size).
+    """
     
-    with open(filename, 'rb') as f:
-        for i, (offset, output_name, description) in enumerate(components):
+    cache = ExtractionCache() if use_cache else None
+    
+    with span('extract', file=filename) as stage, FirmwareImage(filename) as image:
+        file_size = len(image)
+        
+        with span('extract:components'):
+            table = component_table(image)
+        
+        for offset, size, output_name, description in table:
             print(f"\nExtracting: {description}")
             print(f"Offset: 0x{offset:x} ({offset})")
             
@@ -22,60 +65,45 @@ def extract_all_drobo_components(filename):
                 print(f"  ⚠ Offset beyond file size, skipping")
                 continue
             
-            f.seek(offset)
-            
-            # Determine size to extract
-            if i < len(components) - 1:
-                next_offset = components[i + 1][0]
-                size = min(next_offset - offset, 50 * 1024 * 1024)  # Max 50MB
-            else:
-                size = min(file_size - offset, 50 * 1024 * 1024)
-            
-            # Extract the data
-            data = f.read(size)
-            
-            # Save to file
-            with open(output_name, 'wb') as out:
-                out.write(data)
+            with span(f"extract:{output_name}", offset=offset) as component:
+                if cache is not None:
+                    extracted, hit = cache.fetch(image, offset, size, output_name)
+                else:
+                    # Stream the component kernel-side; nothing is buffered in Python
+                    extracted, hit = extract_range(image.fileno(), output_name, offset, size), False
+                component.add_bytes(extracted)
+            stage.add_bytes(extracted)
             
-            print(f"  Extracted {len(data)} bytes to {output_name}")
+            source = " (cached)" if hit else ""
+            print(f"  Extracted {extracted} bytes to {output_name}{source}")
             
             # Analyze the extracted data
-            if data[:4] == b'\x7fELF':
+            header = image.read(offset, min(1024, size))
+            if header[:4] == b'\x7fELF':
                 print(f"  ✓ Valid ELF file")
-            elif b'VxWorks' in data[:1024]:
+            elif b'VxWorks' in header:
                 print(f"  ✓ Contains VxWorks signatures")
-            elif b'WIND' in data[:1024]:
+            elif b'WIND' in header:
                 print(f"  ✓ Contains WIND kernel signatures")
             else:
-                print(f"  ? Unknown format, starts with: {data[:8].hex()}")
+                print(f"  ? Unknown format, starts with: {header[:8].hex()}")
 
 if __name__ == "__main__":
     import sys
     import os
     
+    from firmware_paths import resolve_firmware_path
+    
     # Default paths - can be overridden by environment variables
     DEFAULT_FIRMWARE_PATH = os.environ.get('DROBO_FIRMWARE_PATH', '../../firmware')
     
-    def resolve_firmware_path(filename):
-        """Resolve firmware file path using environment variables or defaults"""
-        
-        # If absolute path or relative path that exists, use as-is
-        if os.path.isabs(filename) or os.path.exists(filename):
-            return filename
-        
-        # Try in firmware directory
-        firmware_path = os.path.join(DEFAULT_FIRMWARE_PATH, filename)
-        if os.path.exists(firmware_path):
-            return firmware_path
-        
-        # Return original filename (will cause error later if not found)
-        return filename
+    args = [arg for arg in sys.argv[1:] if arg != '--no-cache']
+    use_cache = len(args) == len(sys.argv) - 1
     
-    if len(sys.argv) > 1:
-        filename = resolve_firmware_path(sys.argv[1])
+    if args:
+        filename = resolve_firmware_path(args[0], [DEFAULT_FIRMWARE_PATH])
     else:
         filename = os.path.join(DEFAULT_FIRMWARE_PATH, 'release.Drobo5D3.4-2-3.tdf')
     
     print(f"Extracting from: {filename}")
-    extract_all_drobo_components(filename)
+    extract_all_drobo_components(filename, use_cache)
@@ -1,91 +1,108 @@
 #!/usr/bin/env python3
-import struct
 import os
+import sys
+
+# Add tools directory to path for shared modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'tools'))
+
+from firmware_image import FirmwareImage
+from elf_parser import ElfFile
+from stream_copy import duplicate_file, extract_range
+from tracing import span
+from tdf_repack import TdihHeader
 
 def parse_tdih_header(data):
     """Parse TDIH header structure"""
     
-    # Extract header fields
-    offset_or_size = struct.unpack('<I', data[0:4])[0]
-    unknown1 = struct.unpack('<I', data[4:8])[0]
-    magic = data[8:12]
-    identifier = struct.unpack('<I', data[12:16])[0]
-    target_name = data[16:32].rstrip(b'\x00').decode('ascii', errors='ignore')
+    header = TdihHeader.parse(data)
     
     print(f"TDIH Header Analysis:")
-    print(f"  Offset/Size: 0x{offset_or_size:x} ({offset_or_size})")
-    print(f"  Unknown1: 0x{unknown1:x}")
-    print(f"  Magic: {magic}")
-    print(f"  Identifier: 0x{identifier:x}")
-    print(f"  Target: {target_name}")
+    print(f"  Offset/Size: 0x{header.payload_offset:x} ({header.payload_offset})")
+    print(f"  Unknown1: 0x{header.unknown1:x}")
+    print(f"  Magic: {header.magic}")
+    print(f"  Identifier: 0x{header.identifier:x}")
+    print(f"  Target: {header.target_name}")
+    print(f"  Unknown2: {header.unknown2.hex()}")
+    print(f"  Firmware: {header.firmware_string}")
+    
+    return header.payload_offset
+
+def payload_size(image, payload_offset):
+    """Exact payload length: the ELF extent if the payload is an ELF, else to end of file"""
     
-    # Look for firmware string
-    fw_string_start = 48  # 0x30
-    fw_string = data[fw_string_start:fw_string_start+32].rstrip(b'\x00').decode('ascii', errors='ignore')
-    print(f"  Firmware: {fw_string}")
+    if payload_offset > len(image):
+        raise ValueError(f"Payload offset 0x{payload_offset:x} is beyond the end of the file "
+                         f"({len(image):,} bytes); truncated or corrupt container?")
     
-    return offset_or_size
+    remaining = len(image) - payload_offset
+    payload = image.view(payload_offset, remaining)
+    try:
+        if payload[:4] == b'\x7fELF':
+            try:
+                return min(ElfFile(payload).extent(), remaining)
+            except ValueError:
+                pass
+        return remaining
+    finally:
+        payload.release()
 
 def extract_tdih_firmware(filename):
-    """Extract VxWorks firmware from TDIH container"""
+    """Extract VxWorks firmware from TDIH container
+    
+    Returns the number of bytes extracted.
+    """
     
-    with open(filename, 'rb') as f:
+    with span('extract_tdih', file=filename) as stage, FirmwareImage(filename) as image:
         # Read and parse header
-        header = f.read(512)
-        payload_offset = parse_tdih_header(header)
+        with span('extract_tdih:header'):
+            header = image.view()
+            try:
+                payload_offset = parse_tdih_header(header)
+            finally:
+                header.release()
         
         print(f"\nExtracting payload from offset: 0x{payload_offset:x}")
         
-        # Extract the VxWorks image starting at the calculated offset
-        f.seek(payload_offset)
-        
-        # Read a reasonable chunk to start with
-        vxworks_data = f.read(10 * 1024 * 1024)  # 10MB should be enough
+        # Stream exactly the payload bytes into the output file
+        with span('extract_tdih:payload', offset=payload_offset) as payload:
+            size = payload_size(image, payload_offset)
+            extracted = extract_range(image.fileno(), 'vxworks_image.bin', payload_offset, size)
+            payload.add_bytes(extracted)
+        stage.add_bytes(extracted)
         
-        # Save the extracted VxWorks image
-        with open('vxworks_image.bin', 'wb') as out:
-            out.write(vxworks_data)
-        
-        print(f"Extracted {len(vxworks_data)} bytes to vxworks_image.bin")
+        print(f"Extracted {extracted} bytes to vxworks_image.bin")
         
         # Check if it's an ELF
-        if vxworks_data[:4] == b'\x7fELF':
+        magic = image.read(payload_offset, min(16, size))
+        if magic[:4] == b'\x7fELF':
             print("✓ Extracted data is a valid ELF file")
             
-            # Also save as ELF for easier analysis
-            with open('vxworks_image.elf', 'wb') as out:
-                out.write(vxworks_data)
+            # Also expose it as .elf for easier analysis; no hard link, so patching
+            # one copy cannot silently modify the other
+            method = duplicate_file('vxworks_image.bin', 'vxworks_image.elf', allow_hardlink=False)
+            print(f"  Created vxworks_image.elf ({method})")
         else:
-            print(f"? Extracted data starts with: {vxworks_data[:16].hex()}")
+            print(f"? Extracted data starts with: {magic.hex()}")
             
-        return vxworks_data
+        return extracted
 
 if __name__ == "__main__":
     import sys
     import os
     
+    from firmware_paths import resolve_firmware_path
+    
     # Default paths - can be overridden by environment variables
     DEFAULT_FIRMWARE_PATH = os.environ.get('DROBO_FIRMWARE_PATH', '../../firmware')
     
-    def resolve_firmware_path(filename):
-        """Resolve firmware file path using environment variables or defaults"""
-        
-        # If absolute path or relative path that exists, use as-is
-        if os.path.isabs(filename) or os.path.exists(filename):
-            return filename
-        
-        # Try in firmware directory
-        firmware_path = os.path.join(DEFAULT_FIRMWARE_PATH, filename)
-        if os.path.exists(firmware_path):
-            return firmware_path
-        
-        # Return original filename (will cause error later if not found)
-        return filename
-    
     if len(sys.argv) > 1:
-        filename = resolve_firmware_path(sys.argv[1])
+        filename = resolve_firmware_path(sys.argv[1], [DEFAULT_FIRMWARE_PATH])
     else:
         filename = os.path.join(DEFAULT_FIRMWARE_PATH, 'release.Drobo5D3.4-2-3.tdf')
     
     print(f"Extracting from: {filename}")
-    extract_tdih_firmware(filename)
+    try:
+        extract_tdih_firmware(filename)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
@@ -1,6 +1,16 @@
 #!/usr/bin/env python3
-import struct
-import shutil
+import os
+import sys
+
+# Add tools directory to path for shared modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'tools'))
+
+from firmware_image import FirmwareImage
+from offsets import DroboOffsets
+from patch_journal import PatchJournal
+from patch_manifest import APPLY, PatchManifest, capacity_manifest
+
+ELF_PATH = '../../extracted/secondary.elf'
 
 def analyze_current_state():
     """Analyze current patch state"""
@@ -8,14 +18,13 @@ def analyze_current_state():
     print("=== CURRENT STATE ANALYSIS ===\n")
     
     locations = [
-        ("bytes_location", 0x65b097),
-        ("sectors_location", 0x65ada8),
+        ("bytes_location", DroboOffsets.CAPACITY_LIMITS.BYTES_BASED),
+        ("sectors_location", DroboOffsets.CAPACITY_LIMITS.SECTORS_BASED),
     ]
     
-    with open('../../extracted/secondary.elf', 'rb') as f:
+    with FirmwareImage(ELF_PATH) as image:
         for name, offset in locations:
-            f.seek(offset)
-            value = struct.unpack('<Q', f.read(8))[0]
+            value = image.u64(offset)
             
             print(f"{name} (0x{offset:x}):")
             print(f"  Current value: 0x{value:x}")
@@ -24,54 +33,42 @@ def analyze_current_state():
             print()
 
 def patch_drobo_2tb_limit(target_tb=32):
-    """Smart patch that adapts to current values"""
+    """Smart patch that adapts to current values
     
-    print(f"=== PATCHING TO {target_tb}TB ===\n")
+    Each location is patched only if it holds a non-zero value below the
+    target; the original bytes are journaled instead of backing up the image.
+    """
     
-    # Backup
-    shutil.copy('../../extracted/secondary.elf', f'../../backups/secondary.elf.backup_{target_tb}tb')
-    print(f"✓ Created backup: secondary.elf.backup_{target_tb}tb")
+    print(f"=== PATCHING TO {target_tb}TB ===\n")
     
-    target_bytes = target_tb * 1024**4
-    target_sectors = target_bytes // 512
+    manifest = capacity_manifest(target_tb)
+    target_bytes, target_sectors = (patch.value for patch in manifest.patches)
     
     print(f"Target: {target_tb}TB")
     print(f"  Bytes: 0x{target_bytes:x}")
     print(f"  Sectors: 0x{target_sectors:x}")
     
-    patches_applied = 0
+    with FirmwareImage(ELF_PATH, writable=True) as image:
+        # Locations are checked independently: one that is zero or already
+        # larger is skipped without holding back the other
+        results = manifest.check(image)
+        pending = [patch for patch, _, state in results if state == APPLY]
+        journal = PatchJournal.for_image(ELF_PATH)
+        if pending:
+            PatchManifest(manifest.name, pending).apply(image, journal)
     
-    with open('../../extracted/secondary.elf', 'r+b') as f:
-        # Location 1: bytes-based
-        f.seek(0x65b097)
-        current_1 = struct.unpack('<Q', f.read(8))[0]
-        
-        print(f"\nLocation 1 (0x65b097):")
-        print(f"  Current: 0x{current_1:x} ({current_1 / (1024**4):.1f} TB)")
-        
-        if current_1 > 0 and current_1 < target_bytes:
-            f.seek(0x65b097)
-            f.write(struct.pack('<Q', target_bytes))
-            print(f"  ✓ Patched to: 0x{target_bytes:x} ({target_tb} TB)")
-            patches_applied += 1
-        else:
-            print(f"  - Skipped (already larger or invalid)")
-        
-        # Location 2: sectors-based  
-        f.seek(0x65ada8)
-        current_2 = struct.unpack('<Q', f.read(8))[0]
-        
-        print(f"\nLocation 2 (0x65ada8):")
-        print(f"  Current: 0x{current_2:x} ({(current_2 * 512) / (1024**4):.1f} TB if sectors)")
-        
-        if current_2 > 0 and current_2 < target_sectors:
-            f.seek(0x65ada8)
-            f.write(struct.pack('<Q', target_sectors))
-            print(f"  ✓ Patched to: 0x{target_sectors:x} ({target_tb} TB)")
+    patches_applied = 0
+    for patch, current, state in results:
+        print(f"\n{patch.field} (0x{patch.offset:x}):")
+        print(f"  Current: 0x{current:x}")
+        if state == APPLY:
+            print(f"  ✓ Patched to: 0x{patch.value:x} ({target_tb} TB)")
             patches_applied += 1
         else:
             print(f"  - Skipped (already larger or invalid)")
     
+    if patches_applied:
+        print(f"\n✓ Journaled original bytes: {journal.path}")
     print(f"\n✓ Applied {patches_applied} patches")
     return patches_applied > 0
 
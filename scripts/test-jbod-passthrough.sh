@@ -232,6 +232,12 @@ case "${1:-main}" in
     "console")
         start_serial_session
         ;;
+    "pipeline")
+        # Non-interactive: pipelined query commands, timestamped into the log
+        shift
+        DROBO_SERIAL_PORT="$SERIAL_PORT" python3 "$(dirname "$0")/../tools/serial_console.py" \
+            --log "$TEST_LOG" "$@"
+        ;;
     "main"|*)
         main
         ;;
@@ -0,0 +1,35 @@
+"""Shared fixtures: the tools are plain scripts, so put tools/ on sys.path"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+
+from offsets import DroboOffsets  # noqa: E402
+from synthetic_firmware import MIN_KERNEL_SIZE, MIN_SECONDARY_SIZE, build_secondary_elf, build_tdf  # noqa: E402
+
+# Smallest images the generator allows keep the suite fast
+TDF_SIZE = DroboOffsets.FIRMWARE.VXWORKS_KERNEL_BIN + MIN_KERNEL_SIZE
+
+
+@pytest.fixture(scope='session')
+def secondary_bytes():
+    return bytes(build_secondary_elf(MIN_SECONDARY_SIZE))
+
+
+@pytest.fixture
+def secondary(tmp_path, secondary_bytes):
+    """Path of a fresh, unpatched synthetic secondary.elf"""
+    path = tmp_path / 'secondary.elf'
+    path.write_bytes(secondary_bytes)
+    return str(path)
+
+
+@pytest.fixture
+def tdf(tmp_path):
+    """Path of a fresh, unpatched synthetic TDF container"""
+    path = tmp_path / 'release.synthetic.tdf'
+    path.write_bytes(build_tdf(TDF_SIZE))
+    return str(path)
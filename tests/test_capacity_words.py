@@ -0,0 +1,51 @@
+import struct
+
+import pytest
+
+import capacity_words
+from capacity_words import DEFAULT_ANCHORS, anchor_offsets, classify
+from firmware_image import FirmwareImage
+from offsets import DroboOffsets
+
+TB = 1024 ** 4
+
+
+def _both(monkeypatch, data, **kwargs):
+    pytest.importorskip('numpy')
+    fast = classify(data, **kwargs)
+    with monkeypatch.context() as patch:
+        patch.setattr(capacity_words, '_numpy', lambda: None)
+        slow = classify(data, **kwargs)
+    return fast, slow
+
+
+@pytest.mark.parametrize('aligned_only', [False, True])
+def test_numpy_and_python_agree(monkeypatch, secondary, aligned_only):
+    with FirmwareImage(secondary) as image:
+        anchors = anchor_offsets(image, DEFAULT_ANCHORS)
+        assert anchors
+        for kwargs in ({}, {'anchors': anchors}):
+            fast, slow = _both(monkeypatch, image.data, aligned_only=aligned_only, **kwargs)
+            assert fast
+            assert fast == slow
+
+
+def test_finds_capacity_limits(secondary):
+    limits = DroboOffsets.CAPACITY_LIMITS
+    with FirmwareImage(secondary) as image:
+        words = {word.offset: word for word in classify(image.data)}
+    assert words[limits.BYTES_BASED].value == 2 * TB
+    assert words[limits.SECTORS_BASED].value == 2 * TB // 512
+    assert words[limits.BYTES_BASED].width == 8
+
+
+def test_unaligned_and_short_buffers(monkeypatch):
+    # 0xff filler: zero bytes next to a planted value would form further capacity words
+    data = bytearray(b'\xff' * 64)
+    struct.pack_into('<Q', data, 3, 16 * TB)
+    struct.pack_into('<I', data, 40, TB // 512)
+    fast, slow = _both(monkeypatch, bytes(data))
+    assert fast == slow
+    assert [(word.offset, word.alignment) for word in fast] == [(40, 0), (3, 3)]
+    for size in range(4):
+        assert _both(monkeypatch, bytes(size)) == ([], [])
@@ -0,0 +1,72 @@
+from collections import OrderedDict
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from lba_cache_sim import SetAssociativeCache  # noqa: E402
+
+
+def reference_hits(lines, ops, sets, ways, policy, write_allocate):
+    """Replay one access at a time: the model the vectorized cache must match"""
+    cache = [OrderedDict() for _ in range(sets)]
+    hits = []
+    for line, op in zip(lines.tolist(), ops.tolist()):
+        entries = cache[line % sets]
+        hit = line in entries
+        hits.append(hit)
+        if hit:
+            if policy == 'lru':
+                entries.move_to_end(line)
+        elif write_allocate or op == 0:
+            if len(entries) == ways:
+                entries.popitem(last=False)
+            entries[line] = True
+    return np.array(hits)
+
+
+def _workload(seed, count, footprint):
+    rng = np.random.default_rng(seed)
+    # A hot set revisited often, with runs of repeats, over a uniform background
+    lines = np.where(rng.random(count) < 0.6, rng.integers(0, footprint // 8, count),
+                     rng.integers(0, footprint, count))
+    repeat = rng.random(count) < 0.2
+    repeat[0] = False
+    lines[repeat] = lines[np.flatnonzero(repeat) - 1]
+    ops = (rng.random(count) < 0.3).astype(np.uint8)
+    return lines.astype(np.int64), ops
+
+
+@pytest.mark.parametrize('policy', ['lru', 'fifo'])
+@pytest.mark.parametrize('write_allocate', [True, False])
+@pytest.mark.parametrize('lines,ways', [(64, 1), (64, 4), (256, 8), (16, 16)])
+def test_matches_reference(policy, write_allocate, lines, ways):
+    trace, ops = _workload(lines * ways, 5000, lines * 4)
+    cache = SetAssociativeCache(lines, ways, policy, write_allocate)
+    # Several batches: set state must carry over between them
+    hits = np.concatenate([cache.access(trace[i:i + 1500], ops[i:i + 1500]) for i in range(0, len(trace), 1500)])
+    expected = reference_hits(trace, ops, cache.sets, ways, policy, write_allocate)
+    assert (hits == expected).all()
+    assert cache.hits == int(expected.sum())
+    assert cache.read_hits == int((expected & (ops == 0)).sum())
+
+
+def test_direct_mapped_policies_agree():
+    # With one way there is no choice of victim
+    trace, ops = _workload(1, 3000, 512)
+    results = [SetAssociativeCache(64, 1, policy).access(trace, ops) for policy in ('lru', 'fifo', 'random')]
+    assert (results[0] == results[1]).all() and (results[0] == results[2]).all()
+
+
+def test_random_is_seeded():
+    trace, ops = _workload(2, 3000, 512)
+    first = SetAssociativeCache(64, 4, 'random', seed=7).access(trace, ops)
+    again = SetAssociativeCache(64, 4, 'random', seed=7).access(trace, ops)
+    assert (first == again).all()
+
+
+def test_rejects_bad_geometry():
+    with pytest.raises(ValueError):
+        SetAssociativeCache(4, 8)
+    with pytest.raises(ValueError):
+        SetAssociativeCache(64, 4, 'mru')
@@ -0,0 +1,74 @@
+import pytest
+
+from firmware_image import FirmwareImage
+from patch_journal import PatchJournal
+from patch_manifest import ALREADY_APPLIED, APPLY, ManifestError, PatchManifest, capacity_manifest
+
+TB = 1024 ** 4
+
+
+def _states(results):
+    return [state for _, _, state in results]
+
+
+def test_apply_undo_redo(secondary):
+    with open(secondary, 'rb') as f:
+        original = f.read()
+    journal = PatchJournal.for_image(secondary)
+
+    with FirmwareImage(secondary, writable=True) as image:
+        assert image.bytes_limit() == 2 * TB
+        assert _states(capacity_manifest(32).apply(image, journal)) == [APPLY, APPLY]
+        assert image.bytes_limit() == 32 * TB
+        assert image.sectors_limit() == 32 * TB // 512
+        patched = image.sha256()
+
+        # Nothing left to do the second time, and nothing journaled
+        assert _states(capacity_manifest(32).apply(image, journal)) == [ALREADY_APPLIED, ALREADY_APPLIED]
+        assert len(PatchJournal.for_image(secondary).entries) == 1
+
+        journal.undo(image)
+        assert image.read(0, len(image)) == original
+        with pytest.raises(ValueError):
+            journal.undo(image)
+
+        journal.redo(image)
+        assert image.sha256() == patched
+        with pytest.raises(ValueError):
+            journal.redo(image)
+
+    # The journal on disk agrees with the one in memory
+    reloaded = PatchJournal.for_image(secondary)
+    assert reloaded.position == 1 and len(reloaded.entries) == 1
+
+
+def test_undo_refuses_modified_image(secondary):
+    journal = PatchJournal.for_image(secondary)
+    with FirmwareImage(secondary, writable=True) as image:
+        capacity_manifest(32).apply(image, journal)
+        image.write_u64(capacity_manifest(32).patches[0].offset, 64 * TB)
+        with pytest.raises(ValueError):
+            journal.undo(image)
+        assert image.bytes_limit() == 64 * TB
+
+
+def test_mismatch_writes_nothing(secondary):
+    with FirmwareImage(secondary, writable=True) as image:
+        capacity_manifest(64).apply(image)
+        before = image.sha256()
+        # 64TB already exceeds the 16TB target, so the precondition fails
+        with pytest.raises(ManifestError):
+            capacity_manifest(16).apply(image, PatchJournal.for_image(secondary))
+        assert image.sha256() == before
+    assert PatchJournal.for_image(secondary).entries == []
+
+
+@pytest.mark.parametrize('entry', [
+    {'field': 'CAPACITY_LIMITS.BYTES_BASED', 'type': 'u8', 'value': 256},
+    {'field': 'CAPACITY_LIMITS.BYTES_BASED', 'type': 'u64', 'value': -1},
+    {'field': 'CAPACITY_LIMITS.BYTES_BASED', 'type': 'u16', 'value': 1, 'expect': [0x10000]},
+    {'field': 'CAPACITY_LIMITS.BYTES_BASED', 'type': 'u64', 'value': 1, 'expect': 'below'},
+])
+def test_from_dict_rejects_out_of_range(entry):
+    with pytest.raises(ManifestError):
+        PatchManifest.from_dict({'name': 'bad', 'patches': [entry]})
@@ -0,0 +1,79 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import perf_log
+from perf_log import AGGREGATES, PerfStore, build_store
+
+
+def _write_log(path, samples=400, seed=0):
+    """Console log with dpm and ham perf blocks, counter resets and gaps"""
+    rng = random.Random(seed)
+    lines = []
+    reads = 0
+    start = datetime(2025, 1, 1)
+    for i in range(samples):
+        stamp = (start + timedelta(seconds=i * 17 + rng.uniform(0, 5))).isoformat(' ', 'milliseconds')
+        reads = 0 if rng.random() < 0.02 else reads + rng.randrange(1000)
+        lines.append(f"{stamp} dpm = DiskPackManager Perf info")
+        lines.append(f"    reads {reads}")
+        lines.append(f"    avgLatencyUs: {rng.uniform(50, 900):.3f}")
+        if rng.random() < 0.5:
+            lines.append(f"    errors={hex(rng.randrange(4))}")
+        if i % 3 == 0:
+            lines.append(f"{stamp} ham = HAManager Perf info")
+            lines.append(f"    queued {rng.randrange(-5, 50)}")
+        lines.append(f"{stamp} unrelated console chatter")
+    path.write_text('\n'.join(lines) + '\n')
+
+
+@pytest.fixture
+def store(tmp_path):
+    log = tmp_path / 'console.log'
+    _write_log(log)
+    path = str(tmp_path / 'perf.dprf')
+    build_store(path, [str(log)])
+    with PerfStore(path) as store:
+        yield store
+
+
+def test_store_contents(store):
+    assert sorted(store.modules) == ['dpm', 'ham']
+    assert store.rows('dpm') == 400
+    assert store.rows('ham') == 134
+    assert sorted(store.counters('dpm')) == ['avgLatencyUs', 'errors', 'reads']
+    first, last = store.time_range('dpm')
+    assert first < last
+
+
+@pytest.mark.parametrize('how', AGGREGATES)
+@pytest.mark.parametrize('window', [60.0, 900.0])
+def test_numpy_and_python_agree(store, monkeypatch, how, window):
+    pytest.importorskip('numpy')
+    queries = [('dpm', 'reads'), ('dpm', 'avgLatencyUs'), ('dpm', 'errors'), ('ham', 'queued')]
+    fast = [store.aggregate(module, counter, window, how) for module, counter in queries]
+    monkeypatch.setattr(perf_log, '_numpy', lambda: None)
+    slow = [store.aggregate(module, counter, window, how) for module, counter in queries]
+    for fast_rows, slow_rows in zip(fast, slow):
+        assert fast_rows
+        assert [start for start, _ in fast_rows] == [start for start, _ in slow_rows]
+        assert [value for _, value in fast_rows] == pytest.approx([value for _, value in slow_rows])
+
+
+def test_time_bounds(store):
+    start, end = store.time_range('dpm')
+    middle = (start + end) / 2
+    rows = store.aggregate('dpm', 'reads', 60.0, 'count', start=middle)
+    assert rows and rows[0][0] >= middle - 60
+    assert sum(count for _, count in rows) < store.rows('dpm')
+
+
+@pytest.mark.parametrize('keep', [0, 8, 24, -8])
+def test_truncated_store(tmp_path, store, keep):
+    with open(store.path, 'rb') as f:
+        data = f.read()
+    truncated = tmp_path / 'truncated.dprf'
+    truncated.write_bytes(data[:keep])
+    with pytest.raises(ValueError):
+        PerfStore(str(truncated))
@@ -0,0 +1,94 @@
+import os
+import subprocess
+import sys
+import zlib
+
+import pytest
+
+from firmware_image import FirmwareImage
+from synthetic_firmware import build_secondary_elf
+from tdf_repack import (container_components, crc32_combine, crc32_splice, crc32_zeros, load_checksums,
+                        read_header, repack)
+
+TDF_REPACK = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools', 'tdf_repack.py')
+
+
+def _secondary_component(path):
+    with FirmwareImage(path) as image:
+        return next(c for c in container_components(image, read_header(image)) if c.name == 'secondary_elf')
+
+
+def _verify(path):
+    return subprocess.run([sys.executable, TDF_REPACK, 'verify', path], capture_output=True, text=True)
+
+
+def _check_output(path, checksums):
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert checksums['size'] == len(data)
+    assert checksums['crc32'] == zlib.crc32(data)
+    for entry in checksums['components']:
+        assert entry['crc32'] == zlib.crc32(data[entry['offset']:entry['offset'] + entry['size']])
+    assert load_checksums(path)['crc32'] == checksums['crc32']
+
+
+@pytest.mark.parametrize('shrink', [0, 0x1234])
+def test_repack_then_verify(tmp_path, tdf, shrink):
+    with open(tdf, 'rb') as f:
+        original = f.read()
+    output = str(tmp_path / 'patched.tdf')
+    replacement = tmp_path / 'secondary.elf'
+    component = _secondary_component(tdf)
+    # A replacement shorter than the slot is zero-padded
+    replacement.write_bytes(build_secondary_elf(component.size - shrink, patched=True))
+
+    checksums, sources = repack(tdf, output, {'secondary.elf': str(replacement)})
+    assert [c.name for c, source in sources if source] == ['secondary_elf']
+    _check_output(output, checksums)
+
+    with open(output, 'rb') as f:
+        data = f.read()
+    assert data[:component.offset] == original[:component.offset]
+    end = component.offset + component.size
+    assert data[end:] == original[end:]
+    assert data[end - shrink:end] == bytes(shrink)
+
+    result = _verify(output)
+    assert result.returncode == 0, result.stdout
+
+
+def test_verify_detects_corruption(tmp_path, tdf):
+    output = str(tmp_path / 'copy.tdf')
+    repack(tdf, output, {})
+    stat = os.stat(output)
+    with open(output, 'r+b') as f:
+        f.seek(0x400000)
+        byte = f.read(1)
+        f.seek(0x400000)
+        f.write(bytes([byte[0] ^ 0xff]))
+    # Keep the sidecar current, so verify really recomputes and compares
+    os.utime(output, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    result = _verify(output)
+    assert result.returncode == 1
+    assert 'secondary_elf' in result.stdout
+
+
+def test_repack_rejects_oversized_replacement(tmp_path, tdf):
+    component = _secondary_component(tdf)
+    replacement = tmp_path / 'secondary.elf'
+    replacement.write_bytes(bytes(component.size + 1))
+    with pytest.raises(ValueError):
+        repack(tdf, str(tmp_path / 'out.tdf'), {'secondary_elf': str(replacement)})
+    assert not (tmp_path / 'out.tdf').exists()
+
+
+def test_crc32_helpers():
+    a, b = b'firmware' * 100, b'\x00' * 333
+    assert crc32_combine(zlib.crc32(a), zlib.crc32(b), len(b)) == zlib.crc32(a + b)
+    assert crc32_zeros(len(b)) == zlib.crc32(b)
+    data = bytearray(a + b + a)
+    new = b'patched!' * 10
+    spliced = crc32_splice(zlib.crc32(data), len(data), 100, len(new), zlib.crc32(data[100:100 + len(new)]),
+                           zlib.crc32(new))
+    data[100:100 + len(new)] = new
+    assert spliced == zlib.crc32(data)
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Benchmark Suite
+=========================
+
+Benchmarks the analyzer, constant scanner, strings extraction, component
+extraction, patching, entropy map and firmware diff on synthetic images from
+synthetic_firmware.py, so it runs anywhere without the real firmware.
+
+Each benchmark reports throughput (MB of image per second for the scanners,
+operations per second for analyze and patch; best of --repeat runs) and peak
+Python heap allocation (tracemalloc, measured in a separate run; pages of the
+memory-mapped images are not counted).
+
+Absolute throughput swings by well over the tolerance between runs on shared
+machines, so it is never compared. Every timed run is bracketed by runs of a
+fixed reference workload (CRC-32 of the image plus a pure-Python loop), and
+the baseline stores each benchmark's median throughput relative to it. The run
+fails if any relative throughput drops, or peak memory grows, beyond
+--tolerance (default 25%) of the baseline.
+
+Usage:
+    python3 benchmark.py [--only NAME,...] [--repeat N] [--tolerance F]
+                         [--baseline FILE] [--update-baseline] [--json FILE]
+
+Examples:
+    python3 benchmark.py
+    python3 benchmark.py --only constants,strings --repeat 10
+    python3 benchmark.py --update-baseline
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from typing import Tuple
+from offsets import DEFAULT_DATA_DIR
+
+DEFAULT_BASELINE = os.path.normpath(os.path.join(DEFAULT_DATA_DIR, 'benchmark-baseline.json'))
+BASELINE_VERSION = 2
+
+DEFAULT_REPEAT = 7
+DEFAULT_TOLERANCE = 0.25
+
+# analyze runs in ~0.1 ms per image; looped to tens of milliseconds per timed run
+ANALYZE_LOOPS = 200
+
+# Iterations of the pure-Python half of the reference workload
+REFERENCE_LOOPS = 200000
+
+# Peak memory growth below this is allocator noise, never a regression
+MEMORY_SLACK = 256 * 1024
+
+# Synthetic images benchmarked (bytes) and their generator seed
+SECONDARY_SIZE = 8 * 1024 * 1024
+TDF_SIZE = 24 * 1024 * 1024
+SEED = 0
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+
+BenchmarkResult = namedtuple('BenchmarkResult', ['name', 'unit', 'seconds', 'rate', 'relative', 'peak_bytes'])
+
+
+class Workspace:
+    """Temporary directory holding the synthetic images"""
+
+    def __init__(self, secondary_size: int = SECONDARY_SIZE, tdf_size: int = TDF_SIZE, seed: int = SEED):
+        from cache import atomic_write
+        from synthetic_firmware import build_secondary_elf, build_tdf
+
+        self.directory = tempfile.mkdtemp(prefix='drobo-bench-')
+        self.secondary = os.path.join(self.directory, 'secondary.elf')
+        self.tdf = os.path.join(self.directory, 'release.synthetic.tdf')
+        self.shifted = os.path.join(self.directory, 'secondary-shifted.elf')
+
+        secondary = build_secondary_elf(secondary_size, seed)
+        atomic_write(self.secondary, secondary)
+        atomic_write(self.tdf, build_tdf(tdf_size, seed))
+        # A "new build": 4 KiB inserted in .text, a few fields rewritten
+        middle = len(secondary) // 2
+        shifted = secondary[:middle] + random.Random(seed).randbytes(4096) + secondary[middle:]
+        shifted[0x100000:0x100010] = bytes(16)
+        atomic_write(self.shifted, shifted)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# Each benchmark is (setup, run, unit): setup(workspace) prepares untimed state
+# before every run, run(state) does the timed work and returns the bytes ('MB')
+# or operations ('ops') processed
+
+def _reference(path):
+    """Fixed workload timed next to every benchmark run to factor out machine load"""
+    import zlib
+    from firmware_image import FirmwareImage
+    with FirmwareImage(path) as image:
+        zlib.crc32(image.data)
+    total = 0
+    for i in range(REFERENCE_LOOPS):
+        total += i & 0xff
+    return total
+
+def _analyze(path):
+    from firmware_analyzer import read_firmware_settings, read_virtual_addresses
+    from firmware_image import FirmwareImage
+    for _ in range(ANALYZE_LOOPS):
+        with FirmwareImage(path) as image:
+            read_firmware_settings(image)
+            read_virtual_addresses(image)
+    return ANALYZE_LOOPS
+
+
+def _constants(path):
+    from firmware_image import FirmwareImage
+    from pattern_scanner import ConstantScanner
+    with FirmwareImage(path) as image:
+        for _ in ConstantScanner().scan(image.data):
+            pass
+        return len(image)
+
+
+def _strings(path):
+    from firmware_image import FirmwareImage
+    from strings_extractor import iter_strings
+    with FirmwareImage(path) as image:
+        for _ in iter_strings(image.data):
+            pass
+        return len(image)
+
+
+def _capacity_strings(path):
+    from firmware_image import FirmwareImage
+    from strings_extractor import search_capacity_strings
+    with FirmwareImage(path) as image:
+        for _ in search_capacity_strings(image.data):
+            pass
+        return len(image)
+
+
+def _extract_setup(workspace):
+    output = workspace.path('extract')
+    shutil.rmtree(output, ignore_errors=True)
+    os.mkdir(output)
+    return workspace.tdf, output
+
+
+def _extract(state):
+    sys.path.insert(0, os.path.join(SCRIPTS_DIR, 'extraction'))
+    try:
+        from extract_all_components import extract_all_drobo_components
+    finally:
+        sys.path.pop(0)
+    tdf, output = state
+    cwd = os.getcwd()
+    os.chdir(output)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            extract_all_drobo_components(tdf, use_cache=False)
+    finally:
+        os.chdir(cwd)
+    return os.path.getsize(tdf)
+
+
+def _patch_setup(workspace):
+    from patch_journal import PatchJournal
+    path = workspace.path('patch.elf')
+    shutil.copyfile(workspace.secondary, path)
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(PatchJournal.for_image(path).path)
+    return path
+
+
+def _patch(path):
+    from firmware_image import FirmwareImage
+    from patch_journal import PatchJournal
+    from patch_manifest import capacity_manifest
+    with FirmwareImage(path, writable=True) as image:
+        capacity_manifest(32).apply(image, PatchJournal.for_image(path))
+    return 1
+
+
+def _entropy(path):
+    from entropy_map import block_stats, merge_regions
+    from firmware_image import FirmwareImage
+    with FirmwareImage(path) as image:
+        merge_regions(block_stats(image.data))
+        return len(image)
+
+
+def _diff(state):
+    from firmware_diff import FirmwareDiff
+    from firmware_image import FirmwareImage
+    old_path, new_path = state
+    with FirmwareImage(old_path) as old, FirmwareImage(new_path) as new:
+        FirmwareDiff.compute(old.data, new.data)
+        return len(new)
+
+
+BENCHMARKS = {
+    'analyze': (lambda ws: ws.secondary, _analyze, 'ops'),
+    'constants': (lambda ws: ws.secondary, _constants, 'MB'),
+    'strings': (lambda ws: ws.secondary, _strings, 'MB'),
+    'capacity-strings': (lambda ws: ws.secondary, _capacity_strings, 'MB'),
+    'extract': (_extract_setup, _extract, 'MB'),
+    'patch': (_patch_setup, _patch, 'ops'),
+    'entropy': (lambda ws: ws.tdf, _entropy, 'MB'),
+    'diff': (lambda ws: (ws.secondary, ws.shifted), _diff, 'MB'),
+}
+
+
+def _timed(run, state) -> Tuple[float, int]:
+    # As in timeit: collector pauses are noise, not the code under test
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        amount = run(state)
+        return time.perf_counter() - start, amount
+    finally:
+        gc.enable()
+
+
+def run_benchmark(name: str, workspace: Workspace, repeat: int = DEFAULT_REPEAT) -> BenchmarkResult:
+    """Best-of-repeat throughput, median throughput relative to the reference workload, and peak heap"""
+    setup, run, unit = BENCHMARKS[name]
+
+    # Warm-up run: imports, page cache, compiled regexes
+    run(setup(workspace))
+    _reference(workspace.secondary)
+
+    best = None
+    amount = 0
+    ratios = []
+    before, _ = _timed(_reference, workspace.secondary)
+    for _ in range(repeat):
+        state = setup(workspace)
+        elapsed, amount = _timed(run, state)
+        best = elapsed if best is None else min(best, elapsed)
+        # Each run is bracketed by reference runs, so both see the same machine load
+        after, _ = _timed(_reference, workspace.secondary)
+        ratios.append((before + after) / 2 / elapsed)
+        before = after
+
+    # Separate run for memory: tracemalloc slows allocation-heavy code down
+    import tracemalloc
+    state = setup(workspace)
+    tracemalloc.start()
+    try:
+        run(state)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    amount = amount / (1024 * 1024) if unit == 'MB' else amount
+    # Work done in the time the reference workload takes: machine speed cancels
+    # out, and the median shrugs off runs hit by a burst of load
+    return BenchmarkResult(name, unit, best, amount / max(best, 1e-9), amount * statistics.median(ratios), peak)
+
+
+def compare(results, baseline, tolerance: float = DEFAULT_TOLERANCE):
+    """(result, baseline entry or None, list of regressions) for every result"""
+    entries = baseline.get('results', {}) if baseline else {}
+    rows = []
+    for result in results:
+        entry = entries.get(result.name)
+        problems = []
+        if entry:
+            if result.relative < entry['relative'] * (1 - tolerance):
+                problems.append('throughput')
+            if result.peak_bytes > entry['peak_bytes'] * (1 + tolerance) + MEMORY_SLACK:
+                problems.append('memory')
+        rows.append((result, entry, problems))
+    return rows
+
+
+def _images_info():
+    return {'secondary_size': SECONDARY_SIZE, 'tdf_size': TDF_SIZE, 'seed': SEED}
+
+
+def load_baseline(path: str):
+    try:
+        with open(path, 'r') as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        return None
+    if baseline.get('version') != BASELINE_VERSION:
+        raise ValueError(f"Unsupported baseline version in {path}")
+    if baseline.get('images') != _images_info():
+        raise ValueError(f"Baseline {path} was recorded on different synthetic images")
+    return baseline
+
+
+def results_document(results, rates: bool = True):
+    """JSON document of results; baselines leave out the absolute rates, which are never compared"""
+    import platform
+    entries = {}
+    for r in results:
+        entries[r.name] = {'relative': round(r.relative, 4), 'peak_bytes': r.peak_bytes}
+        if rates:
+            entries[r.name].update(rate=round(r.rate, 1), unit=r.unit + '/s')
+    return {
+        'version': BASELINE_VERSION,
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'processor': platform.machine()},
+        'images': _images_info(),
+        'results': entries,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the firmware tools on synthetic images')
+    parser.add_argument('--only', help=f"comma-separated benchmarks (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='timed runs per benchmark (best is kept)')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help=f'allowed regression as a fraction (default: {DEFAULT_TOLERANCE})')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON file')
+    parser.add_argument('--update-baseline', action='store_true', help='store these results as the baseline')
+    parser.add_argument('--json', metavar='FILE', help='also write the results to FILE')
+    args = parser.parse_args()
+
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print(f"Error: unknown benchmark(s): {', '.join(unknown)}")
+        sys.exit(1)
+
+    try:
+        baseline = None if args.update_baseline else load_baseline(args.baseline)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    from cache import atomic_write
+
+    print(f"Generating synthetic images ({SECONDARY_SIZE >> 20} MB secondary.elf, {TDF_SIZE >> 20} MB .tdf)...")
+    results = []
+    with Workspace() as workspace:
+        print(f"{'benchmark':<18} {'rate':>15} {'relative':>10} {'peak KiB':>10} {'baseline':>10} {'change':>8}")
+        for name in names:
+            result = run_benchmark(name, workspace, args.repeat)
+            results.append(result)
+            (_, entry, problems), = compare([result], baseline, args.tolerance)
+            if entry:
+                change = f"{100.0 * (result.relative / entry['relative'] - 1):+.0f}%"
+                base = f"{entry['relative']:10.4g}"
+            else:
+                change, base = '', f"{'-':>10}"
+            flag = f"  ✗ {', '.join(problems)}" if problems else ''
+            rate = f"{result.rate:.1f} {result.unit}/s"
+            print(f"{name:<18} {rate:>15} {result.relative:10.4g} {result.peak_bytes / 1024:10.0f} "
+                  f"{base} {change:>8}{flag}")
+
+    if args.json:
+        atomic_write(args.json, json.dumps(results_document(results), indent=2).encode('utf-8'))
+    if args.update_baseline:
+        document = results_document(results, rates=False)
+        atomic_write(args.baseline, (json.dumps(document, indent=2) + '\n').encode('utf-8'))
+        print(f"\nBaseline written to {args.baseline}")
+        return
+
+    if baseline is None:
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to record one")
+        return
+    regressions = [row for row in compare(results, baseline, args.tolerance) if row[2]]
+    if regressions:
+        print(f"\n✗ {len(regressions)} benchmark(s) regressed beyond {args.tolerance:.0%} of the baseline")
+        sys.exit(1)
+    print(f"\n✓ No regressions beyond {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Cache Helpers
+=======================
+
+Location and atomic-write helpers for on-disk caches derived from firmware
+images (string indexes, cross-reference indexes and similar). Cache files are
+keyed by image SHA-256, so they never need invalidating by hand.
+
+Environment Variables:
+    DROBO_CACHE_PATH - Cache root directory (default: ~/.cache/drobo-fw)
+"""
+
+import os
+import stat
+import tempfile
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    'DROBO_CACHE_PATH',
+    os.path.join(os.path.expanduser('~'), '.cache', 'drobo-fw'),
+)
+
+
+def cache_path(category: str, name: str) -> str:
+    """Path of a cache file, creating its category directory if needed"""
+    directory = os.path.join(DEFAULT_CACHE_PATH, category)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name)
+
+
+def fsync_directory(directory: str):
+    """Flush directory metadata so a completed rename survives a crash"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def new_file_mode(path: str) -> int:
+    """Permissions for a file replacing path: the existing file's, else 0666 less the umask
+
+    mkstemp creates files 0600, which a rename would otherwise keep.
+    """
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def atomic_write(path: str, data: bytes):
+    """Write data to path via a fsynced temporary file and rename"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            os.fchmod(f.fileno(), new_file_mode(path))
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    fsync_directory(directory)
@@ -23,33 +23,11 @@ Examples:
 
 import sys
 import os
-import struct
-import shutil
-from offsets import DroboOffsets
-
-# Default paths - can be overridden by environment variables
-DEFAULT_EXTRACTED_PATH = os.environ.get('DROBO_EXTRACTED_PATH', '../extracted')
-DEFAULT_FIRMWARE_PATH = os.environ.get('DROBO_FIRMWARE_PATH', '../firmware')
-
-def resolve_firmware_path(filename):
-    """Resolve firmware file path using environment variables or defaults"""
-    
-    # If absolute path or relative path that exists, use as-is
-    if os.path.isabs(filename) or os.path.exists(filename):
-        return filename
-    
-    # Try in extracted directory
-    extracted_path = os.path.join(DEFAULT_EXTRACTED_PATH, filename)
-    if os.path.exists(extracted_path):
-        return extracted_path
-    
-    # Try in firmware directory
-    firmware_path = os.path.join(DEFAULT_FIRMWARE_PATH, filename)
-    if os.path.exists(firmware_path):
-        return firmware_path
-    
-    # Return original filename (will cause error later if not found)
-    return filename
+from firmware_image import FirmwareImage
+from firmware_paths import DEFAULT_EXTRACTED_PATH, DEFAULT_FIRMWARE_PATH, resolve_firmware_path
+from patch_journal import PatchJournal
+from patch_manifest import APPLY, ManifestError, capacity_manifest
+from tracing import span
 
 def patch_capacity_limit(filename, new_limit_tb=32):
     """Patch 2TB capacity limits to specified TB value"""
@@ -66,49 +44,46 @@ def patch_capacity_limit(filename, new_limit_tb=32):
     print(f"  New bytes limit: {new_bytes:,} (0x{new_bytes:x})")
     print(f"  New sectors limit: {new_sectors:,} (0x{new_sectors:x})")
     
-    # Create backup
-    backup_file = f"{filename}.backup_capacity_patch"
     try:
-        shutil.copy2(filename, backup_file)
-        print(f"  ✓ Created backup: {backup_file}")
-    except Exception as e:
-        print(f"Error creating backup: {e}")
-        return False
-    
-    try:
-        with open(filename, 'r+b') as f:
-            # Patch bytes-based limit
-            f.seek(DroboOffsets.CAPACITY_LIMITS.BYTES_BASED)
-            original_bytes = struct.unpack('<Q', f.read(8))[0]
-            
-            f.seek(DroboOffsets.CAPACITY_LIMITS.BYTES_BASED)
-            f.write(struct.pack('<Q', new_bytes))
-            
-            # Patch sectors-based limit  
-            f.seek(DroboOffsets.CAPACITY_LIMITS.SECTORS_BASED)
-            original_sectors = struct.unpack('<Q', f.read(8))[0]
-            
-            f.seek(DroboOffsets.CAPACITY_LIMITS.SECTORS_BASED)
-            f.write(struct.pack('<Q', new_sectors))
+        journal = PatchJournal.for_image(filename)
         
-        # Verify patches
-        with open(filename, 'rb') as f:
-            f.seek(DroboOffsets.CAPACITY_LIMITS.BYTES_BASED)
-            verify_bytes = struct.unpack('<Q', f.read(8))[0]
+        with span('patch', file=filename, target_tb=new_limit_tb) as stage, \
+                FirmwareImage(filename, writable=True) as image:
+            stage.add_bytes(len(image))
+            original_bytes = image.bytes_limit()
+            original_sectors = image.sectors_limit()
+            
+            # Check both limits, then write and journal them in one pass
+            with span('patch:apply'):
+                results = capacity_manifest(new_limit_tb).apply(image, journal)
+            applied = any(state == APPLY for _, _, state in results)
+            if applied:
+                print(f"  ✓ Journaled original bytes: {journal.path}")
             
-            f.seek(DroboOffsets.CAPACITY_LIMITS.SECTORS_BASED)
-            verify_sectors = struct.unpack('<Q', f.read(8))[0]
+            # Verify patches against the flushed mapping
+            with span('patch:verify'):
+                verify_bytes = image.bytes_limit()
+                verify_sectors = image.sectors_limit()
         
         print(f"  ✓ Patched bytes limit: {original_bytes:,} → {verify_bytes:,}")
         print(f"  ✓ Patched sectors limit: {original_sectors:,} → {verify_sectors:,}")
         
         if verify_bytes == new_bytes and verify_sectors == new_sectors:
             print(f"✓ Successfully patched capacity limits to {new_limit_tb}TB")
+            if applied:
+                print(f"  Undo with: python3 patch_journal.py {filename} undo")
+            else:
+                print("  (already at this limit; nothing written)")
             return True
         else:
             print("✗ Verification failed - patch may not have been applied correctly")
             return False
             
+    except ManifestError as e:
+        print(f"Error: {e}")
+        print(f"  Limits can only be raised; to lower them undo earlier patches: "
+              f"python3 patch_journal.py {filename} undo")
+        return False
     except Exception as e:
         print(f"Error patching file: {e}")
         return False
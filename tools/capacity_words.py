@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Capacity Word Classifier
+==================================
+
+Flags every little-endian 32- or 64-bit word of a firmware image that decodes
+to a plausible drive or pack capacity, and ranks the candidates by their
+distance to capacity-related strings such as "DPM::discoverDis". The 2TB
+limit is the known case; this finds its siblings (other power-of-two or
+decimal sizes, in bytes or 512-byte sectors) in one sweep of the whole image
+instead of a fixed window around one message.
+
+Plausible capacities are 1TB to 256TB in power-of-two steps, as binary
+(TiB) and decimal (TB) sizes, each in bytes and in sectors. Values that fit
+in 32 bits are matched as u32 words, larger ones as u64 words, at every byte
+offset; the alignment of each hit is reported, as aligned words are far more
+likely to be real fields or literal-pool entries.
+
+With NumPy installed the image is viewed as little-endian u32 arrays, one
+zero-copy np.frombuffer view over the mapping per byte phase, and classified
+with vectorized set lookups; u64 words are pairs of adjacent u32 words,
+assembled only where the high half is in range. Without NumPy the values are
+found by the multi-pattern scanner from pattern_scanner.py, with the same
+results.
+
+Usage:
+    python3 capacity_words.py <firmware_file> [--anchor TEXT ...] [--top N] [--aligned]
+                              [--csv FILE]
+
+Examples:
+    python3 capacity_words.py ../extracted/secondary.elf
+    python3 capacity_words.py secondary.elf --aligned --top 50
+    python3 capacity_words.py secondary.elf --anchor "DPM::discoverDis" --anchor ">2TB" --csv capacity.csv
+"""
+
+import argparse
+import csv
+import struct
+import sys
+from collections import namedtuple
+from typing import Dict, List, Sequence
+
+SECTOR_BYTES = 512
+
+# Capacities of 2**0 .. 2**MAX_EXPONENT TB are plausible
+MAX_EXPONENT = 8
+
+# Strings whose neighbourhood ranks a candidate first
+DEFAULT_ANCHORS = ['DPM::discoverDis', '>2TB', 'dislocation', 'capacity']
+
+# Distance reported when the image holds none of the anchors
+NO_ANCHOR = -1
+
+CapacityWord = namedtuple('CapacityWord', [
+    'offset', 'value', 'width', 'alignment', 'label', 'anchor_offset', 'distance'])
+
+
+def capacity_values() -> Dict[int, str]:
+    """Plausible capacity value -> label ("2TiB bytes", "4TB sectors", ...)"""
+    values = {}
+    for exponent in range(MAX_EXPONENT + 1):
+        terabytes = 1 << exponent
+        for unit, size in (('TiB', terabytes << 40), ('TB', terabytes * 10 ** 12)):
+            values.setdefault(size, f"{terabytes}{unit} bytes")
+            values.setdefault(size // SECTOR_BYTES, f"{terabytes}{unit} sectors")
+    return values
+
+
+def _numpy():
+    """NumPy if installed; imported on first use as it costs ~80 ms of startup"""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _scan_numpy(np, data, values: Dict[int, str]):
+    """(offsets, values, widths) of every capacity word, one u32 view per byte phase"""
+    table32 = np.array([v for v in values if v < 1 << 32], dtype=np.uint32)
+    table64 = np.array([v for v in values if v >= 1 << 32], dtype=np.uint64)
+    high_max = int(table64.max()) >> 32
+    found = []
+    for phase in range(min(4, len(data))):
+        count = (len(data) - phase) // 4
+        if not count:
+            continue
+        words = np.frombuffer(data, dtype='<u4', count=count, offset=phase)
+        index = np.flatnonzero(np.isin(words, table32))
+        found.append((index * 4 + phase, words[index].astype(np.uint64), 4))
+        # u64 words at this phase are pairs of adjacent u32 words; only pairs
+        # with a high half of 1..high_max can hold a capacity (0 wraps around)
+        high = words[1:]
+        index = np.flatnonzero(high - 1 < high_max)
+        pairs = words[index].astype(np.uint64) | high[index].astype(np.uint64) << 32
+        match = np.isin(pairs, table64)
+        found.append((index[match] * 4 + phase, pairs[match], 8))
+    if not found:
+        return np.empty(0, np.int64), np.empty(0, np.uint64), np.empty(0, np.uint8)
+    offsets = np.concatenate([column[0] for column in found]).astype(np.int64)
+    hits = np.concatenate([column[1] for column in found])
+    widths = np.concatenate([np.full(len(column[0]), column[2], dtype=np.uint8) for column in found])
+    order = np.argsort(offsets, kind='stable')
+    return offsets[order], hits[order], widths[order]
+
+
+def _scan_python(data, values: Dict[int, str]):
+    from pattern_scanner import MultiPatternScanner
+
+    patterns = {}
+    for value in values:
+        fmt = '<I' if value < 1 << 32 else '<Q'
+        patterns[f"{value}/{fmt}"] = struct.pack(fmt, value)
+    hits = [(hit.offset, int(hit.name.split('/')[0]), len(hit.pattern))
+            for hit in MultiPatternScanner(patterns).scan(data)]
+    return [hit[0] for hit in hits], [hit[1] for hit in hits], [hit[2] for hit in hits]
+
+
+def anchor_offsets(image, anchors: Sequence[str]) -> List[int]:
+    """Sorted image offsets of every occurrence of the anchor strings"""
+    from string_index import StringIndex
+
+    with StringIndex.for_image(image) as index:
+        return sorted({offset for text in anchors for offset, _ in index.substring(text)})
+
+
+def classify(data, anchors: Sequence[int] = (), aligned_only: bool = False) -> List[CapacityWord]:
+    """Capacity words of an image, nearest to an anchor offset first
+
+    Candidates without anchors are ranked aligned first, then by offset.
+    """
+    values = capacity_values()
+    np = _numpy()
+    if np is not None:
+        offsets, hits, widths = _scan_numpy(np, data, values)
+        if aligned_only:
+            keep = offsets % widths == 0
+            offsets, hits, widths = offsets[keep], hits[keep], widths[keep]
+        if anchors:
+            table = np.asarray(anchors, dtype=np.int64)
+            # Nearest of the anchors just below and just above each candidate
+            above = np.searchsorted(table, offsets).clip(0, len(table) - 1)
+            below = (above - 1).clip(0)
+            below_distance = np.abs(offsets - table[below])
+            above_distance = np.abs(offsets - table[above])
+            nearest = table[np.where(above_distance < below_distance, above, below)]
+            distance = np.minimum(below_distance, above_distance)
+        else:
+            nearest = np.full(len(offsets), NO_ANCHOR, dtype=np.int64)
+            distance = np.full(len(offsets), NO_ANCHOR, dtype=np.int64)
+        alignment = offsets % widths
+        order = np.lexsort((offsets, alignment != 0, distance))
+        return [CapacityWord(int(offsets[i]), int(hits[i]), int(widths[i]), int(alignment[i]),
+                             values[int(hits[i])], int(nearest[i]), int(distance[i])) for i in order]
+
+    import bisect
+
+    words = []
+    for offset, value, width in zip(*_scan_python(data, values)):
+        if aligned_only and offset % width:
+            continue
+        anchor, distance = NO_ANCHOR, NO_ANCHOR
+        if anchors:
+            i = bisect.bisect_left(anchors, offset)
+            anchor = min(anchors[max(i - 1, 0):i + 1], key=lambda a: abs(offset - a))
+            distance = abs(offset - anchor)
+        words.append(CapacityWord(offset, value, width, offset % width, values[value], anchor, distance))
+    words.sort(key=lambda w: (w.distance, w.alignment != 0, w.offset))
+    return words
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Classify capacity-valued words of a firmware image')
+    parser.add_argument('firmware', help='firmware image (e.g. secondary.elf)')
+    parser.add_argument('--anchor', action='append', metavar='TEXT',
+                        help=f'rank by distance to this string (repeatable; default: {", ".join(DEFAULT_ANCHORS)})')
+    parser.add_argument('--top', type=int, default=25, help='candidates to print (default: 25, 0 for all)')
+    parser.add_argument('--aligned', action='store_true', help='only naturally aligned words')
+    parser.add_argument('--csv', metavar='FILE', help="write every candidate to FILE ('-' for stdout)")
+    args = parser.parse_args()
+
+    from firmware_image import FirmwareImage
+    from tracing import span
+
+    try:
+        with FirmwareImage(args.firmware) as image:
+            with span('capacity_words:anchors'):
+                anchors = anchor_offsets(image, args.anchor or DEFAULT_ANCHORS)
+            with span('capacity_words:classify', engine='numpy' if _numpy() else 'python') as stage:
+                words = classify(image.data, anchors, args.aligned)
+                stage.add_bytes(len(image))
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if args.csv:
+        out = sys.stdout if args.csv == '-' else open(args.csv, 'w', newline='')
+        try:
+            writer = csv.writer(out)
+            writer.writerow(CapacityWord._fields)
+            writer.writerows(words)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        if args.csv == '-':
+            return
+
+    aligned = sum(1 for word in words if word.alignment == 0)
+    print(f"Capacity words: {len(words)} ({aligned} aligned), {len(anchors)} anchor occurrence(s)")
+    for word in words[:args.top or None]:
+        near = f"{word.distance:>9,} from 0x{word.anchor_offset:08x}" if word.distance != NO_ANCHOR else ''
+        print(f"  0x{word.offset:08x}  u{word.width * 8:<2} {'aligned' if word.alignment == 0 else f'+{word.alignment}':<7} "
+              f"0x{word.value:<14x} {word.label:<16} {near}")
+
+
+if __name__ == "__main__":
+    main()
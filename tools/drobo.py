@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Toolkit
+=================
+
+Single entry point for the firmware tools and scripts. Subcommands are loaded
+lazily: `drobo.py analyze` imports only firmware_analyzer and what it needs,
+not the extraction, patching or JSON machinery of the other tools. Each
+subcommand runs the underlying tool exactly as if it were invoked directly,
+with the remaining arguments.
+
+Startup cost matters because the tools are called thousands of times from
+shell pipelines. `drobo.py startup` measures the load time of every
+subcommand in fresh interpreters and fails if any exceeds the budget over a
+bare `python3 -c pass`.
+
+With --trace FILE the subcommand's stages are traced (see tracing.py) and
+written to FILE as Chrome trace JSON.
+
+Environment Variables:
+    DROBO_STARTUP_BUDGET_MS - Allowed load time over a bare interpreter (default 50)
+
+Usage:
+    python3 drobo.py [--trace FILE] <command> [args ...]
+    python3 drobo.py startup [--runs N] [--budget MS] [command ...]
+    python3 drobo.py --list
+
+Examples:
+    python3 drobo.py analyze ../extracted/secondary.elf
+    python3 drobo.py analyze --batch /data/dumps --jobs 8 > results.ndjson
+    python3 drobo.py patch secondary.elf 64
+    python3 drobo.py --trace extract.json extract release.Drobo5D3.4-2-3.tdf
+    python3 drobo.py startup --runs 20
+"""
+
+import os
+import sys
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(TOOLS_DIR, '..', 'scripts')
+
+# Subcommand -> (script path relative to tools/, description)
+COMMANDS = {
+    'analyze': ('firmware_analyzer.py', 'Read configuration and capacity limits'),
+    'patch': ('capacity_patcher.py', 'Patch the 2TB capacity limits'),
+    'manifest': ('patch_manifest.py', 'Check or apply a declarative patch manifest'),
+    'journal': ('patch_journal.py', 'Show, undo or redo journaled patches'),
+    'header': ('header_generator.py', 'Generate a C header with the offsets'),
+    'bookmarks': ('ghidra_bookmarks.py', 'Print Ghidra bookmark locations'),
+    'strings': ('strings_extractor.py', 'Extract strings from an image'),
+    'string-index': ('string_index.py', 'Build or query the string index'),
+    'xrefs': ('xref_index.py', 'Find code and data referencing a string'),
+    'scan': ('pattern_scanner.py', 'Scan an image for byte patterns and constants'),
+    'capacity-words': ('capacity_words.py', 'Rank capacity-valued words near capacity strings'),
+    'immediates': ('immediate_scanner.py', 'Find code building or comparing capacity constants'),
+    'elf': ('elf_parser.py', 'Show ELF sections and map offsets to addresses'),
+    'regions': ('region_map.py', 'Reverse lookup and annotated hexdump'),
+    'relocate': ('offset_relocator.py', 'Record signatures or relocate offsets'),
+    'diff': ('firmware_diff.py', 'Map regions between two firmware images'),
+    'entropy': ('entropy_map.py', 'Block entropy and byte-histogram map'),
+    'cache': ('extraction_cache.py', 'Inspect or trim the extraction cache'),
+    'offsets': ('offsets.py', 'Print the known offsets'),
+    'synth': ('synthetic_firmware.py', 'Generate synthetic secondary.elf / .tdf images'),
+    'bench': ('benchmark.py', 'Benchmark the tools against the stored baseline'),
+    'trace': ('tracing.py', 'Summarize a Chrome trace written with --trace'),
+    'console': ('serial_console.py', 'Pipeline commands on the serial console'),
+    'fake-drobo': ('fake_drobo.py', 'Serve a fake Drobo console on a local pty'),
+    'perf': ('perf_log.py', 'Build and query perf info time series from console logs'),
+    'lba-trace': ('lba_trace.py', 'Ingest cache tracker dumps into LBA traces'),
+    'cache-sim': ('lba_cache_sim.py', 'Replay LBA traces against cache models'),
+    'repack': ('tdf_repack.py', 'Repack a TDF container with patched components'),
+    'extract': ('../scripts/extraction/extract_all_components.py', 'Extract all TDF components'),
+    'extract-tdih': ('../scripts/extraction/extract_tdih.py', 'Extract the TDIH payload'),
+    'find-targets': ('../scripts/analysis/find_patch_targets.py', 'Search for patch targets'),
+    'ghidra-targets': ('../scripts/analysis/ghidra-analysis-targets.py', 'Generate Ghidra analysis targets'),
+}
+
+DEFAULT_STARTUP_BUDGET_MS = float(os.environ.get('DROBO_STARTUP_BUDGET_MS', '50'))
+DEFAULT_STARTUP_RUNS = 10
+
+def command_path(command):
+    return os.path.normpath(os.path.join(TOOLS_DIR, COMMANDS[command][0]))
+
+def run_command(command, argv, load_only=False):
+    """Run a subcommand's script as __main__ with argv (or only load it)
+
+    The script is run as a module from its own directory so its compiled
+    bytecode is cached in __pycache__ like any import.
+    """
+    import runpy
+
+    path = command_path(command)
+    sys.argv = [path] + list(argv)
+    # Tools import each other from tools/; scripts add it themselves
+    for directory in (TOOLS_DIR, os.path.dirname(path)):
+        if directory not in sys.path:
+            sys.path.insert(0, directory)
+    module = os.path.splitext(os.path.basename(path))[0]
+    runpy.run_module(module, run_name='drobo_load_only' if load_only else '__main__', alter_sys=True)
+
+def measure_startup(command, runs):
+    """Fastest wall time (ms) of a fresh interpreter loading a subcommand"""
+    import subprocess
+    import time
+
+    if command is None:
+        argv = [sys.executable, '-c', 'pass']
+    else:
+        argv = [sys.executable, os.path.abspath(__file__), '--load-only', command]
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(argv, check=True, stdout=subprocess.DEVNULL)
+        elapsed = (time.perf_counter() - start) * 1000.0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def startup_main(argv):
+    """Entry point for the startup budget check"""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='drobo.py startup',
+                                     description='Measure subcommand load time against a budget')
+    parser.add_argument('commands', nargs='*', help='subcommands to measure (default: all)')
+    parser.add_argument('--runs', type=int, default=DEFAULT_STARTUP_RUNS, help='runs per command (fastest is kept)')
+    parser.add_argument('--budget', type=float, default=DEFAULT_STARTUP_BUDGET_MS,
+                        help=f'allowed ms over a bare interpreter (default: {DEFAULT_STARTUP_BUDGET_MS:g})')
+    args = parser.parse_args(argv)
+
+    commands = args.commands or list(COMMANDS)
+    unknown = [c for c in commands if c not in COMMANDS]
+    if unknown:
+        print(f"Error: unknown command(s): {', '.join(unknown)}")
+        sys.exit(1)
+
+    baseline = measure_startup(None, args.runs)
+    print(f"Bare interpreter: {baseline:.1f} ms (budget +{args.budget:g} ms)")
+    over = 0
+    for command in commands:
+        overhead = measure_startup(command, args.runs) - baseline
+        within = overhead <= args.budget
+        over += not within
+        print(f"  {'✓' if within else '✗'} {command:<16} +{overhead:6.1f} ms")
+
+    if over:
+        print(f"\n{over} command(s) over the startup budget")
+        sys.exit(1)
+
+def print_commands():
+    print("Commands:")
+    for command, (_, description) in COMMANDS.items():
+        print(f"  {command:<16} {description}")
+    print(f"  {'startup':<16} Check subcommand load time against the budget")
+
+def main():
+    args = sys.argv[1:]
+    if args and args[0] == '--list':
+        print_commands()
+        return
+
+    load_only = bool(args) and args[0] == '--load-only'
+    if load_only:
+        args = args[1:]
+
+    if len(args) >= 2 and args[0] == '--trace':
+        import tracing
+        tracing.enable(args[1])
+        args = args[2:]
+
+    if not args or (args[0] not in COMMANDS and args[0] != 'startup'):
+        if args:
+            print(f"Error: unknown command '{args[0]}'")
+        print("Usage: python3 drobo.py [--trace FILE] <command> [args ...]")
+        print("       python3 drobo.py startup [--runs N] [--budget MS] [command ...]")
+        print("Examples:")
+        print("  python3 drobo.py analyze ../extracted/secondary.elf")
+        print("  python3 drobo.py patch secondary.elf 64")
+        print("  python3 drobo.py startup --runs 20")
+        print()
+        print_commands()
+        sys.exit(1)
+
+    if args[0] == 'startup':
+        startup_main(args[1:])
+    else:
+        run_command(args[0], args[1:], load_only)
+
+if __name__ == "__main__":
+    main()
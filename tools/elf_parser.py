@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 ELF32 Parser
+======================
+
+Parses the program and section headers of secondary.elf and main_vxworks.elf
+and builds sorted interval tables, so file offsets (as stored in offsets.py)
+and virtual addresses (as used by Ghidra and the running firmware) can be
+translated in both directions in O(log n).
+
+Usage:
+    python3 elf_parser.py <elf_file>
+
+Examples:
+    python3 elf_parser.py ../extracted/secondary.elf
+    python3 elf_parser.py main_vxworks.elf
+"""
+
+import bisect
+import functools
+import os
+import struct
+import sys
+from collections import namedtuple
+from typing import List, Optional
+
+ELF_MAGIC = b'\x7fELF'
+ELFCLASS32 = 1
+ELFDATA2LSB = 1
+ELFDATA2MSB = 2
+
+PT_LOAD = 1
+PF_X = 0x1
+PF_W = 0x2
+PF_R = 0x4
+
+SHT_NOBITS = 8
+SHF_ALLOC = 0x2
+SHF_EXECINSTR = 0x4
+
+SEGMENT_TYPES = {0: 'NULL', 1: 'LOAD', 2: 'DYNAMIC', 3: 'INTERP', 4: 'NOTE', 6: 'PHDR', 7: 'TLS'}
+
+
+class Segment(namedtuple('Segment', ['type', 'offset', 'vaddr', 'paddr', 'filesz', 'memsz', 'flags', 'align'])):
+    """ELF32 program header"""
+    __slots__ = ()
+
+    @property
+    def executable(self) -> bool:
+        return bool(self.flags & PF_X)
+
+    @property
+    def flag_string(self) -> str:
+        return ''.join(c if self.flags & bit else '-' for c, bit in (('R', PF_R), ('W', PF_W), ('X', PF_X)))
+
+
+Section = namedtuple('Section', ['name', 'type', 'flags', 'addr', 'offset', 'size'])
+
+
+class _IntervalTable:
+    """Sorted, non-overlapping [start, end) intervals mapped to a target base"""
+
+    def __init__(self, intervals):
+        # intervals: (start, size, target_start, owner)
+        self._intervals = sorted(i for i in intervals if i[1] > 0)
+        self._starts = [i[0] for i in self._intervals]
+
+    def lookup(self, value: int):
+        position = bisect.bisect_right(self._starts, value) - 1
+        if position < 0:
+            return None
+        start, size, target, owner = self._intervals[position]
+        if value >= start + size:
+            return None
+        return target + (value - start), owner
+
+
+class ElfFile:
+    """ELF32 headers plus cached offset <-> virtual address translation"""
+
+    def __init__(self, data, name: str = '<memory>'):
+        self.name = name
+        self.size = len(data)
+        if self.size < 52 or bytes(data[:4]) != ELF_MAGIC:
+            raise ValueError(f"Not an ELF file: {name}")
+        if data[4] != ELFCLASS32:
+            raise ValueError(f"Only ELF32 is supported: {name}")
+        if data[5] not in (ELFDATA2LSB, ELFDATA2MSB):
+            raise ValueError(f"Unknown ELF byte order in {name}")
+        self.endian = '<' if data[5] == ELFDATA2LSB else '>'
+
+        (self.type, self.machine, _, self.entry, phoff, shoff, self.flags, _,
+         phentsize, phnum, shentsize, shnum, shstrndx) = struct.unpack_from(
+            self.endian + 'HHIIIIIHHHHHH', data, 16)
+
+        self.segments = self._parse_segments(data, phoff, phentsize, phnum)
+        self.sections = self._parse_sections(data, shoff, shentsize, shnum, shstrndx)
+        self.shoff, self.shentsize, self.shnum = shoff, shentsize, shnum
+        self.phoff, self.phentsize, self.phnum = phoff, phentsize, phnum
+
+        # Loadable segments drive translation; allocated sections are used
+        # when an image carries no program headers
+        loads = [s for s in self.segments if s.type == PT_LOAD and s.filesz]
+        if loads:
+            self._by_offset = _IntervalTable((s.offset, s.filesz, s.vaddr, s) for s in loads)
+            self._by_address = _IntervalTable((s.vaddr, s.filesz, s.offset, s) for s in loads)
+        else:
+            allocated = [s for s in self.sections
+                         if s.flags & SHF_ALLOC and s.type != SHT_NOBITS and s.size]
+            self._by_offset = _IntervalTable((s.offset, s.size, s.addr, s) for s in allocated)
+            self._by_address = _IntervalTable((s.addr, s.size, s.offset, s) for s in allocated)
+
+        file_sections = [s for s in self.sections if s.type != SHT_NOBITS and s.size]
+        self._section_table = _IntervalTable((s.offset, s.size, s.offset, s) for s in file_sections)
+
+    def _check(self, offset: int, size: int, what: str):
+        if offset + size > self.size:
+            raise ValueError(f"Malformed ELF {what} in {self.name}")
+
+    def _parse_segments(self, data, phoff, phentsize, phnum) -> List[Segment]:
+        if not phnum:
+            return []
+        if phentsize < 32:
+            raise ValueError(f"Malformed ELF program headers in {self.name}")
+        self._check(phoff, phnum * phentsize, 'program headers')
+        fmt = self.endian + '8I'
+        return [Segment(*struct.unpack_from(fmt, data, phoff + i * phentsize)) for i in range(phnum)]
+
+    def _parse_sections(self, data, shoff, shentsize, shnum, shstrndx) -> List[Section]:
+        if not shnum or not shoff:
+            return []
+        if shentsize < 40:
+            raise ValueError(f"Malformed ELF section headers in {self.name}")
+        self._check(shoff, shnum * shentsize, 'section headers')
+        fmt = self.endian + '10I'
+        raw = [struct.unpack_from(fmt, data, shoff + i * shentsize) for i in range(shnum)]
+
+        names = None
+        if shstrndx < shnum:
+            str_offset, str_size = raw[shstrndx][4], raw[shstrndx][5]
+            if str_offset + str_size <= self.size:
+                names = bytes(data[str_offset:str_offset + str_size])
+
+        sections = []
+        for name_offset, sh_type, sh_flags, addr, offset, size, *_ in raw:
+            name = ''
+            if names is not None and name_offset < len(names):
+                end = names.find(b'\x00', name_offset)
+                name = names[name_offset:end if end != -1 else None].decode('ascii', 'replace')
+            sections.append(Section(name, sh_type, sh_flags, addr, offset, size))
+        return sections
+
+    @classmethod
+    def from_image(cls, image) -> 'ElfFile':
+        """Parse from a FirmwareImage mapping"""
+        return cls(image.data, os.path.basename(image.filename))
+
+    @classmethod
+    def for_path(cls, path: str) -> 'ElfFile':
+        """Parse a file, reusing the tables while the file is unchanged"""
+        stat = os.stat(path)
+        return _load_elf(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+    def offset_to_va(self, offset: int) -> Optional[int]:
+        """Virtual address of a file offset, None if not loaded"""
+        found = self._by_offset.lookup(offset)
+        return found[0] if found else None
+
+    def va_to_offset(self, address: int) -> Optional[int]:
+        """File offset backing a virtual address, None if not file-backed"""
+        found = self._by_address.lookup(address)
+        return found[0] if found else None
+
+    def section_for_offset(self, offset: int) -> Optional[Section]:
+        found = self._section_table.lookup(offset)
+        return found[1] if found else None
+
+    def loadable_segments(self) -> List[Segment]:
+        return sorted((s for s in self.segments if s.type == PT_LOAD and s.filesz), key=lambda s: s.vaddr)
+
+    def extent(self) -> int:
+        """Bytes actually described by the headers (ELF length inside a container)"""
+        end = 52
+        end = max(end, self.phoff + self.phnum * self.phentsize)
+        if self.shnum:
+            end = max(end, self.shoff + self.shnum * self.shentsize)
+        for segment in self.segments:
+            end = max(end, segment.offset + segment.filesz)
+        for section in self.sections:
+            if section.type != SHT_NOBITS:
+                end = max(end, section.offset + section.size)
+        return end
+
+
+@functools.lru_cache(maxsize=16)
+def _load_elf(path: str, size: int, mtime_ns: int) -> ElfFile:
+    from firmware_image import FirmwareImage
+    with FirmwareImage(path) as image:
+        return ElfFile.from_image(image)
+
+
+def offset_address_table(elf: ElfFile):
+    """(group, name, file offset, virtual address) for every DroboOffsets entry"""
+    from offsets import DroboOffsets
+    return [
+        (group, name, offset, elf.offset_to_va(offset))
+        for group, name, offset in DroboOffsets.iter_secondary_offsets()
+    ]
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python3 elf_parser.py <elf_file>")
+        print("Examples:")
+        print("  python3 elf_parser.py ../extracted/secondary.elf")
+        sys.exit(1)
+
+    from firmware_image import FirmwareImage
+
+    with FirmwareImage(sys.argv[1]) as image:
+        try:
+            elf = ElfFile.from_image(image)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+
+    print(f"ELF: {elf.name}  entry=0x{elf.entry:08x}  extent={elf.extent():,} bytes")
+
+    print("\nSegments:")
+    for s in elf.segments:
+        kind = SEGMENT_TYPES.get(s.type, f"0x{s.type:x}")
+        print(f"  {kind:<8} off=0x{s.offset:08x} va=0x{s.vaddr:08x} "
+              f"filesz=0x{s.filesz:08x} memsz=0x{s.memsz:08x} {s.flag_string}")
+
+    if elf.sections:
+        print("\nSections:")
+        for s in elf.sections:
+            if s.name:
+                print(f"  {s.name:<20} off=0x{s.offset:08x} va=0x{s.addr:08x} size=0x{s.size:08x}")
+
+    print("\nDroboOffsets (file offset -> virtual address):")
+    for group, name, offset, address in offset_address_table(elf):
+        va = f"0x{address:08x}" if address is not None else "not loaded"
+        print(f"  {group + '.' + name:<40} 0x{offset:08x} -> {va}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Entropy Map
+=====================
+
+Characterizes a firmware image (.tdf container or extracted component) block
+by block: Shannon entropy, byte histogram, printable ratio, and a class for
+each block - padding, text, code, data, compressed or encrypted. Adjacent
+blocks of the same class are merged into regions and labelled with the known
+component or field they fall in, which makes it easy to check the
+binwalk-derived FirmwareComponents boundaries.
+
+With NumPy installed the histograms are computed from a strided, zero-copy
+view over the memory-mapped image (a 20+ MB container takes well under a
+second). Without NumPy a slower standard-library path is used.
+
+Classes:
+    padding     one byte value (0x00 or 0xFF) fills the block
+    text        mostly printable ASCII
+    code        ARM instructions (condition field 0xE in most words)
+    encrypted   near-maximal entropy with a flat histogram
+    compressed  near-maximal entropy with an uneven histogram
+    data        anything else
+
+Usage:
+    python3 entropy_map.py <firmware_file> [--block-size N] [--csv FILE] [--histogram]
+
+Examples:
+    python3 entropy_map.py ../firmware/release.Drobo5D3.4-2-3.tdf
+    python3 entropy_map.py secondary.elf --block-size 1024 --csv secondary-entropy.csv
+    python3 entropy_map.py release.tdf --csv - --histogram > blocks.csv
+"""
+
+import argparse
+import csv
+import math
+import sys
+from collections import Counter, namedtuple
+from typing import Iterator, List
+
+DEFAULT_BLOCK_SIZE = 4096
+MIN_BLOCK_SIZE = 256
+
+# Blocks processed per NumPy batch, bounding temporary memory
+BATCH_BYTES = 4 * 1024 * 1024
+
+# Classification thresholds
+PADDING_RATIO = 0.9         # share of the block taken by 0x00 or 0xFF
+TEXT_RATIO = 0.85           # share of printable ASCII
+CODE_RATIO = 0.4            # share of words whose top nibble is ARM "always" (0xE)
+ENTROPY_MARGIN = 0.3        # bits below the expected entropy of random data
+
+_PRINTABLE = bytes(range(0x20, 0x7f)) + b'\t\n\r'
+
+BlockStats = namedtuple('BlockStats', [
+    'offset', 'size', 'entropy', 'chi_square', 'dominant', 'dominant_ratio',
+    'printable_ratio', 'code_ratio', 'category', 'histogram',
+])
+
+Region = namedtuple('Region', ['start', 'end', 'category', 'mean_entropy'])
+
+
+def random_entropy(block_size: int) -> float:
+    """Expected entropy estimate of uniformly random data (Miller-Madow bias)"""
+    return 8.0 - 255.0 / (2.0 * block_size * math.log(2))
+
+
+def chi_square_limit() -> float:
+    """Chi-square (255 d.o.f.) a uniform histogram stays under ~99.99% of the time"""
+    return 255.0 + 4.0 * math.sqrt(2 * 255.0)
+
+
+def classify(size: int, entropy: float, chi_square: float, dominant: int, dominant_ratio: float,
+             printable_ratio: float, code_ratio: float) -> str:
+    if dominant in (0x00, 0xFF) and dominant_ratio >= PADDING_RATIO:
+        return 'padding'
+    if printable_ratio >= TEXT_RATIO:
+        return 'text'
+    if entropy >= random_entropy(size) - ENTROPY_MARGIN:
+        return 'encrypted' if chi_square <= chi_square_limit() else 'compressed'
+    if code_ratio >= CODE_RATIO:
+        return 'code'
+    return 'data'
+
+
+def _numpy():
+    """NumPy if installed; imported on first use as it costs ~80 ms of startup"""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _stats_numpy(np, data, block_size: int, keep_histogram: bool) -> Iterator[BlockStats]:
+    view = np.frombuffer(data, dtype=np.uint8)
+    count = len(view) // block_size
+    printable = np.zeros(256, dtype=bool)
+    printable[np.frombuffer(_PRINTABLE, dtype=np.uint8)] = True
+    expected = block_size / 256.0
+
+    per_batch = max(1, BATCH_BYTES // block_size)
+    for first in range(0, count, per_batch):
+        n = min(per_batch, count - first)
+        # Strided (n, block_size) view of the mapping - no copy
+        blocks = view[first * block_size:(first + n) * block_size].reshape(n, block_size)
+
+        # One bincount for all blocks: shift each block into its own 256-bin range
+        keys = blocks + (np.arange(n, dtype=np.int64) * 256)[:, None]
+        hist = np.bincount(keys.ravel(), minlength=n * 256).reshape(n, 256)
+
+        p = hist / float(block_size)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            entropy = np.abs(np.where(hist > 0, p * np.log2(p), 0.0).sum(axis=1))
+        chi_square = ((hist - expected) ** 2 / expected).sum(axis=1)
+        dominant = hist.argmax(axis=1)
+        dominant_ratio = hist.max(axis=1) / float(block_size)
+        printable_ratio = hist[:, printable].sum(axis=1) / float(block_size)
+        # Top byte of each little-endian word: ARM condition field in the high nibble
+        code_ratio = ((blocks[:, 3::4] >> 4) == 0xE).mean(axis=1)
+
+        for i in range(n):
+            category = classify(block_size, float(entropy[i]), float(chi_square[i]), int(dominant[i]),
+                                float(dominant_ratio[i]), float(printable_ratio[i]), float(code_ratio[i]))
+            yield BlockStats(
+                (first + i) * block_size, block_size, float(entropy[i]), float(chi_square[i]),
+                int(dominant[i]), float(dominant_ratio[i]), float(printable_ratio[i]),
+                float(code_ratio[i]), category, hist[i].tolist() if keep_histogram else None,
+            )
+
+
+def _stats_python(data, block_size: int, keep_histogram: bool) -> Iterator[BlockStats]:
+    expected = block_size / 256.0
+    printable = set(_PRINTABLE)
+    for offset in range(0, len(data) - block_size + 1, block_size):
+        block = data[offset:offset + block_size]
+        counts = Counter(block)
+        entropy = abs(sum(c / block_size * math.log2(c / block_size) for c in counts.values()))
+        chi_square = sum((counts.get(b, 0) - expected) ** 2 / expected for b in range(256))
+        dominant, top = counts.most_common(1)[0]
+        printable_ratio = sum(c for b, c in counts.items() if b in printable) / block_size
+        words = block[3::4]
+        code_ratio = sum(1 for b in words if b >> 4 == 0xE) / max(1, len(words))
+        category = classify(block_size, entropy, chi_square, dominant, top / block_size,
+                            printable_ratio, code_ratio)
+        histogram = [counts.get(b, 0) for b in range(256)] if keep_histogram else None
+        yield BlockStats(offset, block_size, entropy, chi_square, dominant, top / block_size,
+                         printable_ratio, code_ratio, category, histogram)
+
+
+def block_stats(data, block_size: int = DEFAULT_BLOCK_SIZE, keep_histogram: bool = False) -> Iterator[BlockStats]:
+    """Per-block statistics over a buffer (a trailing partial block is skipped)"""
+    if block_size < MIN_BLOCK_SIZE:
+        raise ValueError(f"Block size must be at least {MIN_BLOCK_SIZE}")
+    np = _numpy()
+    if np is not None:
+        return _stats_numpy(np, data, block_size, keep_histogram)
+    return _stats_python(data, block_size, keep_histogram)
+
+
+def merge_regions(stats: Iterator[BlockStats]) -> List[Region]:
+    """Coalesce consecutive blocks of the same class"""
+    regions = []
+    start = end = None
+    category = None
+    entropy_sum = blocks = 0
+    for block in stats:
+        if category is not None and block.category == category and block.offset == end:
+            end += block.size
+            entropy_sum += block.entropy
+            blocks += 1
+            continue
+        if category is not None:
+            regions.append(Region(start, end, category, entropy_sum / blocks))
+        start, end, category = block.offset, block.offset + block.size, block.category
+        entropy_sum, blocks = block.entropy, 1
+    if category is not None:
+        regions.append(Region(start, end, category, entropy_sum / blocks))
+    return regions
+
+
+CSV_FIELDS = ['offset', 'size', 'entropy', 'chi_square', 'dominant', 'dominant_ratio',
+              'printable_ratio', 'code_ratio', 'category']
+
+
+def write_csv(stats: Iterator[BlockStats], out, histogram: bool = False) -> Iterator[BlockStats]:
+    """Write one CSV row per block, passing the blocks through"""
+    writer = csv.writer(out)
+    writer.writerow(CSV_FIELDS + ([f"h{b:02x}" for b in range(256)] if histogram else []))
+    for block in stats:
+        row = [f"0x{block.offset:x}", block.size, f"{block.entropy:.4f}", f"{block.chi_square:.1f}",
+               f"0x{block.dominant:02x}", f"{block.dominant_ratio:.3f}", f"{block.printable_ratio:.3f}",
+               f"{block.code_ratio:.3f}", block.category]
+        writer.writerow(row + (block.histogram if histogram else []))
+        yield block
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Block entropy and byte-histogram map of a firmware image')
+    parser.add_argument('firmware_file')
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+                        help=f'bytes per block (default: {DEFAULT_BLOCK_SIZE})')
+    parser.add_argument('--csv', metavar='FILE', help="write per-block rows to FILE ('-' for stdout)")
+    parser.add_argument('--histogram', action='store_true', help='include 256 histogram columns in the CSV')
+    args = parser.parse_args()
+
+    from firmware_image import FirmwareImage
+    from region_map import build_region_index
+
+    out = None
+    with FirmwareImage(args.firmware_file) as image:
+        try:
+            stats = block_stats(image.data, args.block_size, keep_histogram=args.histogram)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        if args.csv:
+            out = sys.stdout if args.csv == '-' else open(args.csv, 'w', newline='')
+            stats = write_csv(stats, out, args.histogram)
+        regions = merge_regions(stats)
+        index = build_region_index(image)
+    if out is not None and out is not sys.stdout:
+        out.close()
+
+    # Keep stdout clean for CSV output
+    report = sys.stderr if args.csv == '-' else sys.stdout
+    engine = 'numpy' if _numpy() is not None else 'python'
+    print(f"{args.firmware_file}: {len(image):,} bytes, {args.block_size}-byte blocks ({engine})", file=report)
+    for region in regions:
+        owner = index.owner(region.start)
+        label = f"  [{owner.name}]" if owner else ''
+        print(f"  0x{region.start:08x}-0x{region.end:08x}  {region.category:<10} "
+              f"H={region.mean_entropy:.2f}{label}", file=report)
+
+
+if __name__ == "__main__":
+    main()
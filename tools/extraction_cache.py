@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Extraction Cache
+==========================
+
+Content-addressed cache for components extracted from TDF containers. Each
+entry is keyed by the container SHA-256 plus the component's offset and size
+from the FirmwareComponents table, so an unchanged release (or an unchanged
+component table) is served from the cache instead of being re-extracted, and
+a changed container or table can never hit a stale entry.
+
+Entries are evicted least-recently-used once the cache grows past a size cap.
+Hits refresh an entry's mtime, which is what the LRU order is based on.
+
+Environment Variables:
+    DROBO_CACHE_PATH      - Cache root directory (default: ~/.cache/drobo-fw)
+    DROBO_CACHE_MAX_BYTES - Extraction cache size cap in bytes (default: 2 GiB)
+
+Usage:
+    python3 extraction_cache.py <stats|evict|clear> [max_bytes]
+
+Examples:
+    python3 extraction_cache.py stats
+    python3 extraction_cache.py evict 500000000
+    python3 extraction_cache.py clear
+"""
+
+import os
+import sys
+import tempfile
+from collections import namedtuple
+from typing import List
+from cache import DEFAULT_CACHE_PATH, fsync_directory
+from stream_copy import duplicate_file, extract_range
+
+DEFAULT_MAX_BYTES = int(os.environ.get('DROBO_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+
+ENTRY_SUFFIX = '.bin'
+
+CacheEntry = namedtuple('CacheEntry', ['path', 'size', 'last_used'])
+
+
+def entry_key(container_sha256: str, offset: int, size: int) -> str:
+    """Cache key of one component of one container"""
+    return f"{container_sha256}-{offset:x}-{size:x}"
+
+
+class ExtractionCache:
+    """Size-capped LRU store of extracted TDF components"""
+
+    def __init__(self, directory: str = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory or os.path.join(DEFAULT_CACHE_PATH, 'extract')
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def entries(self) -> List[CacheEntry]:
+        """All entries, least recently used first"""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(ENTRY_SUFFIX) or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                entries.append(CacheEntry(entry.path, stat.st_size, stat.st_mtime_ns))
+        return sorted(entries, key=lambda e: e.last_used)
+
+    def total_size(self) -> int:
+        return sum(e.size for e in self.entries())
+
+    def evict(self, keep: str = None) -> int:
+        """Drop least-recently-used entries until under max_bytes
+
+        Returns the number of bytes freed. The entry at keep is never evicted.
+        """
+        entries = self.entries()
+        total = sum(e.size for e in entries)
+        freed = 0
+        for entry in entries:
+            if total - freed <= self.max_bytes:
+                break
+            if entry.path == keep:
+                continue
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                continue
+            freed += entry.size
+        return freed
+
+    def clear(self) -> int:
+        """Remove every entry, returning the number removed"""
+        entries = self.entries()
+        for entry in entries:
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+        return len(entries)
+
+    def fetch(self, image, offset: int, size: int, output_path: str):
+        """Write a component of image to output_path, from the cache if possible
+
+        Returns (bytes written, True if served from the cache). Outputs are
+        reflinked or copied, never hard linked, so patching an extracted file
+        cannot corrupt the cache entry.
+        """
+        path = self._path(entry_key(image.sha256(), offset, size))
+
+        if os.path.exists(path):
+            os.utime(path)
+            duplicate_file(path, output_path, allow_hardlink=False)
+            return os.path.getsize(output_path), True
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            os.close(fd)
+            extracted = extract_range(image.fileno(), tmp_path, offset, size)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        fsync_directory(self.directory)
+
+        duplicate_file(path, output_path, allow_hardlink=False)
+        self.evict(keep=path)
+        return extracted, False
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ('stats', 'evict', 'clear'):
+        print("Usage: python3 extraction_cache.py <stats|evict|clear> [max_bytes]")
+        print("Examples:")
+        print("  python3 extraction_cache.py stats")
+        print("  python3 extraction_cache.py evict 500000000")
+        sys.exit(1)
+
+    command = sys.argv[1]
+    max_bytes = int(sys.argv[2], 0) if len(sys.argv) > 2 else DEFAULT_MAX_BYTES
+    cache = ExtractionCache(max_bytes=max_bytes)
+
+    if command == 'stats':
+        entries = cache.entries()
+        print(f"Cache directory: {cache.directory}")
+        print(f"Entries: {len(entries)}  Size: {sum(e.size for e in entries):,} / {cache.max_bytes:,} bytes")
+        for entry in reversed(entries):
+            print(f"  {os.path.basename(entry.path)}  {entry.size:,} bytes")
+    elif command == 'evict':
+        print(f"Freed {cache.evict():,} bytes")
+    else:
+        print(f"Removed {cache.clear()} entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Fake Serial Console
+=============================
+
+Stand-in for the VxWorks shell on the Drobo's serial console, served on a
+local pseudo-terminal so serial_console.py, screen or minicom can be tested
+with no hardware attached. Like the real shell it reads one command line at a
+time, echoes it, prints the response and a "-> " prompt; input sent ahead
+waits in the tty buffer. Responses follow the strings in the offsets module
+(perf info of every management module, cache trackers, disk and protection
+queries; perf counters and tracker access records advance on every call).
+Output is paced at the baud rate (115200 by default, about 11 KiB/s) and each
+command line reaches the shell only after the latency of a USB serial adapter
+(16 ms, the FTDI default latency timer), so the throughput and latency gained
+by pipelining can be measured under realistic conditions.
+
+Usage:
+    python3 fake_drobo.py [--baud N] [--latency MS] [--work MS]
+
+Examples:
+    python3 fake_drobo.py
+    python3 serial_console.py --port /dev/pts/5
+    python3 serial_console.py --fake --window 8
+"""
+
+import os
+import sys
+import time
+
+DEFAULT_BAUD = 115200
+DEFAULT_LATENCY_MS = 16.0
+DEFAULT_WORK_MS = 2.0
+BITS_PER_BYTE = 10  # 8N1: start bit, 8 data bits, stop bit
+
+BANNER = [
+    '',
+    'VxWorks',
+    'Drobo 5D3 (fake console on a pty)',
+    '',
+]
+
+
+def default_responses():
+    """Command -> response lines, from the strings in the offsets module"""
+    from offsets import DebugInterfaces, ManagementModules
+
+    responses = {
+        'help': ['Drobo shell commands:'] + [f"  {command}" for command in
+                                             DebugInterfaces.DISK_COMMANDS + DebugInterfaces.PROTECTION_COMMANDS]
+                + [f"  {module:<6} {ManagementModules.PERF_STRINGS[module]}" for module in ManagementModules.ALL_MODULES],
+        'k disk': ['Drobo disk commands:', '  cfg      Dump static disk configuration',
+                   '  sense    Disk sense information', '  freeAll  Free all disk resources'],
+        'k disk cfg': [f"slot {slot}: ST4000DM004-2CV1 {4000787030016 >> 20} MiB  sectors 7814037168  "
+                       f"blksize 512  state ONLINE" for slot in range(5)],
+        'k disk sense': [f"slot {slot}: key 0x0 asc 0x00 ascq 0x00  no sense" for slot in range(5)],
+    }
+    return responses
+
+
+def perf_info(module: str, calls: int):
+    """Perf info block of a module on its calls-th query; totals grow per call"""
+    from offsets import ManagementModules
+
+    seed = ManagementModules.ALL_MODULES.index(module) + 1
+    counters = {
+        'reads': calls * seed * 1021,
+        'writes': calls * seed * 509,
+        'readBlocks': calls * seed * 8168,
+        'writeBlocks': calls * seed * 4072,
+        'avgLatencyUs': 150 + calls * seed * 37 % 200,
+        'maxLatencyUs': 2000 + calls * seed * 389 % 5000,
+        'queueDepth': calls * seed % 32,
+        'errors': 0,
+    }
+    return [f"{module} = {ManagementModules.PERF_STRINGS[module]}"] + [
+        f"  {counter:<16} {value:>10}" for counter, value in counters.items()]
+
+
+def tracker_dump(tracker: str, calls: int, accesses: int = 64):
+    """Cache tracker dump on its calls-th query: bucket totals grow per call,
+    followed by the host accesses recorded since the previous query"""
+    seed = [name for name, _ in _trackers()].index(tracker) + 1
+    lines = [dict(_trackers())[tracker]]
+    lines += [f"  bucket {bucket:2d}: hits {calls * seed * 7919 * (bucket + 1) % 100000:>6}  "
+              f"misses {calls * seed * 1049 * (bucket + 1) % 10000:>5}" for bucket in range(16)]
+    # Deterministic stream: sequential runs interleaved with a small hot set
+    for seq in range((calls - 1) * accesses, calls * accesses):
+        if seq % 4 == 3:
+            lba = (seq * 2654435761 + seed) % 16 * 72
+        else:
+            lba = seed << 24 | seq * 8
+        op = 'W' if seq % 3 == 0 else 'R'
+        lines.append(f"  {seq:8d}: {op} lba 0x{lba:010x} blocks 8")
+    return lines
+
+
+def _trackers():
+    from offsets import DebugInterfaces
+    return [('hlbat', DebugInterfaces.HOST_LBA_CACHE), ('zmdt', DebugInterfaces.ZONE_METADATA),
+            ('dlbat', DebugInterfaces.DISK_LBA_CACHE)]
+
+
+def _modules():
+    from offsets import ManagementModules
+    return ManagementModules.ALL_MODULES
+
+
+class FakeDrobo:
+    """Fake VxWorks shell on the master side of a pty; connect to .path"""
+
+    def __init__(self, baud: int = DEFAULT_BAUD, latency_ms: float = DEFAULT_LATENCY_MS,
+                 work_ms: float = DEFAULT_WORK_MS, responses=None):
+        self.baud = baud
+        self.latency = latency_ms / 1000.0
+        self.work = work_ms / 1000.0
+        self.responses = default_responses() if responses is None else responses
+        self.settings = {'bypassLocks': 'false', 'useSelfMirrored': 'off', 'redmodeslowdown': 'on'}
+        self.commands_served = 0
+        self.perf_calls = {}
+        self.path = None
+        self._master = None
+        self._slave = None
+        self._buffer = bytearray()
+        self._after_cr = False
+        self._lines = None
+        self._task = None
+        self._line_free_at = 0.0
+        self._loop = None
+
+    async def start(self):
+        """Open the pty and start answering; returns self"""
+        # Imported here: asyncio adds ~60 ms to the startup of every tool
+        import asyncio
+        import tty
+
+        self._loop = asyncio.get_running_loop()
+        self._lines = asyncio.Queue()
+        self._master, self._slave = os.openpty()
+        # The shell echoes input itself; the pty must not
+        tty.setraw(self._slave)
+        # The slave stays open here so the master never sees a hangup
+        # between clients
+        self.path = os.ttyname(self._slave)
+        os.set_blocking(self._master, False)
+        self._loop.add_reader(self._master, self._on_readable)
+        self._task = self._loop.create_task(self._serve())
+        return self
+
+    async def close(self):
+        import asyncio
+
+        if self._master is None:
+            return
+        self._loop.remove_reader(self._master)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        os.close(self._master)
+        os.close(self._slave)
+        self._master = self._slave = None
+
+    def respond(self, command: str):
+        """Response lines for one command line"""
+        words = command.split()
+        if not words:
+            return []
+        if words[0] in self.settings:
+            if len(words) > 1:
+                self.settings[words[0]] = words[1]
+                return [f"Setting {words[0]} to {words[1]}"]
+            if words[0] == 'useSelfMirrored':
+                return [f"Use of self-mirrored Zones is currently {self.settings[words[0]]}"]
+            return [f"{words[0]} is currently {self.settings[words[0]]}"]
+        lines = self.responses.get(' '.join(words))
+        if lines is None and len(words) == 1 and words[0] in _modules():
+            self.perf_calls[words[0]] = self.perf_calls.get(words[0], 0) + 1
+            lines = perf_info(words[0], self.perf_calls[words[0]])
+        if lines is None and len(words) == 1 and words[0] in dict(_trackers()):
+            self.perf_calls[words[0]] = self.perf_calls.get(words[0], 0) + 1
+            lines = tracker_dump(words[0], self.perf_calls[words[0]])
+        if lines is None:
+            return [f"undefined symbol: {words[0]}"]
+        return lines + ['value = 0 = 0x0']
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._master, 4096)
+        except (BlockingIOError, OSError):
+            return
+        self._buffer += data
+        while True:
+            end = min((i for i in (self._buffer.find(b'\r'), self._buffer.find(b'\n')) if i >= 0), default=-1)
+            if end < 0:
+                return
+            terminator = self._buffer[end]
+            line = bytes(self._buffer[:end])
+            del self._buffer[:end + 1]
+            # "\r\n" ends one line, even when split across reads
+            if not line and terminator == ord('\n') and self._after_cr:
+                self._after_cr = False
+                continue
+            self._after_cr = terminator == ord('\r')
+            self._lines.put_nowait((time.perf_counter() + self.latency, line.decode('latin-1')))
+
+    async def _serve(self):
+        import asyncio
+
+        await self._emit('\r\n'.join(BANNER) + '\r\n-> ')
+        while True:
+            arrival, command = await self._lines.get()
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._emit(command + '\r\n')
+            if command.strip():
+                await asyncio.sleep(self.work)
+            output = ''.join(line + '\r\n' for line in self.respond(command))
+            self.commands_served += 1
+            await self._emit(output + '-> ')
+
+    async def _emit(self, text: str):
+        """Write text to the client at the line rate of the baud setting"""
+        import asyncio
+
+        data = text.encode('latin-1')
+        now = time.perf_counter()
+        self._line_free_at = max(now, self._line_free_at) + len(data) * BITS_PER_BYTE / self.baud
+        while data:
+            try:
+                written = os.write(self._master, data)
+            except BlockingIOError:
+                # Client is not reading; wait until the pty drains
+                writable = self._loop.create_future()
+                self._loop.add_writer(self._master, writable.set_result, None)
+                try:
+                    await writable
+                finally:
+                    self._loop.remove_writer(self._master)
+                continue
+            data = data[written:]
+        delay = self._line_free_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def serve(baud: int, latency_ms: float, work_ms: float):
+    import asyncio
+
+    device = await FakeDrobo(baud=baud, latency_ms=latency_ms, work_ms=work_ms).start()
+    print(f"Fake Drobo console on {device.path} ({baud} baud, {latency_ms:g} ms latency, {work_ms:g} ms per command)")
+    print(f"Connect with: python3 serial_console.py --port {device.path}")
+    print("Press Ctrl+C to stop")
+    sys.stdout.flush()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await device.close()
+
+
+def main():
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description='Fake Drobo serial console on a local pty')
+    parser.add_argument('--baud', type=int, default=DEFAULT_BAUD, help=f'line rate to emulate (default: {DEFAULT_BAUD})')
+    parser.add_argument('--latency', type=float, default=DEFAULT_LATENCY_MS,
+                        help=f'ms before a command line reaches the shell (default: {DEFAULT_LATENCY_MS:g})')
+    parser.add_argument('--work', type=float, default=DEFAULT_WORK_MS,
+                        help=f'ms the shell spends on each command (default: {DEFAULT_WORK_MS:g})')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.baud, args.latency, args.work))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -12,41 +12,80 @@ Environment Variables:
 
 Usage:
     python3 firmware_analyzer.py <firmware_file>
+    python3 firmware_analyzer.py --batch <directory|@file_list> [--format ndjson|csv] [--jobs N]
     
 Examples:
     python3 firmware_analyzer.py ../extracted/secondary.elf
     python3 firmware_analyzer.py secondary.elf  # Uses DROBO_EXTRACTED_PATH
     DROBO_EXTRACTED_PATH=/path/to/extracted python3 firmware_analyzer.py secondary.elf
+    python3 firmware_analyzer.py --batch /data/dumps --jobs 8 > results.ndjson
+    python3 firmware_analyzer.py --batch @dump_list.txt --format csv -o results.csv
 """
 
 import sys
 import os
-import struct
 from offsets import DroboOffsets, bytes_to_tb, sectors_to_tb, ProtectionModes
+from firmware_image import FirmwareImage
+from firmware_paths import DEFAULT_EXTRACTED_PATH, DEFAULT_FIRMWARE_PATH, resolve_firmware_path
+from tracing import span
 
-# Default paths - can be overridden by environment variables
-DEFAULT_EXTRACTED_PATH = os.environ.get('DROBO_EXTRACTED_PATH', '../extracted')
-DEFAULT_FIRMWARE_PATH = os.environ.get('DROBO_FIRMWARE_PATH', '../firmware')
+# Batch mode (argparse, csv, json, process pool) and ELF parsing are imported
+# where used, keeping single-file startup fast
 
-def resolve_firmware_path(filename):
-    """Resolve firmware file path using environment variables or defaults"""
+# Column order for batch NDJSON/CSV records
+BATCH_FIELDS = [
+    'path', 'protection_mode', 'protection_mode_name',
+    'bytes_limit', 'bytes_limit_tb', 'sectors_limit', 'sectors_limit_tb',
+    'large_pack_mode', 'led_management', 'host_view', 'status', 'error',
+]
+
+def read_firmware_settings(image):
+    """Read configuration settings and capacity limits from a mapped image"""
+    
+    results = {}
     
-    # If absolute path or relative path that exists, use as-is
-    if os.path.isabs(filename) or os.path.exists(filename):
-        return filename
+    # Check protection mode setting
+    results['protection_mode'] = image.protection_mode()
     
-    # Try in extracted directory
-    extracted_path = os.path.join(DEFAULT_EXTRACTED_PATH, filename)
-    if os.path.exists(extracted_path):
-        return extracted_path
+    # Check capacity limits
+    bytes_limit = image.bytes_limit()
+    results['bytes_limit'] = bytes_limit
+    results['bytes_limit_tb'] = bytes_to_tb(bytes_limit)
     
-    # Try in firmware directory
-    firmware_path = os.path.join(DEFAULT_FIRMWARE_PATH, filename)
-    if os.path.exists(firmware_path):
-        return firmware_path
+    sectors_limit = image.sectors_limit()
+    results['sectors_limit'] = sectors_limit
+    results['sectors_limit_tb'] = sectors_to_tb(sectors_limit)
     
-    # Return original filename (will cause error later if not found)
-    return filename
+    # Check additional configuration flags
+    results['large_pack_mode'] = image.u32(DroboOffsets.CONFIG.LARGE_PACK_MODE)
+    results['led_management'] = image.u32(DroboOffsets.CONFIG.MANAGE_CAPACITY_LEDS)
+    results['host_view'] = image.u32(DroboOffsets.CONFIG.SHOW_CAPACITY_HOST_VIEW)
+    
+    return results
+
+def read_virtual_addresses(image):
+    """Map every DroboOffsets file offset to its load address (ELF images only)"""
+    
+    if not image.is_elf():
+        return {}
+    from elf_parser import ElfFile
+    try:
+        elf = ElfFile.from_image(image)
+    except ValueError:
+        return {}
+    return {offset: elf.offset_to_va(offset) for _, _, offset in DroboOffsets.iter_secondary_offsets()}
+
+def limit_status(results):
+    """Classify capacity limits as 'original', 'patched' or 'unusual'"""
+    
+    is_original_bytes = results['bytes_limit'] == DroboOffsets.CAPACITY_LIMITS.ORIGINAL_BYTES_LIMIT
+    is_original_sectors = results['sectors_limit'] == DroboOffsets.CAPACITY_LIMITS.ORIGINAL_SECTORS_LIMIT
+    
+    if is_original_bytes and is_original_sectors:
+        return 'original'
+    elif results['bytes_limit'] > DroboOffsets.CAPACITY_LIMITS.ORIGINAL_BYTES_LIMIT:
+        return 'patched'
+    return 'unusual'
 
 def analyze_firmware(filename):
     """Automated firmware analysis using offset tables"""
@@ -59,44 +98,68 @@ def analyze_firmware(filename):
     print("=" * 50)
     
     try:
-        with open(filename, 'rb') as f:
-            results = {}
-            
-            # Check protection mode setting
-            f.seek(DroboOffsets.CONFIG.PROTECTION_MODE)
-            protection_mode = struct.unpack('<I', f.read(4))[0]
-            results['protection_mode'] = protection_mode
-            
-            # Check capacity limits
-            f.seek(DroboOffsets.CAPACITY_LIMITS.BYTES_BASED)
-            bytes_limit = struct.unpack('<Q', f.read(8))[0]
-            results['bytes_limit'] = bytes_limit
-            results['bytes_limit_tb'] = bytes_to_tb(bytes_limit)
-            
-            f.seek(DroboOffsets.CAPACITY_LIMITS.SECTORS_BASED)
-            sectors_limit = struct.unpack('<Q', f.read(8))[0]
-            results['sectors_limit'] = sectors_limit
-            results['sectors_limit_tb'] = sectors_to_tb(sectors_limit)
-            
-            # Check additional configuration flags
-            f.seek(DroboOffsets.CONFIG.LARGE_PACK_MODE)
-            large_pack_mode = struct.unpack('<I', f.read(4))[0]
-            results['large_pack_mode'] = large_pack_mode
-            
-            f.seek(DroboOffsets.CONFIG.MANAGE_CAPACITY_LEDS)
-            led_management = struct.unpack('<I', f.read(4))[0]
-            results['led_management'] = led_management
-            
-            f.seek(DroboOffsets.CONFIG.SHOW_CAPACITY_HOST_VIEW)
-            host_view = struct.unpack('<I', f.read(4))[0]
-            results['host_view'] = host_view
-            
+        with span('analyze', file=filename) as stage, FirmwareImage(filename) as image:
+            stage.add_bytes(len(image))
+            with span('analyze:settings'):
+                results = read_firmware_settings(image)
+            with span('analyze:virtual_addresses'):
+                results['virtual_addresses'] = read_virtual_addresses(image)
             return results
             
     except Exception as e:
         print(f"Error analyzing file: {e}")
         return None
 
+def analyze_record(filename):
+    """Analyze one image for batch mode, returning a flat record dict"""
+    
+    record = dict.fromkeys(BATCH_FIELDS)
+    record['path'] = filename
+    
+    try:
+        with span('analyze', file=filename) as stage, FirmwareImage(filename) as image:
+            stage.add_bytes(len(image))
+            results = read_firmware_settings(image)
+    except Exception as e:
+        record['error'] = str(e)
+        return record
+    
+    record.update(results)
+    record['protection_mode_name'] = ProtectionModes.MODE_NAMES.get(results['protection_mode'], 'Unknown')
+    record['status'] = limit_status(results)
+    return record
+
+def run_batch(source, output_format='ndjson', jobs=None, pattern='*.elf', out=sys.stdout):
+    """Analyze every image from a directory or @file-list, streaming one record per image"""
+    
+    import csv
+    import json
+    from batch import iter_firmware_paths, run_parallel
+    
+    paths = iter_firmware_paths(source, pattern)
+    
+    if output_format == 'csv':
+        writer = csv.DictWriter(out, fieldnames=BATCH_FIELDS)
+        writer.writeheader()
+        emit = writer.writerow
+    else:
+        def emit(record):
+            out.write(json.dumps(record) + '\n')
+    
+    count = failed = 0
+    records = run_parallel(analyze_record, paths, jobs)
+    try:
+        for record in records:
+            emit(record)
+            out.flush()
+            count += 1
+            failed += record['error'] is not None
+    finally:
+        # Cancels the queued work if the reader went away (e.g. `| head`)
+        records.close()
+    
+    return count, failed
+
 def print_analysis_results(results):
     """Print formatted analysis results"""
     
@@ -117,12 +180,10 @@ def print_analysis_results(results):
     print(f"  Sectors-based limit: {results['sectors_limit_tb']:.1f} TB ({results['sectors_limit']:,} sectors)")
     
     # Check if limits match expected values
-    is_original_bytes = results['bytes_limit'] == DroboOffsets.CAPACITY_LIMITS.ORIGINAL_BYTES_LIMIT
-    is_original_sectors = results['sectors_limit'] == DroboOffsets.CAPACITY_LIMITS.ORIGINAL_SECTORS_LIMIT
-    
-    if is_original_bytes and is_original_sectors:
+    status = limit_status(results)
+    if status == 'original':
         print("  Status: Original 2TB limits (not patched)")
-    elif results['bytes_limit'] > DroboOffsets.CAPACITY_LIMITS.ORIGINAL_BYTES_LIMIT:
+    elif status == 'patched':
         print("  Status: Patched limits detected")
     else:
         print("  Status: Unusual limit values")
@@ -133,20 +194,61 @@ def print_analysis_results(results):
     print(f"  LED Management:      {results['led_management']}")
     print(f"  Host Capacity View:  {'Enabled' if results['host_view'] else 'Disabled'} ({results['host_view']})")
     
-    # Memory locations
+    # Memory locations (file offset and, for ELF images, virtual address)
+    addresses = results.get('virtual_addresses', {})
+    
+    def location(offset):
+        address = addresses.get(offset)
+        va = f" (VA 0x{address:08x})" if address is not None else ""
+        return f"0x{offset:08x}{va}"
+    
     print(f"\nMemory Locations:")
-    print(f"  Protection Mode:     0x{DroboOffsets.CONFIG.PROTECTION_MODE:08x}")
-    print(f"  Bytes Limit:         0x{DroboOffsets.CAPACITY_LIMITS.BYTES_BASED:08x}")
-    print(f"  Sectors Limit:       0x{DroboOffsets.CAPACITY_LIMITS.SECTORS_BASED:08x}")
-    print(f"  Large Pack Mode:     0x{DroboOffsets.CONFIG.LARGE_PACK_MODE:08x}")
+    print(f"  Protection Mode:     {location(DroboOffsets.CONFIG.PROTECTION_MODE)}")
+    print(f"  Bytes Limit:         {location(DroboOffsets.CAPACITY_LIMITS.BYTES_BASED)}")
+    print(f"  Sectors Limit:       {location(DroboOffsets.CAPACITY_LIMITS.SECTORS_BASED)}")
+    print(f"  Large Pack Mode:     {location(DroboOffsets.CONFIG.LARGE_PACK_MODE)}")
+
+def batch_main(argv):
+    """Entry point for --batch mode"""
+    
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        prog='firmware_analyzer.py --batch',
+        description='Analyze a directory tree or @file-list of firmware images in parallel')
+    parser.add_argument('source', help='directory to walk, or @list.txt with one path per line')
+    parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson', help='output record format')
+    parser.add_argument('--jobs', '-j', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--pattern', default='*.elf', help='filename pattern when walking a directory')
+    parser.add_argument('--output', '-o', help='write records to file instead of stdout')
+    args = parser.parse_args(argv)
+    
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        count, failed = run_batch(args.source, args.format, args.jobs, args.pattern, out)
+    except BrokenPipeError:
+        # Point stdout at devnull so the flush at interpreter exit stays quiet
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    finally:
+        if args.output:
+            out.close()
+    
+    print(f"Analyzed {count} images ({failed} failed)", file=sys.stderr)
+    sys.exit(1 if failed else 0)
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--batch':
+        batch_main(sys.argv[2:])
+    
     if len(sys.argv) < 2:
         print("Usage: python3 firmware_analyzer.py <firmware_file>")
+        print("       python3 firmware_analyzer.py --batch <directory|@file_list> [--format ndjson|csv] [--jobs N]")
         print("Examples:")
         print("  python3 firmware_analyzer.py ../extracted/secondary.elf")
         print("  python3 firmware_analyzer.py secondary.elf  # Uses DROBO_EXTRACTED_PATH")
         print("  DROBO_EXTRACTED_PATH=/path/to/extracted python3 firmware_analyzer.py secondary.elf")
+        print("  python3 firmware_analyzer.py --batch /data/dumps --format csv --jobs 8 > results.csv")
         print()
         print("Environment Variables:")
         print(f"  DROBO_EXTRACTED_PATH: {DEFAULT_EXTRACTED_PATH}")
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Firmware Diff
+=======================
+
+Maps regions between two firmware images (two secondary.elf builds, or two
+.tdf containers) with rsync-style rolling-hash block matching. The old image
+is indexed in fixed-size blocks by their Adler-32 checksum; the new image
+is scanned with a rolling window, and every verified block match is extended
+byte-wise in both directions. Runs in near-linear time, and the block index
+is capped at MAX_BLOCKS entries regardless of image size.
+
+The result is a list of unchanged, moved and changed segments of the new
+image, which can translate any offset (e.g. a DroboOffsets entry) from the
+old version to the new one.
+
+Usage:
+    python3 firmware_diff.py <old_image> <new_image> [--block-size N] [--all]
+
+Examples:
+    python3 firmware_diff.py secondary-4.2.3.elf secondary-4.3.0.elf
+    python3 firmware_diff.py release.Drobo5D3.4-2-3.tdf release.Drobo5D3.4-3-0.tdf --block-size 256
+"""
+
+import argparse
+import bisect
+import zlib
+from collections import namedtuple
+from typing import Dict, List, Optional
+
+DEFAULT_BLOCK_SIZE = 64
+
+# Upper bound on indexed old-image blocks; larger images use larger blocks
+MAX_BLOCKS = 1 << 18
+
+_ADLER_MOD = 65521
+
+# Chunk size used when extending a match
+_EXTEND_CHUNK = 4096
+
+UNCHANGED = 'unchanged'
+MOVED = 'moved'
+CHANGED = 'changed'
+
+# new_start/new_end in the new image; old_start is None for changed segments
+DiffSegment = namedtuple('DiffSegment', ['kind', 'new_start', 'new_end', 'old_start'])
+
+
+def _weak_hash(data, start: int, size: int) -> int:
+    """Adler-32 of a block (computed in C; rolled in Python by compute())"""
+    return zlib.adler32(data[start:start + size])
+
+
+def _forward_match(old, old_pos: int, new, new_pos: int, limit: int) -> int:
+    """Length of the common run old[old_pos:] / new[new_pos:], at most limit"""
+    length = 0
+    step = _EXTEND_CHUNK
+    while length < limit and step:
+        size = min(step, limit - length)
+        if old[old_pos + length:old_pos + length + size] == new[new_pos + length:new_pos + length + size]:
+            length += size
+        else:
+            step //= 2
+    return length
+
+
+def _backward_match(old, old_pos: int, new, new_pos: int, limit: int) -> int:
+    """Length of the common run ending just before old_pos / new_pos"""
+    length = 0
+    step = _EXTEND_CHUNK
+    while length < limit and step:
+        size = min(step, limit - length)
+        if old[old_pos - length - size:old_pos - length] == new[new_pos - length - size:new_pos - length]:
+            length += size
+        else:
+            step //= 2
+    return length
+
+
+class FirmwareDiff:
+    """Region map of a new image in terms of an old one"""
+
+    def __init__(self, segments: List[DiffSegment], old_size: int, new_size: int, block_size: int):
+        self.segments = segments
+        self.old_size = old_size
+        self.new_size = new_size
+        self.block_size = block_size
+        matched = sorted((s for s in segments if s.old_start is not None), key=lambda s: s.old_start)
+        self._by_old = matched
+        self._old_starts = [s.old_start for s in matched]
+        # Running maximum of old segment ends, to bound translate()'s walk back
+        self._old_reach = []
+        reach = -1
+        for segment in matched:
+            reach = max(reach, segment.old_start + (segment.new_end - segment.new_start))
+            self._old_reach.append(reach)
+
+    @classmethod
+    def compute(cls, old, new, block_size: int = DEFAULT_BLOCK_SIZE) -> 'FirmwareDiff':
+        """Diff two byte buffers (bytes, mmap or FirmwareImage.data)"""
+        old_size, new_size = len(old), len(new)
+        block_size = max(block_size, -(-old_size // MAX_BLOCKS))
+
+        # Weak checksum -> first old block with it; collisions are verified
+        index: Dict[int, int] = {}
+        for old_pos in range(0, old_size - block_size + 1, block_size):
+            index.setdefault(_weak_hash(old, old_pos, block_size), old_pos)
+
+        matches = []        # (new_start, new_end, old_start)
+        delta = 0           # last match's old - new, tried first on every hit
+        covered = 0         # new bytes before this are already matched
+        pos = 0
+        a = b = None
+        while pos + block_size <= new_size:
+            if a is None:
+                weak = _weak_hash(new, pos, block_size)
+                a, b = weak & 0xFFFF, weak >> 16
+            candidate = index.get(a | (b << 16))
+            if candidate is not None:
+                block = new[pos:pos + block_size]
+                expected = pos + delta
+                if 0 <= expected <= old_size - block_size and old[expected:expected + block_size] == block:
+                    candidate = expected
+                elif old[candidate:candidate + block_size] != block:
+                    candidate = None
+            if candidate is not None:
+                back = _backward_match(old, candidate, new, pos, min(candidate, pos - covered))
+                forward = _forward_match(old, candidate, new, pos, min(old_size - candidate, new_size - pos))
+                start, end = pos - back, pos + forward
+                matches.append((start, end, candidate - back))
+                delta = candidate - pos
+                covered = pos = end
+                a = None
+                continue
+            # Roll the Adler-32 window one byte
+            if pos + block_size < new_size:
+                out_byte, in_byte = new[pos], new[pos + block_size]
+                a = (a - out_byte + in_byte) % _ADLER_MOD
+                b = (b - block_size * out_byte + a - 1) % _ADLER_MOD
+            pos += 1
+
+        segments = []
+        cursor = 0
+        for start, end, old_start in matches:
+            if start > cursor:
+                segments.append(DiffSegment(CHANGED, cursor, start, None))
+            kind = UNCHANGED if old_start == start else MOVED
+            segments.append(DiffSegment(kind, start, end, old_start))
+            cursor = end
+        if cursor < new_size:
+            segments.append(DiffSegment(CHANGED, cursor, new_size, None))
+        return cls(_coalesce(segments), old_size, new_size, block_size)
+
+    def translate(self, old_offset: int) -> Optional[int]:
+        """Offset in the new image holding the byte at old_offset, None if changed
+
+        When old bytes were duplicated, the copy with the smallest shift wins.
+        """
+        best = None
+        i = bisect.bisect_right(self._old_starts, old_offset) - 1
+        while i >= 0 and self._old_reach[i] > old_offset:
+            segment = self._by_old[i]
+            if old_offset < segment.old_start + (segment.new_end - segment.new_start):
+                candidate = segment.new_start + (old_offset - segment.old_start)
+                if best is None or abs(candidate - old_offset) < abs(best - old_offset):
+                    best = candidate
+            i -= 1
+        return best
+
+    def stats(self) -> Dict[str, int]:
+        totals = {UNCHANGED: 0, MOVED: 0, CHANGED: 0}
+        for segment in self.segments:
+            totals[segment.kind] += segment.new_end - segment.new_start
+        return totals
+
+
+def _coalesce(segments: List[DiffSegment]) -> List[DiffSegment]:
+    """Merge adjacent segments that continue each other"""
+    merged = []
+    for segment in segments:
+        if merged:
+            last = merged[-1]
+            contiguous_old = (
+                last.old_start is not None and segment.old_start is not None
+                and last.old_start + (last.new_end - last.new_start) == segment.old_start
+            )
+            if last.kind == segment.kind and last.new_end == segment.new_start and (
+                    segment.kind == CHANGED or contiguous_old):
+                merged[-1] = last._replace(new_end=segment.new_end)
+                continue
+        merged.append(segment)
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Map regions between two firmware images')
+    parser.add_argument('old_image')
+    parser.add_argument('new_image')
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+                        help=f'match block size in bytes (default: {DEFAULT_BLOCK_SIZE})')
+    parser.add_argument('--all', action='store_true', help='print unchanged segments too')
+    args = parser.parse_args()
+
+    from firmware_image import FirmwareImage
+    from offsets import DroboOffsets
+
+    with FirmwareImage(args.old_image) as old, FirmwareImage(args.new_image) as new:
+        diff = FirmwareDiff.compute(old.data, new.data, args.block_size)
+        tdf = old.data[8:12] == b'TDIH'
+
+    print(f"Old: {args.old_image} ({diff.old_size:,} bytes)")
+    print(f"New: {args.new_image} ({diff.new_size:,} bytes)  block size {diff.block_size}")
+    for kind, size in diff.stats().items():
+        print(f"  {kind:<10} {size:>12,} bytes ({100.0 * size / max(diff.new_size, 1):.1f}%)")
+
+    print("\nSegments (new image):")
+    for segment in diff.segments:
+        if segment.kind == UNCHANGED and not args.all:
+            continue
+        source = f"<- old 0x{segment.old_start:08x}" if segment.old_start is not None else ''
+        print(f"  {segment.kind:<10} 0x{segment.new_start:08x}-0x{segment.new_end:08x} {source}")
+
+    if tdf:
+        entries = [('FIRMWARE', name, value) for name, value in vars(type(DroboOffsets.FIRMWARE)).items()
+                   if name.isupper()]
+    else:
+        entries = list(DroboOffsets.iter_secondary_offsets())
+    print("\nDroboOffsets translation (old -> new):")
+    for group, name, offset in entries:
+        new_offset = diff.translate(offset)
+        target = f"0x{new_offset:08x}" if new_offset is not None else "changed"
+        print(f"  {group + '.' + name:<40} 0x{offset:08x} -> {target}")
+
+
+if __name__ == "__main__":
+    main()
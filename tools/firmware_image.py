@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Firmware Image Reader
+===============================
+
+Memory-mapped access to Drobo firmware images (TDF containers and extracted
+components such as secondary.elf). The image is mapped once and all reads
+are served from the mapping, so tools no longer repeat seek/read round-trips
+or copy the whole file into a fresh bytes object.
+
+Usage:
+    from firmware_image import FirmwareImage
+    from offsets import DroboOffsets
+
+    with FirmwareImage('secondary.elf') as image:
+        protection_mode = image.u32(DroboOffsets.CONFIG.PROTECTION_MODE)
+        bytes_limit = image.u64(DroboOffsets.CAPACITY_LIMITS.BYTES_BASED)
+        header = image.view(0, 52)          # zero-copy memoryview
+
+    # Writable mapping for patching
+    with FirmwareImage('secondary.elf', writable=True) as image:
+        image.write_u64(DroboOffsets.CAPACITY_LIMITS.BYTES_BASED, new_value)
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+from offsets import DroboOffsets
+
+# Pre-compiled little-endian accessors (firmware is ARM 32-bit LSB)
+_U32 = struct.Struct('<I')
+_U64 = struct.Struct('<Q')
+
+
+class FirmwareImage:
+    """Memory-mapped firmware image with typed, zero-copy accessors"""
+
+    def __init__(self, filename: str, writable: bool = False):
+        self.filename = filename
+        self.writable = writable
+        self._file = open(filename, 'r+b' if writable else 'rb')
+        try:
+            self.size = os.fstat(self._file.fileno()).st_size
+            if self.size == 0:
+                raise ValueError(f"Cannot map empty file: {filename}")
+            access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+            self._map = mmap.mmap(self._file.fileno(), 0, access=access)
+        except Exception:
+            self._file.close()
+            raise
+        self._view = memoryview(self._map)
+        self._sha256 = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        """Release the memoryview, mapping and file handle"""
+        if self._map is None:
+            return
+        self._view.release()
+        if self.writable:
+            self._map.flush()
+        self._map.close()
+        self._file.close()
+        self._map = None
+
+    def fileno(self) -> int:
+        """File descriptor of the underlying file (for kernel-side copies)"""
+        return self._file.fileno()
+
+    @property
+    def data(self) -> mmap.mmap:
+        """Underlying mapping (supports find(), re and slicing)"""
+        return self._map
+
+    def _check_range(self, offset: int, size: int):
+        if offset < 0 or offset + size > self.size:
+            raise ValueError(
+                f"Range 0x{offset:x}+{size} outside image "
+                f"{os.path.basename(self.filename)} ({self.size} bytes)"
+            )
+
+    def view(self, offset: int = 0, size: int = None) -> memoryview:
+        """Zero-copy memoryview slice of the image"""
+        if size is None:
+            size = self.size - offset
+        self._check_range(offset, size)
+        return self._view[offset:offset + size]
+
+    def read(self, offset: int, size: int) -> bytes:
+        """Copy a byte range out of the image"""
+        return bytes(self.view(offset, size))
+
+    def u32(self, offset: int) -> int:
+        """Read a little-endian 32-bit unsigned integer"""
+        self._check_range(offset, 4)
+        return _U32.unpack_from(self._map, offset)[0]
+
+    def u64(self, offset: int) -> int:
+        """Read a little-endian 64-bit unsigned integer"""
+        self._check_range(offset, 8)
+        return _U64.unpack_from(self._map, offset)[0]
+
+    def write(self, offset: int, data: bytes):
+        """Write raw bytes in place (writable images only)"""
+        if not self.writable:
+            raise PermissionError(f"Image opened read-only: {self.filename}")
+        self._check_range(offset, len(data))
+        self._map[offset:offset + len(data)] = data
+        self._sha256 = None
+
+    def write_u32(self, offset: int, value: int):
+        """Write a little-endian 32-bit unsigned integer"""
+        self.write(offset, _U32.pack(value))
+
+    def write_u64(self, offset: int, value: int):
+        """Write a little-endian 64-bit unsigned integer"""
+        self.write(offset, _U64.pack(value))
+
+    def flush(self):
+        """Flush pending writes to disk"""
+        if self.writable:
+            self._map.flush()
+
+    def sha256(self) -> str:
+        """Hex SHA-256 of the image contents (computed once per mapping)"""
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(self._map).hexdigest()
+        return self._sha256
+
+    def find(self, pattern: bytes, start: int = 0, end: int = None) -> int:
+        """Find first occurrence of pattern, -1 if absent"""
+        if end is None:
+            end = self.size
+        return self._map.find(pattern, start, end)
+
+    # Typed accessors for known DroboOffsets fields
+
+    def protection_mode(self) -> int:
+        return self.u32(DroboOffsets.CONFIG.PROTECTION_MODE)
+
+    def bytes_limit(self) -> int:
+        return self.u64(DroboOffsets.CAPACITY_LIMITS.BYTES_BASED)
+
+    def sectors_limit(self) -> int:
+        return self.u64(DroboOffsets.CAPACITY_LIMITS.SECTORS_BASED)
+
+    def is_elf(self) -> bool:
+        return self.size >= 4 and self._map[:4] == b'\x7fELF'
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Firmware Path Resolution
+==================================
+
+Shared lookup of firmware files given on the command line. A name that exists
+as given is used as-is; otherwise the extracted-components and firmware
+directories are searched in turn.
+
+Environment Variables:
+    DROBO_FIRMWARE_PATH  - Default path to firmware files
+    DROBO_EXTRACTED_PATH - Default path to extracted components
+
+Usage:
+    from firmware_paths import resolve_firmware_path
+
+    filename = resolve_firmware_path(sys.argv[1])
+"""
+
+import os
+
+# Default paths - can be overridden by environment variables
+DEFAULT_EXTRACTED_PATH = os.environ.get('DROBO_EXTRACTED_PATH', '../extracted')
+DEFAULT_FIRMWARE_PATH = os.environ.get('DROBO_FIRMWARE_PATH', '../firmware')
+
+def resolve_firmware_path(filename, search_paths=None):
+    """Resolve firmware file path using environment variables or defaults
+
+    search_paths defaults to (DEFAULT_EXTRACTED_PATH, DEFAULT_FIRMWARE_PATH).
+    """
+
+    # If absolute path or relative path that exists, use as-is
+    if os.path.isabs(filename) or os.path.exists(filename):
+        return filename
+
+    if search_paths is None:
+        search_paths = (DEFAULT_EXTRACTED_PATH, DEFAULT_FIRMWARE_PATH)
+    for directory in search_paths:
+        candidate = os.path.join(directory, filename)
+        if os.path.exists(candidate):
+            return candidate
+
+    # Return original filename (will cause error later if not found)
+    return filename
@@ -13,6 +13,12 @@ Usage in Ghidra:
 
 Note: This script uses Ghidra's Python API when run within Ghidra.
 When run standalone, it prints the bookmark locations for reference.
+
+The offsets in offsets.py are file offsets. Inside Ghidra they are mapped
+to load addresses through the program's memory blocks; standalone, pass
+secondary.elf to print the matching virtual addresses:
+
+    python3 ghidra_bookmarks.py ../extracted/secondary.elf
 """
 
 import sys
@@ -24,12 +30,13 @@ sys.path.append(script_dir)
 
 try:
     from offsets import DroboOffsets
+    from elf_parser import ElfFile
 except ImportError:
     print("Error: Could not import offsets module")
     print("Make sure this script is in the same directory as offsets.py")
     sys.exit(1)
 
-def create_bookmarks():
+def create_bookmarks(elf_path=None):
     """Create bookmarks at key locations in Ghidra"""
     
     bookmarks = [
@@ -68,19 +75,21 @@ def create_bookmarks():
         
         address_factory = program.getAddressFactory()
         default_space = address_factory.getDefaultAddressSpace()
+        memory = program.getMemory()
         
         bookmark_count = 0
         
         for offset, category, description in bookmarks:
             try:
-                # Create address object
-                addr = default_space.getAddress(offset)
+                # Translate file offset to the loaded address
+                addrs = memory.locateAddressesForFileOffset(offset)
+                addr = addrs[0] if addrs else default_space.getAddress(offset)
                 
                 # Create bookmark
                 createBookmark(addr, category, description)
                 bookmark_count += 1
                 
-                print(f"✓ Created bookmark: {description} at 0x{offset:08x}")
+                print(f"✓ Created bookmark: {description} at {addr} (file 0x{offset:08x})")
                 
             except Exception as e:
                 print(f"✗ Failed to create bookmark at 0x{offset:08x}: {e}")
@@ -95,6 +104,13 @@ def create_bookmarks():
         print("Copy this information for manual bookmark creation in Ghidra:")
         print()
         
+        elf = None
+        if elf_path:
+            try:
+                elf = ElfFile.for_path(elf_path)
+            except (OSError, ValueError) as e:
+                print(f"Warning: cannot map virtual addresses from {elf_path}: {e}")
+        
         current_category = ""
         for offset, category, description in bookmarks:
             if category != current_category:
@@ -102,7 +118,11 @@ def create_bookmarks():
                 print("-" * 20)
                 current_category = category
             
-            print(f"  0x{offset:08x} - {description}")
+            address = elf.offset_to_va(offset) if elf else None
+            if address is not None:
+                print(f"  0x{offset:08x} (VA 0x{address:08x}) - {description}")
+            else:
+                print(f"  0x{offset:08x} - {description}")
         
         print(f"\\nTotal bookmarks: {len(bookmarks)}")
         print("\\nTo use in Ghidra:")
@@ -137,13 +157,15 @@ bookmarks = [""")
     
     print("""]
 
-# Create bookmarks
+# Create bookmarks (offsets are file offsets; map them to load addresses)
 program = getCurrentProgram()
 address_factory = program.getAddressFactory()
 default_space = address_factory.getDefaultAddressSpace()
+memory = program.getMemory()
 
 for offset, category, description in bookmarks:
-    addr = default_space.getAddress(offset)
+    addrs = memory.locateAddressesForFileOffset(offset)
+    addr = addrs[0] if addrs else default_space.getAddress(offset)
     createBookmark(addr, category, description)
     print("Created bookmark: " + description + " at " + hex(offset))
 
@@ -154,7 +176,8 @@ def main():
     print("Drobo 5D3 Ghidra Bookmarks Generator")
     print("=" * 40)
     
-    success = create_bookmarks()
+    elf_path = sys.argv[1] if len(sys.argv) > 1 else None
+    success = create_bookmarks(elf_path)
     
     if not success:
         print_ghidra_script()
@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Immediate Construction Scanner
+========================================
+
+Finds code that builds or compares against 64-bit capacity constants such as
+0x100000000 (2TB in sectors) and 0x20000000000 (2TB in bytes). On 32-bit ARM
+these never appear as one literal: the compiler loads the high and low words
+into a register pair, with MOV/MVN/MOVW immediates, MOVT, ORR or LSL of an
+earlier constant, and compares with CMP/CMN on one half plus CMP or SBCS on
+the other. Such sites are invisible to pattern_scanner.py and
+capacity_words.py, which look for the constant stored as data.
+
+The code sections (or executable segments) are decoded as ARM words and as
+Thumb/Thumb-2 halfwords with NumPy, a whole section per array operation:
+
+    mov      MOV/MVN/MOVW/MOVS with an immediate (value known directly)
+    movt     MOVT Rd, #imm16 over the low half of Rd
+    orr      ORR Rd, Rn, #imm of a known Rn
+    lsl      LSL Rd, Rm, #n of a known Rm
+    cmp      CMP/CMN Rn, #imm
+    sbc      SBCS Rd, Rn, #imm (high word of a 64-bit compare)
+
+A movt/orr/lsl takes its source from the nearest earlier instruction writing
+that register (decoded ALU, load and call instructions count as writes), up
+to three links deep. Sites are reported when both words of a target value
+are built in an AAPCS register pair (even low register, high register next
+to it) within a few instructions ('build'), or when both halves are compared
+('compare', also matching value - 1 as compilers turn x > C into x >= C + 1).
+
+Targets are the 64-bit values of capacity_words.capacity_values() (1TB to
+256TB, binary or decimal, in bytes or sectors) plus any NAME=VALUE given.
+
+Usage:
+    python3 immediate_scanner.py <firmware_file> [NAME=VALUE ...] [--isa arm,thumb]
+                                 [--any-registers] [--csv FILE]
+
+Examples:
+    python3 immediate_scanner.py ../extracted/secondary.elf
+    python3 immediate_scanner.py secondary.elf --isa arm
+    python3 immediate_scanner.py secondary.elf 3TB_bytes=3000000000000 --csv immediates.csv
+"""
+
+import argparse
+import csv
+import sys
+from collections import namedtuple
+from typing import Dict, List
+
+# Op kinds of the decoded instruction table
+MOV, MVN, MOVW, MOVT, ORR, LSL, CMP, SBC, WRITE = range(1, 10)
+KIND_NAMES = {MOV: 'mov', MVN: 'mvn', MOVW: 'movw', MOVT: 'movt', ORR: 'orr', LSL: 'lsl',
+              CMP: 'cmp', SBC: 'sbc', WRITE: 'write'}
+DIRECT_KINDS = (MOV, MVN, MOVW)
+DERIVED_KINDS = (MOVT, ORR, LSL)
+
+# Register number standing for "every register" (calls, LDM, POP)
+ALL_REGISTERS = 16
+NO_REGISTER = -1
+
+# Instructions searched around a site, and movt/orr/lsl links followed
+WINDOW = 6
+CHAIN_DEPTH = 3
+
+ISAS = ('arm', 'thumb')
+
+ImmediateSite = namedtuple('ImmediateSite', [
+    'offset', 'address', 'isa', 'kind', 'value', 'label', 'registers', 'how'])
+
+
+def _numpy():
+    """NumPy, imported on first use as it costs ~80 ms of startup"""
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("The immediate scanner needs NumPy (pip install numpy)") from None
+    return numpy
+
+
+def target_values(extra: Dict[str, int] = None) -> Dict[int, str]:
+    """64-bit value -> label of every constant to look for"""
+    from capacity_words import capacity_values
+
+    targets = {value: label for value, label in capacity_values().items() if value >= 1 << 32}
+    for name, value in (extra or {}).items():
+        if not 1 << 32 <= value < 1 << 64:
+            raise ValueError(f"{name}=0x{value:x} is not a 64-bit value above 32 bits")
+        targets[value] = name
+    return targets
+
+
+def code_ranges(image) -> List[tuple]:
+    """(file offset, size, virtual address) of the code in an image
+
+    Executable sections when the ELF has them, else executable segments;
+    a raw image is one range at address 0.
+    """
+    from elf_parser import ElfFile, SHF_EXECINSTR
+
+    if not image.is_elf():
+        return [(0, len(image), 0)]
+    elf = ElfFile.from_image(image)
+    sections = [s for s in elf.sections if s.flags & SHF_EXECINSTR and s.size]
+    if sections:
+        return [(s.offset, s.size, s.addr) for s in sections]
+    return [(s.offset, s.filesz, s.vaddr) for s in elf.loadable_segments() if s.executable and s.filesz]
+
+
+class _Ops:
+    """Column builder for decoded instructions"""
+
+    def __init__(self, np):
+        self.np = np
+        self.columns = []
+
+    def add(self, mask, positions, kind, rd, src, imm):
+        """Append the rows selected by mask (True: every row) of the columns"""
+        np = self.np
+        index = np.arange(len(positions)) if mask is True else np.flatnonzero(mask)
+        if not len(index):
+            return
+
+        def pick(column, dtype):
+            if np.ndim(column) == 0:
+                return np.full(len(index), column, dtype=dtype)
+            return column[index].astype(dtype)
+
+        self.columns.append((positions[index], np.full(len(index), kind, dtype=np.uint8),
+                             pick(rd, np.int8), pick(src, np.int8), pick(imm, np.int64)))
+
+    def table(self):
+        """(pos, kind, rd, src, imm) sorted by position"""
+        np = self.np
+        if not self.columns:
+            return (np.empty(0, np.int64), np.empty(0, np.uint8), np.empty(0, np.int8),
+                    np.empty(0, np.int8), np.empty(0, np.int64))
+        pos, kind, rd, src, imm = (np.concatenate(column) for column in zip(*self.columns))
+        order = np.argsort(pos, kind='stable')
+        return pos[order], kind[order], rd[order], src[order], imm[order]
+
+
+def _ror(np, value, rotate):
+    """32-bit rotate right of uint64 arrays"""
+    return ((value >> rotate) | (value << ((32 - rotate) & 31))) & 0xFFFFFFFF
+
+
+def decode_arm(np, words, base: int) -> tuple:
+    """Op table of ARM words (uint32 array) at image offset base
+
+    Opcode masks run over every word; operands are decoded only for the
+    words that matched.
+    """
+    w = words
+    ops = _Ops(np)
+    conditional = (w >> 28) != 0xF
+    masks = {
+        MOV: (w & 0x0FEF0000) == 0x03A00000,
+        MVN: (w & 0x0FEF0000) == 0x03E00000,
+        MOVW: (w & 0x0FF00000) == 0x03000000,
+        MOVT: (w & 0x0FF00000) == 0x03400000,
+        ORR: (w & 0x0FE00000) == 0x03800000,
+        LSL: ((w & 0x0FEF0070) == 0x01A00000) & ((w & 0xF80) != 0),
+        CMP: (w & 0x0FF0F000) == 0x03500000,
+        SBC: (w & 0x0FF00000) == 0x02D00000,
+    }
+    cmn = (w & 0x0FF0F000) == 0x03700000
+    decoded = np.logical_or.reduce(list(masks.values())) | cmn
+    index = np.flatnonzero(conditional & decoded)
+    s = w[index].astype(np.uint64)
+    pos = base + index * 4
+    rd = ((s >> 12) & 0xF).astype(np.int8)
+    rn = ((s >> 16) & 0xF).astype(np.int8)
+    rotated = _ror(np, s & 0xFF, ((s >> 8) & 0xF) * 2)
+    imm16 = ((s >> 4) & 0xF000) | (s & 0xFFF)
+    mask = {kind: kind_mask[index] for kind, kind_mask in masks.items()}
+
+    ops.add(mask[MOV], pos, MOV, rd, NO_REGISTER, rotated)
+    ops.add(mask[MVN], pos, MVN, rd, NO_REGISTER, ~rotated & 0xFFFFFFFF)
+    ops.add(mask[MOVW], pos, MOVW, rd, NO_REGISTER, imm16)
+    ops.add(mask[MOVT], pos, MOVT, rd, rd, imm16)
+    ops.add(mask[ORR], pos, ORR, rd, rn, rotated)
+    ops.add(mask[LSL], pos, LSL, rd, (s & 0xF).astype(np.int8), (s >> 7) & 0x1F)
+    ops.add(mask[CMP], pos, CMP, NO_REGISTER, rn, rotated)
+    ops.add(cmn[index], pos, CMP, NO_REGISTER, rn, -rotated.astype(np.int64) & 0xFFFFFFFF)
+    ops.add(mask[SBC], pos, SBC, rd, rn, rotated)
+
+    # Other writes of a register: data processing except TST/TEQ/CMP/CMN and
+    # the multiply/extra load-store space, and single loads; calls and LDM
+    # write many registers
+    data_processing = ((w & 0x0C000000) == 0) & (((w >> 23) & 3) != 2) & ((w & 0x02000090) != 0x90)
+    load = (w & 0x0C100000) == 0x04100000
+    index = np.flatnonzero(conditional & (data_processing | load) & ~decoded)
+    ops.add(True, base + index * 4, WRITE, ((w[index] >> 12) & 0xF).astype(np.int8), NO_REGISTER, 0)
+    calls = ((w & 0x0F000000) == 0x0B000000) | ((w & 0x0E100000) == 0x08100000) | \
+        ((w & 0x0FFFFFF0) == 0x012FFF30)
+    index = np.flatnonzero(conditional & calls)
+    ops.add(True, base + index * 4, WRITE, ALL_REGISTERS, NO_REGISTER, 0)
+    return ops.table()
+
+
+def _thumb_expand(np, imm12):
+    """ThumbExpandImm of uint64 arrays"""
+    byte = imm12 & 0xFF
+    pattern = (imm12 >> 8) & 3
+    plain = np.select([pattern == 0, pattern == 1, pattern == 2],
+                      [byte, byte | byte << 16, byte << 8 | byte << 24], byte * 0x01010101)
+    rotated = _ror(np, 0x80 | (imm12 & 0x7F), imm12 >> 7)
+    return np.where((imm12 >> 10) == 0, plain, rotated)
+
+
+def decode_thumb(np, halves, base: int) -> tuple:
+    """Op table of Thumb halfwords (uint16 array) at image offset base
+
+    Every halfword is decoded as a possible instruction start; 16-bit
+    decodes right after a recognized 32-bit instruction are dropped.
+    """
+    h = halves
+    n = len(h)
+    ops = _Ops(np)
+    if not n:
+        return ops.table()
+
+    # 32-bit encodings: first halfword h1, second h2
+    h1 = h
+    h2 = np.r_[h[1:], np.zeros(1, dtype=h.dtype)]
+    second_zero = (h2 & 0x8000) == 0
+    compare_form = (h2 & 0x8F00) == 0x0F00
+    masks = {
+        MOVW: ((h1 & 0xFBF0) == 0xF240) & second_zero,
+        MOVT: ((h1 & 0xFBF0) == 0xF2C0) & second_zero,
+        MOV: ((h1 & 0xFBEF) == 0xF04F) & second_zero,
+        MVN: ((h1 & 0xFBEF) == 0xF06F) & second_zero,
+        ORR: ((h1 & 0xFBE0) == 0xF040) & ((h1 & 0xF) != 0xF) & second_zero,
+        CMP: ((h1 & 0xFBF0) == 0xF1B0) & compare_form,
+        SBC: ((h1 & 0xFBF0) == 0xF170) & second_zero,
+        LSL: ((h1 & 0xFFEF) == 0xEA4F) & ((h2 & 0x8030) == 0) & ((h2 & 0x70C0) != 0),
+    }
+    cmn = ((h1 & 0xFBF0) == 0xF110) & compare_form
+    call = ((h1 & 0xF800) == 0xF000) & ((h2 & 0xC000) == 0xC000)
+    wide = np.logical_or.reduce(list(masks.values())) | cmn | call
+    # The last halfword has no second half
+    wide[-1] = False
+
+    index = np.flatnonzero(wide)
+    s1 = h1[index].astype(np.uint64)
+    s2 = h2[index].astype(np.uint64)
+    pos = base + index * 2
+    rd = ((s2 >> 8) & 0xF).astype(np.int8)
+    rn = (s1 & 0xF).astype(np.int8)
+    imm12 = ((s1 >> 10) & 1) << 11 | ((s2 >> 12) & 7) << 8 | (s2 & 0xFF)
+    modified = _thumb_expand(np, imm12)
+    imm16 = (s1 & 0xF) << 12 | imm12
+    shift = ((s2 >> 12) & 7) << 2 | ((s2 >> 6) & 3)
+    mask = {kind: kind_mask[index] for kind, kind_mask in masks.items()}
+
+    ops.add(mask[MOVW], pos, MOVW, rd, NO_REGISTER, imm16)
+    ops.add(mask[MOVT], pos, MOVT, rd, rd, imm16)
+    ops.add(mask[MOV], pos, MOV, rd, NO_REGISTER, modified)
+    ops.add(mask[MVN], pos, MVN, rd, NO_REGISTER, ~modified & 0xFFFFFFFF)
+    ops.add(mask[ORR], pos, ORR, rd, rn, modified)
+    ops.add(mask[CMP], pos, CMP, NO_REGISTER, rn, modified)
+    ops.add(cmn[index], pos, CMP, NO_REGISTER, rn, -modified.astype(np.int64) & 0xFFFFFFFF)
+    ops.add(mask[SBC], pos, SBC, rd, rn, modified)
+    ops.add(mask[LSL], pos, LSL, rd, (s2 & 0xF).astype(np.int8), shift)
+    ops.add(call[index], pos, WRITE, ALL_REGISTERS, NO_REGISTER, 0)
+
+    # 16-bit encodings, skipping the second halfword of a decoded 32-bit one
+    narrow = np.ones(n, dtype=bool)
+    narrow[1:] = ~wide[:-1]
+    top5 = h >> 11
+    movs = top5 == 0x04
+    cmp16 = top5 == 0x05
+    lsls = (top5 == 0x00) & ((h & 0x07C0) != 0)
+    index = np.flatnonzero(narrow & (movs | cmp16 | lsls))
+    s = h[index].astype(np.uint64)
+    pos = base + index * 2
+    high3 = ((s >> 8) & 7).astype(np.int8)
+    ops.add(movs[index], pos, MOV, high3, NO_REGISTER, s & 0xFF)
+    ops.add(cmp16[index], pos, CMP, NO_REGISTER, high3, s & 0xFF)
+    ops.add(lsls[index], pos, LSL, (s & 7).astype(np.int8), ((s >> 3) & 7).astype(np.int8), (s >> 6) & 0x1F)
+
+    # Other 16-bit writes: shifts/add/sub, ALU (not TST/CMP/CMN), loads, ADR
+    alu_op = (h >> 6) & 0xF
+    writes_low = ((h < 0x2000) & ~lsls) | \
+        (((h & 0xFC00) == 0x4000) & (alu_op != 8) & (alu_op != 10) & (alu_op != 11)) | \
+        (top5 == 0x0D) | (top5 == 0x0F) | (top5 == 0x11) | (((h & 0xF000) == 0x5000) & (((h >> 9) & 7) >= 3))
+    writes_high = ((h & 0xF000) == 0x3000) | (top5 == 0x09) | ((top5 >= 0x13) & (top5 <= 0x15))
+    index = np.flatnonzero(narrow & writes_low)
+    ops.add(True, base + index * 2, WRITE, (h[index] & 7).astype(np.int8), NO_REGISTER, 0)
+    index = np.flatnonzero(narrow & writes_high)
+    ops.add(True, base + index * 2, WRITE, ((h[index] >> 8) & 7).astype(np.int8), NO_REGISTER, 0)
+    index = np.flatnonzero(narrow & ((h & 0xFF00) == 0x4600))
+    ops.add(True, base + index * 2, WRITE, (((h[index] >> 4) & 8) | (h[index] & 7)).astype(np.int8),
+            NO_REGISTER, 0)
+    index = np.flatnonzero(narrow & (((h & 0xFE00) == 0xBC00) | ((h & 0xF800) == 0xC800)))
+    ops.add(True, base + index * 2, WRITE, ALL_REGISTERS, NO_REGISTER, 0)
+    return ops.table()
+
+
+def resolve(np, table, step: int):
+    """(known, value) of the register each op writes, following movt/orr/lsl chains"""
+    pos, kind, rd, src, imm = table
+    n = len(pos)
+    known = np.isin(kind, DIRECT_KINDS)
+    value = np.where(known, imm, 0)
+    derived = np.isin(kind, DERIVED_KINDS)
+    for _ in range(CHAIN_DEPTH):
+        index = np.flatnonzero(derived & ~known)
+        if not len(index):
+            break
+        found = np.zeros(len(index), dtype=bool)
+        source = np.full(len(index), -1, dtype=np.int64)
+        for lag in range(1, WINDOW + 1):
+            writer = (index - lag).clip(0)
+            near = ~found & (index >= lag) & (pos[index] - pos[writer] <= WINDOW * step)
+            hit = near & ((rd[writer] == src[index]) | (rd[writer] == ALL_REGISTERS))
+            found |= hit
+            take = hit & known[writer]
+            source[take] = value[writer[take]]
+        ok = source >= 0
+        index, source = index[ok], source[ok]
+        op, operand = kind[index], imm[index]
+        value[index] = np.select(
+            [op == MOVT, op == ORR],
+            [(source & 0xFFFF) | (operand << 16), source | operand],
+            (source << operand) & 0xFFFFFFFF)
+        known[index] = True
+    return known, value
+
+
+def _lags(forward_only: bool):
+    for distance in range(1, WINDOW + 1):
+        yield distance
+        if not forward_only:
+            yield -distance
+
+
+def _pair_ok(low, high, any_registers: bool):
+    """Whether registers can hold the low and high words of one 64-bit value"""
+    if any_registers:
+        return (low != high) & (low >= 0) & (high >= 0) & (low < ALL_REGISTERS) & (high < ALL_REGISTERS)
+    return (low % 2 == 0) & (high == low + 1)
+
+
+def _nearest_pairs(np, pos, anchors, partner, step: int, forward_only: bool = False):
+    """(anchor, partner) indices: the nearest op within the window that partner(anchor, other) accepts"""
+    n = len(pos)
+    matched = np.full(len(anchors), -1, dtype=np.int64)
+    for lag in _lags(forward_only):
+        other = anchors + lag
+        valid = (matched < 0) & (other >= 0) & (other < n)
+        other = other.clip(0, n - 1)
+        valid &= np.abs(pos[other] - pos[anchors]) <= WINDOW * step
+        valid &= partner(anchors, other)
+        matched[valid] = other[valid]
+    keep = matched >= 0
+    return anchors[keep], matched[keep]
+
+
+def _overwritten(np, rd, first, second):
+    """Whether the register set by the earlier op of each pair is written again before the later one"""
+    start, end = np.minimum(first, second), np.maximum(first, second)
+    register = rd[start]
+    hit = np.zeros(len(start), dtype=bool)
+    for lag in range(1, WINDOW * 2):
+        written = rd[(start + lag).clip(0, len(rd) - 1)]
+        hit |= (start + lag < end) & ((written == register) | (written == ALL_REGISTERS))
+    return hit
+
+
+def find_sites(np, table, targets: Dict[int, str], step: int, any_registers: bool = False) -> List[tuple]:
+    """(offset, kind, value, label, registers, how) of every build/compare site"""
+    pos, kind, rd, src, imm = table
+    if not len(pos):
+        return []
+    known, value = resolve(np, table, step)
+    writes = known & (kind != CMP)
+    compares = kind == CMP
+    sbc = kind == SBC
+    sites = []
+
+    # Ops holding any target's high or low word; each target picks its own
+    wanted = [v for target in targets for v in (target, target - 1)]
+    high_words = [v >> 32 for v in wanted]
+    built = np.flatnonzero(writes & np.isin(value, high_words))
+    compared_high = np.flatnonzero(compares & np.isin(imm, high_words))
+    compared_low = np.flatnonzero(compares & np.isin(imm, [v & 0xFFFFFFFF for v in wanted]))
+
+    for target, label in targets.items():
+        # Built: high word in r(n+1), low word in r(n)
+        high, low = target >> 32, target & 0xFFFFFFFF
+        anchors = built[value[built] == high]
+        h, l = _nearest_pairs(np, pos, anchors, lambda a, o: writes[o] & (value[o] == low)
+                              & _pair_ok(rd[o], rd[a], any_registers), step)
+        # The first word set must survive until the second is
+        keep = ~_overwritten(np, rd, h, l)
+        for h, l in zip(h[keep], l[keep]):
+            sites.append((int(min(pos[h], pos[l])), 'build', target, label,
+                          f"r{rd[h]}:r{rd[l]}", f"{KIND_NAMES[kind[h]]}/{KIND_NAMES[kind[l]]}"))
+
+        # Compared: CMP high + CMP low, or CMP low + SBCS on high
+        for compared, name in ((target, label), (target - 1, f"{label} - 1")):
+            high, low = compared >> 32, compared & 0xFFFFFFFF
+            anchors = compared_high[imm[compared_high] == high]
+            for h, l in zip(*_nearest_pairs(np, pos, anchors, lambda a, o: compares[o] & (imm[o] == low)
+                                            & _pair_ok(src[o], src[a], any_registers), step)):
+                sites.append((int(min(pos[h], pos[l])), 'compare', compared, name,
+                              f"r{src[h]}:r{src[l]}", 'cmp/cmp'))
+            anchors = compared_low[imm[compared_low] == low]
+            for l, h in zip(*_nearest_pairs(np, pos, anchors, lambda a, o: sbc[o] & (imm[o] == high)
+                                            & _pair_ok(src[a], src[o], any_registers), step, forward_only=True)):
+                sites.append((int(pos[l]), 'compare', compared, name, f"r{src[h]}:r{src[l]}", 'cmp/sbc'))
+    return sites
+
+
+def scan(image, targets: Dict[int, str], isas=ISAS, any_registers: bool = False) -> List[ImmediateSite]:
+    """Every site of an image building or comparing a target value, by offset"""
+    from elf_parser import ElfFile
+
+    np = _numpy()
+    elf = ElfFile.from_image(image) if image.is_elf() else None
+    data = image.data
+    sites = set()
+    for offset, size, address in code_ranges(image):
+        for isa in isas:
+            step = 4 if isa == 'arm' else 2
+            skew = (-address) % step
+            count = (size - skew) // step
+            if count <= 0:
+                continue
+            units = np.frombuffer(data, dtype='<u4' if step == 4 else '<u2', count=count, offset=offset + skew)
+            table = (decode_arm if isa == 'arm' else decode_thumb)(np, units, offset + skew)
+            del units
+            for site in find_sites(np, table, targets, step, any_registers):
+                sites.add((site[0], isa) + site[1:])
+
+    results = []
+    for offset, isa, kind, value, label, registers, how in sorted(sites):
+        address = elf.offset_to_va(offset) if elf is not None else offset
+        results.append(ImmediateSite(offset, address if address is not None else offset, isa, kind,
+                                     value, label, registers, how))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find code building or comparing 64-bit capacity constants')
+    parser.add_argument('firmware', help='firmware image (e.g. secondary.elf)')
+    parser.add_argument('constants', nargs='*', metavar='NAME=VALUE', help='extra 64-bit values to look for')
+    parser.add_argument('--isa', default=','.join(ISAS), help=f'instruction sets to decode (default: {",".join(ISAS)})')
+    parser.add_argument('--any-registers', action='store_true',
+                        help='accept any two registers, not only AAPCS pairs (r0:r1, r2:r3, ...)')
+    parser.add_argument('--csv', metavar='FILE', help="write the sites to FILE ('-' for stdout)")
+    args = parser.parse_args()
+
+    from firmware_image import FirmwareImage
+    from pattern_scanner import parse_constant_args
+    from tracing import span
+
+    try:
+        isas = args.isa.split(',')
+        unknown = [isa for isa in isas if isa not in ISAS]
+        if unknown:
+            raise ValueError(f"Unknown instruction set: {', '.join(unknown)}")
+        targets = target_values(parse_constant_args(args.constants))
+        with FirmwareImage(args.firmware) as image:
+            with span('immediate_scanner', isas=args.isa) as stage:
+                sites = scan(image, targets, isas, args.any_registers)
+                stage.add_bytes(sum(size for _, size, _ in code_ranges(image)))
+    except (ImportError, OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if args.csv:
+        out = sys.stdout if args.csv == '-' else open(args.csv, 'w', newline='')
+        try:
+            writer = csv.writer(out)
+            writer.writerow(ImmediateSite._fields)
+            writer.writerows(sites)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        if args.csv == '-':
+            return
+
+    for site in sites:
+        print(f"0x{site.offset:08x}  0x{site.address:08x}  {site.isa:<5} {site.kind:<7} "
+              f"0x{site.value:<13x} {site.label:<20} {site.registers:<8} {site.how}")
+    print(f"\nTotal sites: {len(sites)}")
+
+
+if __name__ == "__main__":
+    main()
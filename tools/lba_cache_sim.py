@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 LBA Cache Simulator
+=============================
+
+Replays LBA traces from lba_trace.py against set-associative cache models to
+predict hit rates for a workload without touching a production unit. The
+cache is described by its size, line size and associativity (ways); a line
+maps to set (line number mod sets) like the tracker buckets of the device.
+Requests are split into the cache lines they cover, and every line access is
+a hit or a miss. Replacement policies:
+
+    lru     evict the least recently used line of the set
+    fifo    evict the line inserted first
+    random  evict a random line (seeded)
+
+Reads and writes both allocate unless --no-write-allocate is given.
+
+The replay is vectorized: each batch of accesses is ordered by set and by
+arrival within the set, and step k updates the k-th access of every set at
+once, so one NumPy operation covers up to one access per set; repeated hits
+to the line a set saw last are settled up front. Set states carry over from
+batch to batch, so the result is exactly that of replaying the trace one
+access at a time, and hundreds of millions of accesses run in bounded
+memory. Fully associative caches (--ways equal to the line count) have a
+single set and replay one access per step; use them for small runs.
+
+Usage:
+    python3 lba_cache_sim.py <trace.npy> [--size 64MiB,256MiB] [--policy lru,fifo,random]
+                             [--ways N] [--line BYTES] [--sector BYTES] [--tracker NAME]
+                             [--limit N] [--no-write-allocate] [--seed N] [--json FILE]
+
+Examples:
+    python3 lba_cache_sim.py hlbat.npy
+    python3 lba_cache_sim.py /tmp/workload.npy --size 256MiB,1GiB,4GiB --policy lru,fifo --ways 16
+    python3 lba_cache_sim.py hlbat.npy --tracker hlbat --line 65536 --json hlbat-sizing.json
+"""
+
+import re
+import sys
+import time
+from collections import namedtuple
+
+DEFAULT_SIZES = '64MiB,256MiB,1GiB'
+DEFAULT_POLICIES = 'lru,fifo,random'
+DEFAULT_WAYS = 8
+DEFAULT_LINE_BYTES = 4096
+DEFAULT_SECTOR_BYTES = 512
+
+POLICIES = ('lru', 'fifo', 'random')
+
+# Line accesses replayed per vectorized batch
+BATCH_LINES = 1 << 22
+
+_SIZE_UNITS = {'': 1, 'k': 1 << 10, 'ki': 1 << 10, 'm': 1 << 20, 'mi': 1 << 20,
+               'g': 1 << 30, 'gi': 1 << 30, 't': 1 << 40, 'ti': 1 << 40}
+
+SimulationResult = namedtuple('SimulationResult', [
+    'policy', 'size', 'sets', 'ways', 'accesses', 'hits', 'read_accesses', 'read_hits', 'seconds'])
+
+
+def parse_size(text: str) -> int:
+    """Bytes from "4096", "64MiB", "1g", ..."""
+    match = re.fullmatch(r'\s*([0-9.]+)\s*([A-Za-z]*?)[Bb]?\s*', text)
+    if not match or match.group(2).lower() not in _SIZE_UNITS:
+        raise ValueError(f"Invalid size: {text}")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).lower()])
+
+
+def format_size(size: int) -> str:
+    for unit in ('TiB', 'GiB', 'MiB', 'KiB'):
+        scale = _SIZE_UNITS[unit[:2].lower()]
+        if size >= scale and size % scale == 0:
+            return f"{size // scale}{unit}"
+    return str(size)
+
+
+class SetAssociativeCache:
+    """Tags and replacement stamps of a (sets x ways) cache of line numbers"""
+
+    def __init__(self, lines: int, ways: int, policy: str = 'lru', write_allocate: bool = True, seed: int = 0):
+        from lba_trace import _numpy
+
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy '{policy}' (expected one of: {', '.join(POLICIES)})")
+        if ways < 1 or lines < ways:
+            raise ValueError(f"Cache of {lines} lines cannot have {ways} ways")
+        self.np = np = _numpy()
+        self.ways = ways
+        self.sets = lines // ways
+        self.policy = policy
+        self.write_allocate = write_allocate
+        # -1 marks an empty way; empty ways have the oldest stamp, so fill first
+        self.tags = np.full((self.sets, ways), -1, dtype=np.int64)
+        self.stamps = np.full((self.sets, ways), -1, dtype=np.int64)
+        self.clock = 0
+        self._rng = np.random.default_rng(seed)
+        self.accesses = self.hits = self.read_accesses = self.read_hits = 0
+
+    @property
+    def lines(self) -> int:
+        return self.sets * self.ways
+
+    def access(self, lines, ops):
+        """Replay line accesses (in order); returns a boolean hit array"""
+        np = self.np
+        n = len(lines)
+        hits = np.empty(n, dtype=bool)
+        if not n:
+            return hits
+        sets = lines % self.sets
+
+        # Order by set, then arrival; keys of 16 bits or less get a radix sort
+        order = np.argsort(sets.astype(np.min_scalar_type(self.sets - 1)), kind='stable')
+        sorted_sets = sets[order]
+        # An access to the line its set saw last is a hit that changes nothing
+        # but the LRU stamp, and stamps only order lines of the same set, so
+        # the first of such a run stands for all of it. Hot lines would
+        # otherwise cost one step each.
+        sorted_lines = lines[order]
+        repeat = np.r_[False, (sorted_sets[1:] == sorted_sets[:-1]) & (sorted_lines[1:] == sorted_lines[:-1])]
+        if not self.write_allocate:
+            # A write miss leaves the line out of the cache
+            repeat[1:] &= ops[order[:-1]] == 0
+        hits[order[repeat]] = True
+        order, sorted_sets = order[~repeat], sorted_sets[~repeat]
+
+        # rank = position of an access within its set
+        m = len(order)
+        first = np.flatnonzero(np.r_[True, sorted_sets[1:] != sorted_sets[:-1]])
+        rank = np.arange(m) - np.repeat(first, np.diff(np.r_[first, m]))
+        # Regroup by rank: step k holds the k-th access of every set, at most one per set
+        by_rank = order[np.argsort(rank.astype(np.min_scalar_type(int(rank.max()))), kind='stable')]
+        bounds = np.r_[0, np.cumsum(np.bincount(rank))]
+
+        allocate = None if self.write_allocate else (ops == 0)
+        for k in range(len(bounds) - 1):
+            index = by_rank[bounds[k]:bounds[k + 1]]
+            hits[index] = self._step(sets[index], lines[index], self.clock + index,
+                                     None if allocate is None else allocate[index])
+
+        self.clock += n
+        reads = ops == 0
+        self.accesses += n
+        self.hits += int(np.count_nonzero(hits))
+        self.read_accesses += int(np.count_nonzero(reads))
+        self.read_hits += int(np.count_nonzero(hits & reads))
+        return hits
+
+    def _step(self, sets, tags, now, allocate):
+        """One access to each of distinct sets; returns hits"""
+        np = self.np
+        row_tags = self.tags[sets]
+        match = row_tags == tags[:, None]
+        hit = match.any(axis=1)
+
+        if self.policy == 'random':
+            empty = row_tags == -1
+            victim = np.where(empty.any(axis=1), empty.argmax(axis=1),
+                              self._rng.integers(0, self.ways, len(sets)))
+        else:
+            victim = self.stamps[sets].argmin(axis=1)
+        way = np.where(hit, match.argmax(axis=1), victim)
+
+        update = hit if allocate is None else hit | allocate
+        if allocate is not None:
+            sets, way, tags, now, hit = sets[update], way[update], tags[update], now[update], hit[update]
+        self.tags[sets, way] = tags
+        if self.policy == 'lru':
+            self.stamps[sets, way] = now
+        elif self.policy == 'fifo':
+            self.stamps[sets, way] = np.where(hit, self.stamps[sets, way], now)
+        return match.any(axis=1)
+
+
+def line_accesses(np, lba, blocks, ops, sector_bytes: int, line_bytes: int):
+    """Cache lines covered by each request, and the op of each line access"""
+    first = lba * sector_bytes // line_bytes
+    last = ((lba + np.maximum(blocks, 1)) * sector_bytes - 1) // line_bytes
+    count = last - first + 1
+    if not (count > 1).any():
+        return first, ops
+    total = int(count.sum())
+    starts = np.repeat(np.cumsum(count) - count, count)
+    return np.repeat(first, count) + (np.arange(total) - starts), np.repeat(ops, count)
+
+
+def simulate(trace, size: int, policy: str = 'lru', ways: int = DEFAULT_WAYS,
+             line_bytes: int = DEFAULT_LINE_BYTES, sector_bytes: int = DEFAULT_SECTOR_BYTES,
+             tracker: int = None, limit: int = None, write_allocate: bool = True,
+             seed: int = 0) -> SimulationResult:
+    """Replay a trace (from lba_trace.load_trace) against one cache configuration"""
+    from lba_trace import iter_batches
+    from tracing import span
+
+    lines = size // line_bytes
+    cache = SetAssociativeCache(lines, min(ways, lines), policy, write_allocate, seed)
+    np = cache.np
+    if limit is not None:
+        trace = trace[:limit]
+    start = time.perf_counter()
+    with span('cache_sim', policy=policy, size=size, ways=cache.ways) as stage:
+        # Requests per batch such that the split into lines stays near BATCH_LINES
+        batch = max(1, BATCH_LINES * line_bytes // max(line_bytes, 8 * sector_bytes))
+        for lba, blocks, ops in iter_batches(trace, batch, tracker):
+            line, line_ops = line_accesses(np, lba, blocks, ops, sector_bytes, line_bytes)
+            for first in range(0, len(line), BATCH_LINES):
+                cache.access(line[first:first + BATCH_LINES], line_ops[first:first + BATCH_LINES])
+        stage.add_bytes(cache.accesses)
+    return SimulationResult(policy, cache.lines * line_bytes, cache.sets, cache.ways, cache.accesses,
+                            cache.hits, cache.read_accesses, cache.read_hits, time.perf_counter() - start)
+
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Replay an LBA trace against set-associative cache models')
+    parser.add_argument('trace', help='trace .npy from lba_trace.py (or a plain array of LBAs)')
+    parser.add_argument('--size', default=DEFAULT_SIZES, help=f'comma-separated cache sizes (default: {DEFAULT_SIZES})')
+    parser.add_argument('--policy', default=DEFAULT_POLICIES,
+                        help=f'comma-separated policies of {", ".join(POLICIES)} (default: {DEFAULT_POLICIES})')
+    parser.add_argument('--ways', type=int, default=DEFAULT_WAYS, help=f'associativity (default: {DEFAULT_WAYS})')
+    parser.add_argument('--line', default=str(DEFAULT_LINE_BYTES), help=f'line size (default: {DEFAULT_LINE_BYTES})')
+    parser.add_argument('--sector', type=int, default=DEFAULT_SECTOR_BYTES,
+                        help=f'bytes per LBA (default: {DEFAULT_SECTOR_BYTES})')
+    parser.add_argument('--tracker', help='only replay accesses of this tracker (hlbat, zmdt, dlbat)')
+    parser.add_argument('--limit', type=int, help='replay only the first N requests')
+    parser.add_argument('--no-write-allocate', dest='write_allocate', action='store_false',
+                        help='write misses do not allocate a line')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random policy')
+    parser.add_argument('--json', metavar='FILE', help='also write the results to FILE')
+    args = parser.parse_args()
+
+    try:
+        from lba_trace import load_trace, trackers
+        sizes = [parse_size(size) for size in args.size.split(',')]
+        line_bytes = parse_size(args.line)
+        if line_bytes < 1:
+            raise ValueError(f"Invalid line size: {args.line}")
+        if args.ways < 1:
+            raise ValueError(f"Invalid way count: {args.ways}")
+        too_small = [format_size(size) for size in sizes if size // line_bytes < 1]
+        if too_small:
+            raise ValueError(f"Cache size {', '.join(too_small)} is smaller than one {format_size(line_bytes)} line")
+        policies = args.policy.split(',')
+        unknown = [policy for policy in policies if policy not in POLICIES]
+        if unknown:
+            raise ValueError(f"Unknown policy: {', '.join(unknown)}")
+        tracker = None
+        if args.tracker:
+            names = [name for name, _ in trackers()]
+            if args.tracker not in names:
+                raise ValueError(f"Unknown tracker '{args.tracker}' (expected one of: {', '.join(names)})")
+            tracker = names.index(args.tracker)
+        trace = load_trace(args.trace)
+
+        print(f"{'policy':<7} {'size':>8} {'sets x ways':>16} {'accesses':>14} {'hit rate':>9} "
+              f"{'read hit':>9} {'M acc/s':>8}")
+        results = []
+        for size in sizes:
+            for policy in policies:
+                result = simulate(trace, size, policy, args.ways, line_bytes, args.sector, tracker,
+                                  args.limit, args.write_allocate, args.seed)
+                results.append(result)
+                hit_rate = result.hits / result.accesses if result.accesses else 0.0
+                read_rate = result.read_hits / result.read_accesses if result.read_accesses else 0.0
+                print(f"{policy:<7} {format_size(result.size):>8} {f'{result.sets} x {result.ways}':>16} "
+                      f"{result.accesses:>14,} {hit_rate:>9.2%} {read_rate:>9.2%} "
+                      f"{result.accesses / max(result.seconds, 1e-9) / 1e6:>8.1f}")
+    except (ImportError, OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if args.json:
+        from cache import atomic_write
+        document = [dict(r._asdict(), line_bytes=line_bytes, sector_bytes=args.sector,
+                         write_allocate=args.write_allocate) for r in results]
+        atomic_write(args.json, (json.dumps(document, indent=2) + '\n').encode('utf-8'))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 LBA Trace Ingestion
+=============================
+
+Parses console dumps of the cache trackers named in DebugInterfaces - hlbat
+(host LBA cache), zmdt (zone metadata) and dlbat (disk LBA cache) - into
+NumPy LBA traces for lba_cache_sim.py. A dump is the tracker banner (e.g.
+"hlbat = HOST LBA CACHE TRACKER") followed by indented lines of two kinds:
+
+    bucket 3: hits 1234  misses 56      counters of the device's own cache
+    1042: R lba 0x1a2b3c blocks 8       one recorded access (R/W/RD/WR/READ/WRITE;
+                                        sequence number and labels optional)
+
+Logs are memory-mapped and scanned banner to banner as in perf_log.py; lines
+may carry the timestamp prefix written by `serial_console.py --log`.
+
+Traces are NumPy .npy files holding a structured array (trace_dtype(): lba,
+time, blocks, op, tracker). They are written in chunks and read back
+memory-mapped, so traces of hundreds of millions of accesses never have to
+fit in memory. A plain unsigned .npy array of LBAs is accepted as a trace of
+1-block reads. `synth` writes a synthetic workload (hot extents plus
+sequential runs) for sizing runs without a capture.
+
+Usage:
+    python3 lba_trace.py ingest <trace.npy> <log> [log ...]
+    python3 lba_trace.py synth <trace.npy> [--count N] [--footprint BLOCKS] [--hot F]
+                         [--read-ratio F] [--seed N]
+    python3 lba_trace.py info <trace.npy>
+
+Examples:
+    python3 lba_trace.py ingest hlbat.npy /data/console/*.log
+    python3 lba_trace.py synth /tmp/workload.npy --count 200000000
+    python3 lba_trace.py info hlbat.npy
+"""
+
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+from collections import namedtuple
+from typing import Dict, Iterator, List
+
+READ = 0
+WRITE = 1
+
+# Records per chunk written or read in one go
+CHUNK_RECORDS = 1 << 22
+
+# Reserved .npy header (format 1.0): fixed so the record count can be filled in last
+_NPY_HEADER_SIZE = 256
+
+TRACKER_MARKER = b' TRACKER'
+
+_NUMBER = rb'(?:0x[0-9A-Fa-f]+|\d+)'
+
+
+def _line_patterns():
+    from perf_log import TIMESTAMP_PREFIX
+
+    prefix = rb'(?:' + TIMESTAMP_PREFIX + rb')?'
+    access = re.compile(
+        rb'^' + prefix + rb'[ \t]+(?:\d+:[ \t]*)?(READ|WRITE|RD|WR|R|W)[ \t]+(?:lba[ \t]*[:=]?[ \t]*)?('
+        + _NUMBER + rb')(?:[ \t]+(?:(?:blocks|len|cnt)[ \t]*[:=]?[ \t]*)?(' + _NUMBER + rb'))?[ \t]*\r?$',
+        re.M | re.I)
+    bucket = re.compile(
+        rb'^' + prefix + rb'[ \t]+bucket[ \t]*(\d+)[ \t]*:?[ \t]*hits[ \t]*[:=]?[ \t]*(\d+)[ \t,]+'
+        rb'misses[ \t]*[:=]?[ \t]*(\d+)', re.M | re.I)
+    indented = re.compile(prefix + rb'[ \t]')
+    block_end = re.compile(rb'\n(?!' + prefix + rb'[ \t])')
+    return access, bucket, indented, block_end
+
+
+TrackerDump = namedtuple('TrackerDump', ['tracker', 'time', 'buckets', 'records'])
+
+
+def _numpy():
+    """NumPy, imported on first use as it costs ~80 ms of startup"""
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("LBA traces need NumPy (pip install numpy)") from None
+    return numpy
+
+
+def trace_dtype():
+    """Record type of a trace: 24 bytes, naturally aligned"""
+    np = _numpy()
+    return np.dtype([('lba', '<u8'), ('time', '<f8'), ('blocks', '<u4'), ('op', 'u1'), ('tracker', 'u1')],
+                    align=True)
+
+
+def trackers() -> List[tuple]:
+    """(name, banner text) of each tracker; the index is the trace's tracker field"""
+    from offsets import DebugInterfaces
+
+    banners = (DebugInterfaces.HOST_LBA_CACHE, DebugInterfaces.ZONE_METADATA, DebugInterfaces.DISK_LBA_CACHE)
+    return [tuple(part.strip() for part in banner.split('=', 1)) for banner in banners]
+
+
+def _time(stamp: bytes, relative: bytes) -> float:
+    from perf_log import parse_timestamp
+
+    if stamp:
+        return parse_timestamp(stamp + b' ')
+    return float(relative) if relative else math.nan
+
+
+def iter_tracker_dumps(data) -> Iterator[TrackerDump]:
+    """Tracker dumps in a log buffer (bytes or mmap), in log order
+
+    records is a list of (time, lba, blocks, op) tuples, buckets maps a
+    bucket number to (hits, misses).
+    """
+    from perf_log import parse_timestamp
+
+    access, bucket, indented, block_end = _line_patterns()
+    banners = [(index, text.encode('ascii')) for index, (_, text) in enumerate(trackers())]
+    size = len(data)
+    pos = data.find(TRACKER_MARKER)
+    while pos >= 0:
+        line_start = data.rfind(b'\n', 0, pos) + 1
+        line_end = data.find(b'\n', pos)
+        if line_end < 0:
+            line_end = size
+        line = data[line_start:line_end]
+        pos = line_end + 1
+        tracker = next((index for index, text in banners if text in line), None)
+        if tracker is not None and pos < size and indented.match(data, pos):
+            end_match = block_end.search(data, pos)
+            end = end_match.start() + 1 if end_match else size
+            banner_time = parse_timestamp(line)
+            buckets = {int(number): (int(hits), int(misses))
+                       for _, _, number, hits, misses in bucket.findall(data, pos, end)}
+            records = []
+            for stamp, relative, op, lba, blocks in access.findall(data, pos, end):
+                time = _time(stamp, relative) if stamp or relative else banner_time
+                records.append((time, int(lba, 0) if lba[:2].lower() == b'0x' else int(lba),
+                                (int(blocks, 0) if blocks[:2].lower() == b'0x' else int(blocks)) if blocks else 1,
+                                WRITE if op[:1] in b'Ww' else READ))
+            yield TrackerDump(tracker, banner_time, buckets, records)
+            pos = end
+        pos = data.find(TRACKER_MARKER, pos)
+
+
+class TraceWriter:
+    """Appends records to a .npy trace without holding them in memory
+
+    The file is written under a temporary name and renamed into place by
+    close(), so readers never see a partial trace.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self.dtype = trace_dtype()
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, self._tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        self._file = os.fdopen(fd, 'wb')
+        self._file.write(bytes(_NPY_HEADER_SIZE))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def append(self, records):
+        """Append a trace_dtype() array"""
+        self._file.write(memoryview(records).cast('B'))
+        self.count += len(records)
+
+    def append_rows(self, rows, tracker: int = 0):
+        """Append (time, lba, blocks, op) tuples"""
+        np = _numpy()
+        records = np.zeros(len(rows), dtype=self.dtype)
+        if rows:
+            time, lba, blocks, op = zip(*rows)
+            records['time'], records['lba'], records['blocks'], records['op'] = time, lba, blocks, op
+            records['tracker'] = tracker
+        self.append(records)
+
+    def _header(self) -> bytes:
+        np = _numpy()
+        header = repr({'descr': np.lib.format.dtype_to_descr(self.dtype), 'fortran_order': False,
+                       'shape': (self.count,)}).encode('latin-1')
+        length = _NPY_HEADER_SIZE - 10
+        if len(header) >= length:
+            raise ValueError("Trace header does not fit the reserved space")
+        return b'\x93NUMPY\x01\x00' + struct.pack('<H', length) + header.ljust(length - 1) + b'\n'
+
+    def close(self):
+        from cache import fsync_directory, new_file_mode
+
+        if self._file is None:
+            return
+        os.fchmod(self._file.fileno(), new_file_mode(self.path))
+        self._file.seek(0)
+        self._file.write(self._header())
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        os.replace(self._tmp_path, self.path)
+        fsync_directory(os.path.dirname(os.path.abspath(self.path)))
+
+    def abort(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        try:
+            os.unlink(self._tmp_path)
+        except OSError:
+            pass
+
+
+def load_trace(path: str):
+    """Memory-mapped trace: a trace_dtype() array, or a plain array of LBAs"""
+    np = _numpy()
+    try:
+        trace = np.load(path, mmap_mode='r')
+    except (EOFError, ValueError):
+        # Empty, truncated or not a .npy file at all
+        raise ValueError(f"Not an LBA trace: {path}") from None
+    if not isinstance(trace, np.ndarray) or trace.ndim != 1 or (trace.dtype.names is None and trace.dtype.kind not in 'ui'):
+        raise ValueError(f"Not an LBA trace: {path}")
+    if trace.dtype.names is not None and not {'lba', 'blocks', 'op'} <= set(trace.dtype.names):
+        raise ValueError(f"Not an LBA trace (fields {', '.join(trace.dtype.names)}): {path}")
+    return trace
+
+
+def iter_batches(trace, batch: int = CHUNK_RECORDS, tracker: int = None):
+    """(lba, blocks, op) int64/int64/uint8 arrays of up to batch records each"""
+    np = _numpy()
+    for start in range(0, len(trace), batch):
+        chunk = trace[start:start + batch]
+        if chunk.dtype.names is None:
+            lba = np.asarray(chunk, dtype=np.int64)
+            yield lba, np.ones(len(lba), dtype=np.int64), np.zeros(len(lba), dtype=np.uint8)
+            continue
+        if tracker is not None:
+            chunk = chunk[chunk['tracker'] == tracker]
+        yield chunk['lba'].astype(np.int64), chunk['blocks'].astype(np.int64), np.asarray(chunk['op'])
+
+
+def ingest(output: str, paths) -> Dict[int, Dict]:
+    """Write the accesses of every tracker dump in the logs to a trace
+
+    Returns per-tracker totals: dumps, accesses and the bucket counters of
+    the last dump (cumulative on the device).
+    """
+    from tracing import span
+
+    summary = {}
+    with TraceWriter(output) as writer:
+        for path in paths:
+            with span('lba_trace:ingest', file=path) as stage, open(path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    for dump in iter_tracker_dumps(data):
+                        writer.append_rows(dump.records, dump.tracker)
+                        entry = summary.setdefault(dump.tracker, {'dumps': 0, 'accesses': 0, 'buckets': {}})
+                        entry['dumps'] += 1
+                        entry['accesses'] += len(dump.records)
+                        if dump.buckets:
+                            entry['buckets'] = dump.buckets
+                    stage.add_bytes(len(data))
+    return summary
+
+
+def synthesize(output: str, count: int, footprint: int = 1 << 30, hot: float = 0.6,
+               read_ratio: float = 0.7, seed: int = 0, iops: float = 10000.0):
+    """Write a synthetic host workload of count accesses over footprint blocks
+
+    A hot fraction of the accesses hits 4 KiB extents of a hot set (5% of the
+    footprint) with Zipf popularity; the rest are sequential runs of 32 KiB
+    requests starting at random places.
+    """
+    np = _numpy()
+    rng = np.random.default_rng(seed)
+    hot_extents = max(1, footprint // 20 // 8)
+    # Odd multiplier: scatters popular extents across the hot set
+    scatter = 0x9E3779B97F4A7C15 % hot_extents | 1
+    with TraceWriter(output) as writer:
+        for start in range(0, count, CHUNK_RECORDS):
+            n = min(CHUNK_RECORDS, count - start)
+            records = np.zeros(n, dtype=writer.dtype)
+            is_hot = rng.random(n) < hot
+
+            rank = np.minimum(rng.zipf(1.2, n), hot_extents) - 1
+            hot_lba = (rank * scatter % hot_extents) * 8
+
+            new_run = rng.random(n) < 1 / 64
+            new_run[0] = True
+            run = np.cumsum(new_run) - 1
+            run_start = np.flatnonzero(new_run)
+            origin = rng.integers(0, max(1, footprint - 64 * 1024), len(run_start)) & ~63
+            step = np.arange(n) - run_start[run]
+            sequential_lba = (origin[run] + step * 64) % footprint
+
+            records['lba'] = np.where(is_hot, hot_lba, sequential_lba)
+            records['blocks'] = np.where(is_hot, 8, 64)
+            records['op'] = np.where(rng.random(n) < read_ratio, READ, WRITE)
+            records['time'] = (start + np.arange(n)) / iops
+            writer.append(records)
+    return count
+
+
+def describe(trace) -> Dict:
+    np = _numpy()
+    info = {'accesses': len(trace)}
+    if not len(trace):
+        return info
+    if trace.dtype.names is None:
+        info.update(reads=len(trace), writes=0, lba_min=int(trace.min()), lba_max=int(trace.max()), blocks=len(trace))
+        return info
+    reads = blocks = 0
+    low, high = None, None
+    first, last = math.nan, math.nan
+    trackers_seen = np.zeros(256, dtype=np.int64)
+    for start in range(0, len(trace), CHUNK_RECORDS):
+        chunk = trace[start:start + CHUNK_RECORDS]
+        reads += int(np.count_nonzero(chunk['op'] == READ))
+        blocks += int(chunk['blocks'].sum(dtype=np.int64))
+        chunk_low, chunk_high = int(chunk['lba'].min()), int(chunk['lba'].max())
+        low = chunk_low if low is None else min(low, chunk_low)
+        high = chunk_high if high is None else max(high, chunk_high)
+        times = chunk['time'][~np.isnan(chunk['time'])]
+        if len(times):
+            first = times.min() if math.isnan(first) else min(first, times.min())
+            last = times.max() if math.isnan(last) else max(last, times.max())
+        trackers_seen += np.bincount(chunk['tracker'], minlength=256)
+    names = [name for name, _ in trackers()]
+    info.update(reads=reads, writes=len(trace) - reads, blocks=blocks, lba_min=low, lba_max=high,
+                seconds=float(last - first),
+                trackers={names[i] if i < len(names) else str(i): int(c)
+                          for i, c in enumerate(trackers_seen) if c})
+    return info
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Cache tracker dumps to NumPy LBA traces')
+    sub = parser.add_subparsers(dest='command', required=True)
+    ingest_parser = sub.add_parser('ingest', help='parse hlbat/zmdt/dlbat dumps from console logs')
+    ingest_parser.add_argument('trace')
+    ingest_parser.add_argument('logs', nargs='+', help='log files, directories or @list files')
+    synth = sub.add_parser('synth', help='write a synthetic host workload')
+    synth.add_argument('trace')
+    synth.add_argument('--count', type=int, default=10_000_000, help='accesses (default: 10M)')
+    synth.add_argument('--footprint', type=int, default=1 << 30, help='LBA range in blocks (default: 512 GiB)')
+    synth.add_argument('--hot', type=float, default=0.6, help='fraction of hot-set accesses (default: 0.6)')
+    synth.add_argument('--read-ratio', type=float, default=0.7, help='fraction of reads (default: 0.7)')
+    synth.add_argument('--seed', type=int, default=0)
+    info = sub.add_parser('info', help='summarize a trace')
+    info.add_argument('trace')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'ingest':
+            from batch import iter_firmware_paths
+            paths = [path for source in args.logs for path in iter_firmware_paths(source, '*.log')]
+            summary = ingest(args.trace, paths)
+            names = [name for name, _ in trackers()]
+            print(f"Trace: {args.trace} from {len(paths)} log(s)")
+            for tracker, entry in sorted(summary.items()):
+                hits = sum(h for h, _ in entry['buckets'].values())
+                misses = sum(m for _, m in entry['buckets'].values())
+                observed = f", device hit rate {hits / (hits + misses):.1%}" if hits + misses else ''
+                print(f"  {names[tracker]:<6} {entry['dumps']:>6} dumps {entry['accesses']:>12,} accesses{observed}")
+        elif args.command == 'synth':
+            count = synthesize(args.trace, args.count, args.footprint, args.hot, args.read_ratio, args.seed)
+            print(f"Trace: {args.trace} ({count:,} accesses, {os.path.getsize(args.trace) / 1048576:.1f} MiB)")
+        else:
+            info = describe(load_trace(args.trace))
+            for key, value in info.items():
+                print(f"{key:<10} {value:,}" if isinstance(value, int) else f"{key:<10} {value}")
+    except (ImportError, OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
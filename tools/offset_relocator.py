@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Offset Relocator
+==========================
+
+Carries the known secondary.elf offsets over to new firmware builds. From a
+reference image (4.2.3, where every DroboOffsets value is known) it records
+byte signatures around each field: the bytes just before and after it, the
+field itself for strings, and any known string nearby such as the
+"mbProtectionMode        :" label next to CONFIG.PROTECTION_MODE.
+
+For a new image all anchors of all fields are searched in one multi-pattern
+pass. Every anchor hit votes for a field position; the best-supported
+position becomes the candidate offset with a confidence score (the weighted
+fraction of the field's anchors that agree, where anchors matching in
+several places count for less).
+
+Usage:
+    python3 offset_relocator.py record <reference_image> <signatures.json>
+    python3 offset_relocator.py relocate <new_image> <signatures.json> [candidates.json]
+
+Examples:
+    python3 offset_relocator.py record ../extracted/secondary.elf signatures-4.2.3.json
+    python3 offset_relocator.py relocate secondary-4.3.0.elf signatures-4.2.3.json candidates.json
+"""
+
+import json
+import sys
+from collections import Counter, defaultdict
+from typing import Dict
+from cache import atomic_write
+from offsets import DroboOffsets
+from pattern_scanner import MultiPatternScanner
+
+SIGNATURE_VERSION = 1
+
+# Bytes recorded on each side of a field
+WINDOW = 16
+
+# Known strings this close to a field are used as extra anchors
+RELATED_DISTANCE = 0x100
+
+# Longest string prefix used as an anchor
+MAX_STRING_ANCHOR = 32
+
+# Field sizes by DroboOffsets group (strings are measured in the image)
+GROUP_SIZES = {'CONFIG': 4, 'CAPACITY_LIMITS': 8}
+
+# Anchors with fewer distinct byte values (zero fill, erased flash) are skipped
+MIN_DISTINCT_BYTES = 4
+
+
+def _string_at(image, offset: int) -> bytes:
+    """NUL-terminated string at offset (without the NUL), capped"""
+    end = image.find(b'\x00', offset, min(offset + 256, len(image)))
+    return image.read(offset, (end if end != -1 else min(offset + 256, len(image))) - offset)
+
+
+def _informative(data: bytes) -> bool:
+    return len(set(data)) >= MIN_DISTINCT_BYTES
+
+
+def record_signatures(image, version: str = None) -> Dict:
+    """Signatures for every known secondary.elf offset in a reference image"""
+    known = list(DroboOffsets.iter_secondary_offsets())
+    strings = {
+        name: offset for group, name, offset in known if group == 'STRINGS'
+    }
+
+    fields = []
+    for group, name, offset in known:
+        if group == 'STRINGS':
+            value = _string_at(image, offset)
+            size = len(value) + 1
+        else:
+            value = None
+            size = GROUP_SIZES.get(group, 4)
+        if offset + size > len(image):
+            continue
+
+        anchors = []
+        if value and _informative(value[:MAX_STRING_ANCHOR]):
+            anchors.append({'kind': 'value', 'delta': 0, 'bytes': value[:MAX_STRING_ANCHOR].hex()})
+
+        before = image.read(max(0, offset - WINDOW), min(WINDOW, offset))
+        if _informative(before):
+            anchors.append({'kind': 'before', 'delta': -len(before), 'bytes': before.hex()})
+
+        after = image.read(offset + size, min(WINDOW, len(image) - offset - size))
+        if _informative(after):
+            anchors.append({'kind': 'after', 'delta': size, 'bytes': after.hex()})
+
+        for string_name, string_offset in strings.items():
+            if string_name == name or abs(string_offset - offset) > RELATED_DISTANCE:
+                continue
+            text = _string_at(image, string_offset)[:MAX_STRING_ANCHOR]
+            if _informative(text):
+                anchors.append({'kind': f'string:{string_name}', 'delta': string_offset - offset,
+                                'bytes': text.hex()})
+
+        fields.append({
+            'field': f"{group}.{name}",
+            'offset': f"0x{offset:x}",
+            'size': size,
+            'anchors': anchors,
+        })
+
+    return {
+        'version': SIGNATURE_VERSION,
+        'firmware_version': version or DroboOffsets.FIRMWARE_VERSION,
+        'reference_sha256': image.sha256(),
+        'window': WINDOW,
+        'fields': fields,
+    }
+
+
+def relocate(image, signatures: Dict) -> Dict[str, Dict]:
+    """Candidate offset and confidence for every field in a new image"""
+    if signatures.get('version') != SIGNATURE_VERSION:
+        raise ValueError("Unsupported signature file version")
+
+    patterns = {}
+    for i, field in enumerate(signatures['fields']):
+        for j, anchor in enumerate(field['anchors']):
+            patterns[f"{i}:{j}"] = bytes.fromhex(anchor['bytes'])
+
+    results = {}
+    if not patterns:
+        return results
+
+    # One pass over the image for every anchor of every field
+    hits = defaultdict(list)
+    for hit in MultiPatternScanner(patterns).scan(image.data):
+        hits[hit.name].append(hit.offset)
+
+    for i, field in enumerate(signatures['fields']):
+        reference = int(field['offset'], 16)
+        anchors = field['anchors']
+        votes = Counter()
+        for j, anchor in enumerate(anchors):
+            offsets = hits.get(f"{i}:{j}", [])
+            for offset in offsets:
+                # An anchor found in n places contributes 1/n to each
+                votes[offset - anchor['delta']] += 1.0 / len(offsets)
+
+        entry = {
+            'reference_offset': field['offset'],
+            'offset': None,
+            'shift': None,
+            'confidence': 0.0,
+            'anchors_matched': f"0/{len(anchors)}",
+            'alternatives': 0,
+        }
+        if votes:
+            # Ties go to the candidate nearest the reference offset
+            best, score = max(votes.items(), key=lambda item: (item[1], -abs(item[0] - reference)))
+            matched = sum(
+                1 for j, anchor in enumerate(anchors)
+                if best + anchor['delta'] in hits.get(f"{i}:{j}", ())
+            )
+            entry.update({
+                'offset': f"0x{best:x}",
+                'shift': best - reference,
+                'confidence': round(score / len(anchors), 3),
+                'anchors_matched': f"{matched}/{len(anchors)}",
+                'alternatives': len(votes) - 1,
+            })
+        results[field['field']] = entry
+
+    return results
+
+
+def main():
+    if len(sys.argv) < 4 or sys.argv[1] not in ('record', 'relocate'):
+        print("Usage: python3 offset_relocator.py record <reference_image> <signatures.json>")
+        print("       python3 offset_relocator.py relocate <new_image> <signatures.json> [candidates.json]")
+        print("Examples:")
+        print("  python3 offset_relocator.py record ../extracted/secondary.elf signatures-4.2.3.json")
+        print("  python3 offset_relocator.py relocate secondary-4.3.0.elf signatures-4.2.3.json candidates.json")
+        sys.exit(1)
+
+    from firmware_image import FirmwareImage
+
+    command, filename, signatures_path = sys.argv[1:4]
+
+    with FirmwareImage(filename) as image:
+        if command == 'record':
+            signatures = record_signatures(image)
+            atomic_write(signatures_path, json.dumps(signatures, indent=2).encode('utf-8'))
+            anchor_count = sum(len(f['anchors']) for f in signatures['fields'])
+            print(f"Recorded {anchor_count} anchors for {len(signatures['fields'])} fields -> {signatures_path}")
+            return
+
+        with open(signatures_path, 'r') as f:
+            signatures = json.load(f)
+        try:
+            results = relocate(image, signatures)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        sha256 = image.sha256()
+
+    print(f"Relocating {signatures['firmware_version']} offsets into {filename}")
+    for name, entry in results.items():
+        if entry['offset'] is None:
+            print(f"  ✗ {name:<36} not found ({entry['anchors_matched']} anchors)")
+            continue
+        print(f"  {'✓' if entry['confidence'] >= 0.5 else '?'} {name:<36} "
+              f"{entry['reference_offset']} -> {entry['offset']} ({entry['shift']:+#x})  "
+              f"confidence {entry['confidence']:.2f}  anchors {entry['anchors_matched']}")
+
+    if len(sys.argv) > 4:
+        payload = {
+            'reference_firmware_version': signatures['firmware_version'],
+            'image_sha256': sha256,
+            'fields': results,
+        }
+        atomic_write(sys.argv[4], json.dumps(payload, indent=2).encode('utf-8'))
+        print(f"\nCandidate offsets written to {sys.argv[4]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,15 +17,24 @@ Usage:
     
     # Load from JSON for dynamic usage
     offsets = DroboOffsets.load_from_json('memory-offsets.json')
+    
+    # Version-specific offsets, detected from a TDF container's TDIH header
+    offset_set = OffsetRegistry.default().for_image(image)
+    bytes_limit_addr = offset_set.offset('bytes_limit')
 """
 
-import json
+import bisect
+import functools
 import os
-from typing import Dict, Any, Optional
-from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
+
+# json, re and glob are imported where used: most tools only need the
+# constant tables below, and every CLI invocation pays for module imports
+
+# Default location of the offset data files (memory-offsets*.json)
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'docs', 'data')
 
 # Firmware Component Offsets
-@dataclass
 class FirmwareComponents:
     """TDF container component offsets"""
     MAIN_VXWORKS_ELF = 0x22C              # Bootloader (556 decimal)
@@ -33,7 +42,6 @@ class FirmwareComponents:
     VXWORKS_KERNEL_BIN = 0xF59BFC         # VxWorks kernel (16096252 decimal)
 
 # Configuration Block Offsets (secondary.elf)
-@dataclass
 class ConfigurationOffsets:
     """Main configuration block offsets in secondary.elf"""
     BASE_OFFSET = 0x66d6f0                 # Configuration block base
@@ -44,7 +52,6 @@ class ConfigurationOffsets:
     LAST_UI_CALL_TIME = 0x66d770           # mLastUICallTime
 
 # Capacity Limit Offsets
-@dataclass
 class CapacityLimits:
     """Known capacity limit locations for patching"""
     BYTES_BASED = 0x65b097                 # 2TB bytes limit
@@ -59,7 +66,6 @@ class CapacityLimits:
     PATCH_SECTORS_LIMIT = 68719476736      # 32TB in sectors
 
 # String Reference Offsets
-@dataclass
 class StringOffsets:
     """Key string locations in secondary.elf"""
     ZMDT_TRACKER = 0x656d30                # "zmdt = ZONE METADATA TRACKER"
@@ -134,6 +140,159 @@ class DebugInterfaces:
         "redmodeslowdown on|off"   # Red mode performance control
     ]
 
+# Versioned offset registry
+@functools.lru_cache(maxsize=32)
+def _load_json_file(path: str, mtime_ns: int) -> Dict[str, Any]:
+    import json
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def load_json_cached(path: str) -> Dict[str, Any]:
+    """Parse a JSON file once per process (re-read only if it changes)
+
+    The returned dictionary is shared between callers; treat it as read-only.
+    """
+    return _load_json_file(os.path.abspath(path), os.stat(path).st_mtime_ns)
+
+class OffsetSet:
+    """Offsets for one firmware version, compiled for fast lookups
+    
+    Every JSON entry with an "offset" is reachable by its own key and by its
+    dotted path (e.g. "capacity_limits.bytes_based_limit"), case-insensitively,
+    in O(1). Patchable regions are kept as sorted, merged intervals and
+    searched with bisect in O(log n).
+    """
+    
+    # Short names accepted by DroboOffsets.get_offset_by_name()
+    ALIASES = {
+        'protection_mode': 'mbprotectionmode',
+        'large_pack_mode': 'mblargepackmode',
+        'bytes_limit': 'bytes_based_limit',
+        'sectors_limit': 'sectors_based_limit',
+    }
+    
+    CONFIG_BLOCK_SIZE = 0x100      # Patchable span of the configuration block
+    LIMIT_SIZE = 8                 # Capacity limits are 64-bit values
+    
+    def __init__(self, version: str, data: Dict[str, Any]):
+        self.version = version
+        self.data = data
+        self._names: Dict[str, int] = {}
+        self._collect(data, ())
+        for alias, target in self.ALIASES.items():
+            if target in self._names:
+                self._names.setdefault(alias, self._names[target])
+        
+        secondary = data.get('secondary_elf_offsets', {})
+        regions = []
+        block = secondary.get('configuration_block', {})
+        if 'base_offset' in block:
+            base = int(block['base_offset'], 16)
+            regions.append((base, base + self.CONFIG_BLOCK_SIZE))
+        for entry in secondary.get('capacity_limits', {}).values():
+            offset = int(entry['offset'], 16)
+            regions.append((offset, offset + self.LIMIT_SIZE))
+        
+        merged: List[Tuple[int, int]] = []
+        for start, end in sorted(regions):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        self._region_starts = [start for start, _ in merged]
+        self._region_ends = [end for _, end in merged]
+    
+    def _collect(self, node, path):
+        if not isinstance(node, dict):
+            return
+        if isinstance(node.get('offset'), str) and path:
+            offset = int(node['offset'], 16)
+            # Keep the first entry for ambiguous leaf names; dotted paths are unique
+            self._names.setdefault(path[-1].lower(), offset)
+            for i in range(len(path) - 1):
+                self._names['.'.join(path[i:]).lower()] = offset
+        for key, value in node.items():
+            self._collect(value, path + (key,))
+    
+    def offset(self, name: str) -> Optional[int]:
+        """Offset of a named entry, None if unknown"""
+        return self._names.get(name.lower())
+    
+    def names(self) -> List[str]:
+        return sorted(self._names)
+    
+    def is_patchable(self, offset: int) -> bool:
+        i = bisect.bisect_right(self._region_starts, offset) - 1
+        return i >= 0 and offset < self._region_ends[i]
+    
+    def components(self) -> List[Tuple[str, int]]:
+        """(name, offset) of the TDF container components, in offset order"""
+        container = self.data.get('firmware_components', {}).get('tdf_container', {})
+        return sorted(((name, int(entry['offset'], 16)) for name, entry in container.items()),
+                      key=lambda item: item[1])
+
+class OffsetRegistry:
+    """Offset sets for every firmware version with a memory-offsets*.json file
+    
+    Each data file names its version in metadata.firmware_version. Files are
+    parsed once per process and compiled on first use.
+    """
+    
+    FILE_PATTERN = 'memory-offsets*.json'
+    
+    # TDIH firmware string, e.g. "Drobo5D3 4.2.3 build"
+    TDIH_FIRMWARE_STRING_OFFSET = 0x30
+    TDIH_FIRMWARE_STRING_SIZE = 32
+    _VERSION_PATTERN = rb'(\d+\.\d+\.\d+)'
+    
+    def __init__(self, data_dir: str = DEFAULT_DATA_DIR):
+        self.data_dir = data_dir
+        self._paths: Dict[str, str] = {}
+        self._sets: Dict[str, OffsetSet] = {}
+        import glob
+        for path in sorted(glob.glob(os.path.join(data_dir, self.FILE_PATTERN))):
+            version = load_json_cached(path).get('metadata', {}).get('firmware_version')
+            if version:
+                self._paths.setdefault(version, path)
+    
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def default(cls) -> 'OffsetRegistry':
+        """Process-wide registry over the bundled data directory"""
+        return cls()
+    
+    def versions(self) -> List[str]:
+        return sorted(self._paths, key=lambda v: tuple(int(p) for p in v.split('.') if p.isdigit()))
+    
+    def get(self, version: str = None) -> OffsetSet:
+        """Compiled offsets for a version (default: DroboOffsets.FIRMWARE_VERSION)"""
+        version = version or DroboOffsets.FIRMWARE_VERSION
+        if version not in self._sets:
+            if version not in self._paths:
+                raise KeyError(f"No offsets for firmware version {version} in {self.data_dir}")
+            self._sets[version] = OffsetSet(version, load_json_cached(self._paths[version]))
+        return self._sets[version]
+    
+    @classmethod
+    def detect_version(cls, data) -> Optional[str]:
+        """Firmware version from a TDIH header's firmware string, None if absent"""
+        start = cls.TDIH_FIRMWARE_STRING_OFFSET
+        if len(data) < start or bytes(data[8:12]) != b'TDIH':
+            return None
+        field = bytes(data[start:start + cls.TDIH_FIRMWARE_STRING_SIZE]).split(b'\x00', 1)[0]
+        import re
+        match = re.search(cls._VERSION_PATTERN, field)
+        return match.group(1).decode('ascii') if match else None
+    
+    def for_image(self, image) -> OffsetSet:
+        """Offsets matching a TDF container's version (default version otherwise)"""
+        header = image.view(0, min(len(image), 0x100))
+        try:
+            version = self.detect_version(header)
+        finally:
+            header.release()
+        return self.get(version if version in self._paths else None)
+
 # Main offset container class
 class DroboOffsets:
     """Container for all Drobo firmware offsets and constants"""
@@ -154,21 +313,41 @@ class DroboOffsets:
     
     @classmethod
     def load_from_json(cls, json_path: str = None) -> Optional[Dict[str, Any]]:
-        """Load offset data from JSON file"""
+        """Load offset data from JSON file (parsed once per process)"""
         if json_path is None:
             # Default to data directory relative to this file
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            json_path = os.path.join(script_dir, '..', 'docs', 'data', 'memory-offsets.json')
+            json_path = os.path.join(DEFAULT_DATA_DIR, 'memory-offsets.json')
         
         try:
-            with open(json_path, 'r') as f:
-                return json.load(f)
+            return load_json_cached(json_path)
         except FileNotFoundError:
             return None
     
     @classmethod
-    def get_offset_by_name(cls, name: str) -> Optional[int]:
-        """Get offset by symbolic name"""
+    def _offset_set(cls, version: str = None) -> Optional['OffsetSet']:
+        """Registry offsets for a version, None without data files for it"""
+        try:
+            return OffsetRegistry.default().get(version)
+        except KeyError:
+            return None
+    
+    @classmethod
+    def _uses_constants(cls, version: str = None) -> bool:
+        # The constants in this module describe the default firmware version
+        return version in (None, cls.FIRMWARE_VERSION)
+    
+    @classmethod
+    def get_offset_by_name(cls, name: str, version: str = None) -> Optional[int]:
+        """Get offset by symbolic name (any JSON entry name, dotted path or alias)
+        
+        Without offset data files, the default version's names are answered
+        from the constants in this module.
+        """
+        offset_set = cls._offset_set(version)
+        if offset_set is not None:
+            return offset_set.offset(name)
+        if not cls._uses_constants(version):
+            return None
         offset_map = {
             'protection_mode': cls.CONFIG.PROTECTION_MODE,
             'large_pack_mode': cls.CONFIG.LARGE_PACK_MODE,
@@ -179,18 +358,36 @@ class DroboOffsets:
         return offset_map.get(name.lower())
     
     @classmethod
-    def is_patchable_offset(cls, offset: int) -> bool:
+    def is_patchable_offset(cls, offset: int, version: str = None) -> bool:
         """Check if offset is in a patchable region"""
+        offset_set = cls._offset_set(version)
+        if offset_set is not None:
+            return offset_set.is_patchable(offset)
+        if not cls._uses_constants(version):
+            return False
         patchable_ranges = [
             # Configuration block
-            (cls.CONFIG.BASE_OFFSET, cls.CONFIG.BASE_OFFSET + 0x100),
-            # Capacity limits  
-            (cls.CAPACITY_LIMITS.BYTES_BASED, cls.CAPACITY_LIMITS.BYTES_BASED + 8),
-            (cls.CAPACITY_LIMITS.SECTORS_BASED, cls.CAPACITY_LIMITS.SECTORS_BASED + 8)
+            (cls.CONFIG.BASE_OFFSET, cls.CONFIG.BASE_OFFSET + OffsetSet.CONFIG_BLOCK_SIZE),
+            # Capacity limits
+            (cls.CAPACITY_LIMITS.BYTES_BASED, cls.CAPACITY_LIMITS.BYTES_BASED + OffsetSet.LIMIT_SIZE),
+            (cls.CAPACITY_LIMITS.SECTORS_BASED, cls.CAPACITY_LIMITS.SECTORS_BASED + OffsetSet.LIMIT_SIZE),
         ]
-        
         return any(start <= offset < end for start, end in patchable_ranges)
     
+    @classmethod
+    def iter_secondary_offsets(cls):
+        """Yield (group, name, offset) for every known secondary.elf location"""
+        groups = [
+            ('CONFIG', cls.CONFIG),
+            ('CAPACITY_LIMITS', cls.CAPACITY_LIMITS),
+            ('STRINGS', cls.STRINGS),
+        ]
+        for group_name, group in groups:
+            for name, value in vars(type(group)).items():
+                # Skip limit values stored alongside the limit offsets
+                if name.isupper() and isinstance(value, int) and not name.endswith('_LIMIT'):
+                    yield group_name, name, value
+    
     @classmethod 
     def get_module_command(cls, module: str) -> Optional[str]:
         """Get debug command for management module"""
@@ -243,4 +440,10 @@ if __name__ == "__main__":
     
     for offset in test_offsets:
         patchable = DroboOffsets.is_patchable_offset(offset)
-        print(f"  {int_to_hex(offset)}: {'✓' if patchable else '✗'}")
\ No newline at end of file
+        print(f"  {int_to_hex(offset)}: {'✓' if patchable else '✗'}")
+    
+    # Versioned registry
+    registry = OffsetRegistry.default()
+    print(f"\nOffset sets: {', '.join(registry.versions())}")
+    for version in registry.versions():
+        print(f"  {version}: {len(registry.get(version).names())} names")
\ No newline at end of file
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Patch Journal
+=======================
+
+Byte-level undo log for in-place firmware patches. Instead of copying the
+whole image before every patch, each patch records only the offsets it
+touches and the original and new bytes. The journal lives next to the image
+(`<image>.journal`) and is rewritten atomically with fsync.
+
+Undo and redo check only the journaled byte ranges, so a patch costs
+kilobytes of I/O however large the image is. With --verify the image
+SHA-256 is also recorded before and after each patch and checked on undo
+and redo, at the cost of a full read of the image each time.
+
+Entries are write-ahead: the original bytes are durable before the image is
+modified, and an entry left pending by an interrupted patch is rolled back
+the next time the journal is used.
+
+Usage:
+    python3 patch_journal.py <firmware_file> <log|undo|redo> [--verify]
+
+Examples:
+    python3 patch_journal.py ../extracted/secondary.elf log
+    python3 patch_journal.py secondary.elf undo
+    python3 patch_journal.py secondary.elf redo --verify
+"""
+
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Sequence, Tuple
+from cache import atomic_write
+
+JOURNAL_VERSION = 1
+JOURNAL_SUFFIX = '.journal'
+
+
+def journal_path(filename: str) -> str:
+    return filename + JOURNAL_SUFFIX
+
+
+class PatchJournal:
+    """Undo/redo log of byte-level patches applied to one image"""
+
+    def __init__(self, path: str, verify: bool = False):
+        self.path = path
+        self.verify = verify  # also record and check whole-image SHA-256s
+        self.entries: List[Dict] = []
+        self.position = 0     # entries[:position] are applied, the rest can be redone
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                payload = json.load(f)
+            if payload.get('version') != JOURNAL_VERSION:
+                raise ValueError(f"Unsupported patch journal version: {path}")
+            self.entries = payload['entries']
+            self.position = payload['position']
+
+    @classmethod
+    def for_image(cls, filename: str, verify: bool = False) -> 'PatchJournal':
+        return cls(journal_path(filename), verify)
+
+    def save(self):
+        payload = {'version': JOURNAL_VERSION, 'position': self.position, 'entries': self.entries}
+        atomic_write(self.path, json.dumps(payload, indent=2).encode('utf-8'))
+
+    @staticmethod
+    def _write(image, entry: Dict, key: str):
+        for change in entry['changes']:
+            image.write(int(change['offset'], 16), bytes.fromhex(change[key]))
+        image.flush()
+
+    @staticmethod
+    def _holds(image, entry: Dict, key: str) -> bool:
+        """Whether every journaled range of the image holds its old or new bytes"""
+        for change in entry['changes']:
+            data = bytes.fromhex(change[key])
+            if image.read(int(change['offset'], 16), len(data)) != data:
+                return False
+        return True
+
+    def _check(self, image, entry: Dict, key: str, action: str):
+        sha_key = 'after_sha256' if key == 'new' else 'before_sha256'
+        if not self._holds(image, entry, key) or (
+                self.verify and entry.get(sha_key) and image.sha256() != entry[sha_key]):
+            raise ValueError(f"Image changed since the patch was {action}; refusing to "
+                             f"{'undo' if key == 'new' else 'redo'}")
+
+    @staticmethod
+    def _pending(entry: Dict) -> bool:
+        # Journals written with whole-image hashes mark pending entries with after_sha256 = None
+        return entry.get('pending', 'after_sha256' in entry and entry['after_sha256'] is None)
+
+    def recover(self, image):
+        """Roll back an entry left pending by an interrupted patch"""
+        if self.position < len(self.entries) and self._pending(self.entries[self.position]):
+            entry = self.entries[self.position]
+            if not self._holds(image, entry, 'old'):
+                self._write(image, entry, 'old')
+            del self.entries[self.position:]
+            self.save()
+
+    def apply(self, image, writes: Sequence[Tuple[int, bytes]], description: str = '') -> Dict:
+        """Patch a writable image, journaling the original bytes first
+
+        Any undone entries are discarded, as with an editor's redo stack.
+        """
+        self.recover(image)
+        entry = {
+            'description': description,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'pending': True,
+            'changes': [
+                {'offset': f"0x{offset:x}", 'old': image.read(offset, len(data)).hex(), 'new': data.hex()}
+                for offset, data in writes
+            ],
+        }
+        if self.verify:
+            entry['before_sha256'] = image.sha256()
+        del self.entries[self.position:]
+        self.entries.append(entry)
+        self.save()
+
+        self._write(image, entry, 'new')
+        del entry['pending']
+        if self.verify:
+            entry['after_sha256'] = image.sha256()
+        self.position += 1
+        self.save()
+        return entry
+
+    def undo(self, image) -> Dict:
+        """Restore the original bytes of the most recent applied entry"""
+        self.recover(image)
+        if self.position == 0:
+            raise ValueError("Nothing to undo")
+        entry = self.entries[self.position - 1]
+        self._check(image, entry, 'new', 'applied')
+        self._write(image, entry, 'old')
+        self.position -= 1
+        self.save()
+        return entry
+
+    def redo(self, image) -> Dict:
+        """Re-apply the most recently undone entry"""
+        self.recover(image)
+        if self.position == len(self.entries):
+            raise ValueError("Nothing to redo")
+        entry = self.entries[self.position]
+        self._check(image, entry, 'old', 'undone')
+        self._write(image, entry, 'new')
+        self.position += 1
+        self.save()
+        return entry
+
+
+def main():
+    verify = '--verify' in sys.argv[3:]
+    if len(sys.argv) < 3 or sys.argv[2] not in ('log', 'undo', 'redo') or set(sys.argv[3:]) - {'--verify'}:
+        print("Usage: python3 patch_journal.py <firmware_file> <log|undo|redo> [--verify]")
+        print("Examples:")
+        print("  python3 patch_journal.py ../extracted/secondary.elf log")
+        print("  python3 patch_journal.py secondary.elf undo")
+        sys.exit(1)
+
+    from firmware_image import FirmwareImage
+
+    filename, command = sys.argv[1], sys.argv[2]
+    journal = PatchJournal.for_image(filename, verify)
+
+    if command == 'log':
+        if not journal.entries:
+            print(f"No patches journaled for {filename}")
+        for i, entry in enumerate(journal.entries):
+            state = 'applied' if i < journal.position else 'undone'
+            print(f"[{i}] {entry['timestamp']}  {state:<8} {entry['description']}")
+            for change in entry['changes']:
+                print(f"      {change['offset']}: {change['old']} -> {change['new']}")
+        return
+
+    try:
+        with FirmwareImage(filename, writable=True) as image:
+            entry = journal.undo(image) if command == 'undo' else journal.redo(image)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    verb = 'Undid' if command == 'undo' else 'Redid'
+    print(f"✓ {verb}: {entry['description']} ({len(entry['changes'])} changes)")
+
+
+if __name__ == "__main__":
+    main()
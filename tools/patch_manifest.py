@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Patch Manifests
+=========================
+
+Declarative patches: a JSON manifest lists named fields from the offsets
+registry together with their expected current values and the values to
+write. Every precondition is checked before anything is written, then all
+writes are applied (and journaled) in one pass over a single mapping. The
+same manifest can be run over a whole directory of images in parallel.
+
+Manifest format:
+    {
+      "name": "32TB capacity limit",
+      "patches": [
+        {"field": "CAPACITY_LIMITS.BYTES_BASED", "type": "u64",
+         "expect": "below", "value": "0x200000000000"}
+      ]
+    }
+
+    field   DroboOffsets group and name, or any offsets registry name
+            (or "offset" with a raw file offset)
+    type    u8, u16, u32 or u64 (little-endian)
+    expect  value, or list of values, required before patching, or "below"
+            for any non-zero value below the new one (optional)
+    value   value to write; images that already hold it are left untouched
+
+Usage:
+    python3 patch_manifest.py <manifest.json> <firmware_file|directory|@list> [options]
+
+Examples:
+    python3 patch_manifest.py ../docs/data/patches/capacity-32tb.json ../extracted/secondary.elf
+    python3 patch_manifest.py capacity-32tb.json /data/dumps --jobs 8
+    python3 patch_manifest.py capacity-32tb.json @images.txt --check
+"""
+
+import argparse
+import functools
+import json
+import struct
+import sys
+from collections import namedtuple
+from typing import Dict, List
+from batch import iter_firmware_paths, run_parallel
+from offsets import DroboOffsets
+
+TYPES = {
+    'u8': struct.Struct('<B'),
+    'u16': struct.Struct('<H'),
+    'u32': struct.Struct('<I'),
+    'u64': struct.Struct('<Q'),
+}
+
+ManifestPatch = namedtuple('ManifestPatch', ['field', 'offset', 'type', 'expect', 'value'])
+
+# Per-patch states reported by check()
+APPLY = 'apply'
+ALREADY_APPLIED = 'already-applied'
+MISMATCH = 'mismatch'
+
+
+class ManifestError(ValueError):
+    """Malformed manifest or unmet precondition"""
+
+
+def _int(value) -> int:
+    return int(value, 0) if isinstance(value, str) else int(value)
+
+
+def resolve_field(field: str) -> int:
+    """File offset of a 'GROUP.NAME' DroboOffsets field or an offsets registry name
+
+    Only offset entries resolve; value constants such as
+    CAPACITY_LIMITS.ORIGINAL_BYTES_LIMIT are not locations.
+    """
+    offset = next((offset for group, name, offset in DroboOffsets.iter_secondary_offsets()
+                   if f"{group}.{name}" == field.upper()), None)
+    if offset is None:
+        offset = DroboOffsets.get_offset_by_name(field)
+    if not isinstance(offset, int):
+        raise ManifestError(f"Unknown offsets field: {field}")
+    return offset
+
+
+class PatchManifest:
+    """Validated list of field patches"""
+
+    def __init__(self, name: str, patches: List[ManifestPatch]):
+        self.name = name
+        self.patches = patches
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'PatchManifest':
+        if not isinstance(data.get('patches'), list) or not data['patches']:
+            raise ManifestError("Manifest needs a non-empty 'patches' list")
+        patches = []
+        for entry in data['patches']:
+            if 'field' in entry:
+                field, offset = entry['field'], resolve_field(entry['field'])
+            elif 'offset' in entry:
+                offset = _int(entry['offset'])
+                field = f"0x{offset:x}"
+            else:
+                raise ManifestError(f"Patch needs 'field' or 'offset': {entry}")
+            kind = entry.get('type', 'u32')
+            if kind not in TYPES:
+                raise ManifestError(f"Unknown type '{kind}' for {field}")
+            if 'value' not in entry:
+                raise ManifestError(f"Patch for {field} has no 'value'")
+            limit = 1 << (8 * TYPES[kind].size)
+            value = _int(entry['value'])
+            if not 0 <= value < limit:
+                raise ManifestError(f"Value {value:#x} for {field} does not fit a {kind}")
+            expect = entry.get('expect')
+            if expect == 'below':
+                if value <= 1:
+                    raise ManifestError(f"'expect: below' for {field} needs a value above 1")
+                # Any earlier, smaller setting may be raised (e.g. a 32TB -> 64TB re-patch)
+                expect = range(1, value)
+            elif expect is not None:
+                expect = tuple(_int(v) for v in (expect if isinstance(expect, list) else [expect]))
+                for expected in expect:
+                    if not 0 <= expected < limit:
+                        raise ManifestError(f"Expected value {expected:#x} for {field} does not fit a {kind}")
+            patches.append(ManifestPatch(field, offset, kind, expect, value))
+
+        ranges = sorted((p.offset, p.offset + TYPES[p.type].size, p.field) for p in patches)
+        for (_, end, field), (start, _, other) in zip(ranges, ranges[1:]):
+            if start < end:
+                raise ManifestError(f"Patches for {field} and {other} overlap")
+        return cls(data.get('name', 'unnamed manifest'), patches)
+
+    @classmethod
+    def load(cls, path: str) -> 'PatchManifest':
+        with open(path, 'r') as f:
+            try:
+                return cls.from_dict(json.load(f))
+            except json.JSONDecodeError as e:
+                raise ManifestError(f"Invalid manifest JSON in {path}: {e}")
+
+    def check(self, image):
+        """(patch, current value, state) for every patch, without writing"""
+        results = []
+        for patch in self.patches:
+            packer = TYPES[patch.type]
+            if patch.offset + packer.size > len(image):
+                results.append((patch, None, MISMATCH))
+                continue
+            current = packer.unpack_from(image.data, patch.offset)[0]
+            if current == patch.value:
+                state = ALREADY_APPLIED
+            elif patch.expect is None or current in patch.expect:
+                state = APPLY
+            else:
+                state = MISMATCH
+            results.append((patch, current, state))
+        return results
+
+    def apply(self, image, journal=None):
+        """Check every precondition, then write all pending patches at once
+
+        Raises ManifestError (and writes nothing) if any precondition fails.
+        Returns the check() results.
+        """
+        results = self.check(image)
+        failed = [(patch, current) for patch, current, state in results if state == MISMATCH]
+        if failed:
+            details = ', '.join(
+                f"{p.field}=" + ('out of range' if c is None else f"0x{c:x}") for p, c in failed
+            )
+            raise ManifestError(f"Preconditions not met: {details}")
+
+        writes = [
+            (patch.offset, TYPES[patch.type].pack(patch.value))
+            for patch, _, state in results if state == APPLY
+        ]
+        if writes:
+            if journal is not None:
+                journal.apply(image, writes, self.name)
+            else:
+                for offset, data in writes:
+                    image.write(offset, data)
+                image.flush()
+        return results
+
+
+def capacity_manifest(new_limit_tb: int) -> PatchManifest:
+    """Manifest raising the capacity limits to new_limit_tb from any lower limit"""
+    new_bytes = new_limit_tb * (1024 ** 4)
+    return PatchManifest.from_dict({
+        'name': f"capacity limit -> {new_limit_tb}TB",
+        'patches': [
+            {'field': 'CAPACITY_LIMITS.BYTES_BASED', 'type': 'u64',
+             'expect': 'below', 'value': new_bytes},
+            {'field': 'CAPACITY_LIMITS.SECTORS_BASED', 'type': 'u64',
+             'expect': 'below', 'value': new_bytes // 512},
+        ],
+    })
+
+
+def apply_manifest_to_path(manifest: PatchManifest, path: str, check_only: bool = False) -> Dict:
+    """Apply (or check) a manifest on one image; never raises"""
+    from firmware_image import FirmwareImage
+    from patch_journal import PatchJournal
+
+    record = {'file': path, 'status': None, 'applied': 0, 'error': None}
+    try:
+        with FirmwareImage(path, writable=not check_only) as image:
+            if check_only:
+                results = manifest.check(image)
+                mismatched = any(state == MISMATCH for _, _, state in results)
+                record['status'] = 'mismatch' if mismatched else 'ok'
+            else:
+                results = manifest.apply(image, PatchJournal.for_image(path))
+            record['applied'] = sum(state == APPLY for _, _, state in results)
+            if not check_only:
+                record['status'] = 'patched' if record['applied'] else 'unchanged'
+    except ManifestError as e:
+        record['status'] = 'mismatch'
+        record['error'] = str(e)
+    except (OSError, ValueError) as e:
+        record['status'] = 'error'
+        record['error'] = str(e)
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply a JSON patch manifest to one or many images')
+    parser.add_argument('manifest', help='patch manifest JSON file')
+    parser.add_argument('source', help='image, directory, or @file-list')
+    parser.add_argument('--check', action='store_true', help='only verify preconditions')
+    parser.add_argument('--jobs', '-j', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--pattern', default='*.elf', help="filename pattern for directories (default: '*.elf')")
+    args = parser.parse_args()
+
+    try:
+        manifest = PatchManifest.load(args.manifest)
+    except (OSError, ManifestError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(f"Manifest: {manifest.name} ({len(manifest.patches)} patches)")
+    worker = functools.partial(apply_manifest_to_path, manifest, check_only=args.check)
+
+    count = failed = 0
+    for record in run_parallel(worker, iter_firmware_paths(args.source, args.pattern), args.jobs):
+        count += 1
+        ok = record['error'] is None and record['status'] != 'mismatch'
+        failed += not ok
+        detail = f"{record['applied']} to apply" if args.check else f"{record['applied']} written"
+        print(f"  {'✓' if ok else '✗'} {record['file']}: {record['status']} ({record['error'] or detail})")
+
+    print(f"\n{count} images, {failed} failed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
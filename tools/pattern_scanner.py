@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Multi-Pattern Scanner
+===============================
+
+Finds every occurrence of a whole table of byte patterns in a single pass
+over a firmware image. Patterns are indexed by short anchors compiled into
+one regular expression alternation, so the scan runs inside the C regex
+engine, reports overlapping and duplicate hits, and never rescans the image
+per pattern.
+
+The default table covers the known capacity constants (2TB in bytes,
+sectors and decimal, plus the 32TB patch values) encoded as 32- and 64-bit
+integers in both endiannesses.
+
+Usage:
+    python3 pattern_scanner.py <firmware_file> [NAME=VALUE ...]
+
+Examples:
+    python3 pattern_scanner.py ../extracted/secondary.elf
+    python3 pattern_scanner.py secondary.elf 4TB_bytes=0x40000000000
+"""
+
+import heapq
+import re
+import struct
+import sys
+from collections import namedtuple
+from typing import Dict, Iterator, List, Optional
+from offsets import DroboOffsets
+
+# Known capacity constants scanned for by default
+CAPACITY_CONSTANTS = {
+    "2TB_sectors": DroboOffsets.CAPACITY_LIMITS.ORIGINAL_SECTORS_LIMIT,   # 0x100000000
+    "2TB_binary": DroboOffsets.CAPACITY_LIMITS.ORIGINAL_BYTES_LIMIT,      # 0x20000000000
+    "2TB_decimal": 2000000000000,                                         # 0x1D1A94A2000
+    "32TB_bytes": DroboOffsets.CAPACITY_LIMITS.PATCH_BYTES_LIMIT,         # 0x200000000000
+    "32TB_sectors": DroboOffsets.CAPACITY_LIMITS.PATCH_SECTORS_LIMIT,     # 0x1000000000
+}
+
+# Bytes per anchor used to pre-filter candidate offsets
+ANCHOR_LENGTH = 2
+
+# struct formats tried for every constant
+INTEGER_FORMATS = ['<I', '>I', '<Q', '>Q']
+
+PatternHit = namedtuple('PatternHit', ['offset', 'name', 'pattern'])
+ConstantHit = namedtuple('ConstantHit', ['offset', 'name', 'value', 'fmt'])
+
+
+class MultiPatternScanner:
+    """Single-pass scanner for a fixed set of named byte patterns
+
+    Each pattern is indexed by a short anchor taken from its first byte that
+    is neither 0x00 nor 0xFF, so long zero or erased-flash runs never produce
+    candidates. One compiled alternation of all anchors drives the scan and
+    every candidate is verified against the patterns sharing that anchor.
+    """
+
+    def __init__(self, patterns: Dict[str, bytes]):
+        if not patterns:
+            raise ValueError("At least one pattern is required")
+
+        # Several names may share the same byte sequence
+        self._names_by_pattern = {}
+        for name, pattern in patterns.items():
+            if not pattern:
+                raise ValueError(f"Empty pattern: {name}")
+            self._names_by_pattern.setdefault(bytes(pattern), []).append(name)
+
+        # anchor bytes -> [(anchor position within pattern, pattern)]
+        self._buckets = {}
+        for pattern in self._names_by_pattern:
+            position = _anchor_position(pattern)
+            anchor = pattern[position:position + ANCHOR_LENGTH]
+            self._buckets.setdefault(anchor, []).append((position, pattern))
+        self._max_position = max(
+            position for bucket in self._buckets.values() for position, _ in bucket
+        )
+
+        # Longest anchors first; a shorter anchor is retried at the same
+        # offset only when the longer one fails to verify
+        anchors = sorted(self._buckets, key=len, reverse=True)
+        self._regex = re.compile(b'|'.join(re.escape(a) for a in anchors), re.DOTALL)
+
+    def scan(self, data, start: int = 0, end: Optional[int] = None) -> Iterator[PatternHit]:
+        """Yield every (offset, name, pattern) hit in offset order"""
+        if end is None:
+            end = len(data)
+        search = self._regex.search
+        pending = []
+        pos = start
+        while True:
+            match = search(data, pos, end)
+            if match is None:
+                break
+            anchor_offset = match.start()
+            self._verify(data, anchor_offset, start, end, pending)
+            # Anchors may overlap, so resume one byte later
+            pos = anchor_offset + 1
+            # Hits below this offset can no longer be preceded by new ones
+            while pending and pending[0][0] < anchor_offset - self._max_position:
+                yield heapq.heappop(pending)[2]
+        while pending:
+            yield heapq.heappop(pending)[2]
+
+    def _verify(self, data, anchor_offset, start, end, pending):
+        for anchor, bucket in self._buckets.items():
+            if data[anchor_offset:anchor_offset + len(anchor)] != anchor:
+                continue
+            for position, pattern in bucket:
+                offset = anchor_offset - position
+                if offset < start or offset + len(pattern) > end:
+                    continue
+                if data[offset:offset + len(pattern)] != pattern:
+                    continue
+                for name in self._names_by_pattern[pattern]:
+                    heapq.heappush(pending, (offset, name, PatternHit(offset, name, pattern)))
+
+
+def _anchor_position(pattern: bytes) -> int:
+    """Position of the first distinctive byte, leaving room for a full anchor"""
+    position = 0
+    for i, value in enumerate(pattern):
+        if value not in (0x00, 0xFF):
+            position = i
+            break
+    return max(0, min(position, len(pattern) - ANCHOR_LENGTH))
+
+
+def build_constant_patterns(constants: Dict[str, int]) -> Dict[str, tuple]:
+    """Expand integer constants into every width/endianness that can hold them"""
+    patterns = {}
+    for name, value in constants.items():
+        for fmt in INTEGER_FORMATS:
+            if value >= 1 << (8 * struct.calcsize(fmt)):
+                continue
+            patterns[f"{name}/{fmt}"] = (name, value, fmt, struct.pack(fmt, value))
+    return patterns
+
+
+class ConstantScanner:
+    """Scans an image for integer constants in 32/64-bit LE/BE encodings"""
+
+    def __init__(self, extra_constants: Optional[Dict[str, int]] = None):
+        self.constants = dict(CAPACITY_CONSTANTS)
+        if extra_constants:
+            self.constants.update(extra_constants)
+        self._encodings = build_constant_patterns(self.constants)
+        self._scanner = MultiPatternScanner(
+            {key: encoding[3] for key, encoding in self._encodings.items()}
+        )
+
+    def scan(self, data, start: int = 0, end: Optional[int] = None) -> Iterator[ConstantHit]:
+        """Yield every constant occurrence in offset order"""
+        for hit in self._scanner.scan(data, start, end):
+            name, value, fmt, _ = self._encodings[hit.name]
+            yield ConstantHit(hit.offset, name, value, fmt)
+
+    def find_all(self, data, start: int = 0, end: Optional[int] = None) -> List[ConstantHit]:
+        return list(self.scan(data, start, end))
+
+
+def parse_constant_args(args: List[str]) -> Dict[str, int]:
+    """Parse NAME=VALUE arguments (decimal or 0x-prefixed hex)"""
+    constants = {}
+    for arg in args:
+        name, sep, value = arg.partition('=')
+        if not sep or not name:
+            raise ValueError(f"Expected NAME=VALUE, got: {arg}")
+        constants[name] = int(value, 0)
+    return constants
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python3 pattern_scanner.py <firmware_file> [NAME=VALUE ...]")
+        print("Examples:")
+        print("  python3 pattern_scanner.py ../extracted/secondary.elf")
+        print("  python3 pattern_scanner.py secondary.elf 4TB_bytes=0x40000000000")
+        sys.exit(1)
+
+    from firmware_image import FirmwareImage
+
+    try:
+        extra = parse_constant_args(sys.argv[2:])
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    scanner = ConstantScanner(extra)
+    with FirmwareImage(sys.argv[1]) as image:
+        hits = scanner.find_all(image.data)
+
+    for hit in hits:
+        print(f"0x{hit.offset:08x}  {hit.fmt:<3}  {hit.name} (0x{hit.value:x})")
+    print(f"\nTotal hits: {len(hits)}")
+
+
+if __name__ == "__main__":
+    main()
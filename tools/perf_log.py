@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Perf Info Log Parser
+==============================
+
+Turns the "Perf info" blocks printed by the management modules (dpm, ham,
+zm, rm, cm, catm; see ManagementModules.PERF_STRINGS) in serial console logs
+into per-module columnar time series, and answers windowed aggregation
+queries over them.
+
+Logs are memory-mapped and scanned for the " Perf info" marker at C speed, so
+only the perf blocks themselves are parsed in Python; multi-gigabyte captures
+never have to fit in memory. A block is the banner line plus the indented
+"name value" counter lines after it. Its timestamp comes from the banner
+line: the wall-clock prefix written by `serial_console.py --log`, or a
+"[   12.345678]" relative stamp. Counters become typed columns (int64, or
+float64 once a fractional value is seen).
+
+Store file layout (little-endian, every section 8-byte aligned):
+    header     magic 'DPRF', version, directory size, reserved
+    directory  UTF-8 JSON: per module, its row count and columns (name, type, offset)
+    columns    f64[rows] time (ascending, NaN when unknown), then one
+               i64[rows] or f64[rows] array per counter; a missing value is
+               MISSING (int64 minimum) or NaN
+
+Queries memory-map the store and aggregate with NumPy when it is installed
+(pure Python otherwise). Windows are aligned to multiples of the window
+length, so charts from different stores line up.
+
+Usage:
+    python3 perf_log.py build <store.dprf> <log> [log ...] [--jobs N]
+    python3 perf_log.py info <store.dprf>
+    python3 perf_log.py query <store.dprf> <module> <counter> [--window 1h] [--agg mean]
+                        [--start TIME] [--end TIME] [--csv]
+
+Examples:
+    python3 perf_log.py build perf.dprf /data/console/*.log --jobs 8
+    python3 perf_log.py info perf.dprf
+    python3 perf_log.py query perf.dprf dpm reads --window 15m --agg rate
+    python3 perf_log.py query perf.dprf ham avgLatencyUs --window 1d --agg max --csv
+"""
+
+import functools
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from collections import namedtuple
+from typing import Dict, Iterator, List, Optional, Tuple
+
+STORE_MAGIC = b'DPRF'
+STORE_VERSION = 1
+_HEADER = struct.Struct('<4sIII')
+
+# Missing value of an int64 column (float64 columns use NaN)
+MISSING = -(1 << 63)
+
+AGGREGATES = ('count', 'mean', 'min', 'max', 'sum', 'last', 'rate')
+
+PERF_MARKER = b' Perf info'
+
+# Banner line: "dpm = DiskPackManager Perf info" or just "DiskPackManager Perf info"
+_BANNER = re.compile(rb'(?:(\w+) = )?(\w+) Perf info')
+# Optional line prefix: serial_console.py --log wall clock, or its relative stamp
+TIMESTAMP_PREFIX = rb'(\d{4}-\d\d-\d\d[ T]\d\d:\d\d:\d\d(?:\.\d+)?) |\[[^\S\n]*(\d+\.\d+)\] '
+_LINE_PREFIX = re.compile(TIMESTAMP_PREFIX)
+# Counter: "reads 1234", "reads: 1234", "reads=0x4d2" (separator required)
+_NAME = rb'[A-Za-z_][\w.]*'
+_SEPARATOR = rb'(?:[^\S\n]*[:=][^\S\n]*|[^\S\n]+)'
+_VALUE = rb'-?(?:0x[0-9A-Fa-f]+|\d+(?:\.\d+)?)'
+_PAIR = re.compile(rb'(?<=[ \t,;])(' + _NAME + rb')' + _SEPARATOR + rb'(' + _VALUE + rb')')
+# Counter line: indented, nothing but counters
+_COUNTER_LINE = (rb'[^\S\n]+' + _NAME + _SEPARATOR + _VALUE
+                 + rb'(?:[,;]?[^\S\n]+' + _NAME + _SEPARATOR + _VALUE + rb')*[^\S\n]*\r?')
+
+# Lines after a banner read at most; guards against runaway blocks
+MAX_BLOCK_LINES = 512
+
+# The counter lines after a banner, matched in one go
+_BLOCK = re.compile(rb'(?:(?:' + TIMESTAMP_PREFIX + rb')?' + _COUNTER_LINE + rb'(?:\n|\Z)){1,%d}' % MAX_BLOCK_LINES)
+
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+PerfSample = namedtuple('PerfSample', ['module', 'time', 'counters'])
+
+
+def _pad8(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def _numpy():
+    """NumPy if installed; imported on first use as it costs ~80 ms of startup"""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _module_names() -> Dict[bytes, str]:
+    """Manager name in the banner -> module key ("DiskPackManager" -> "dpm")"""
+    from offsets import ManagementModules
+    return {text.split()[0].encode('ascii'): module for module, text in ManagementModules.PERF_STRINGS.items()}
+
+
+@functools.lru_cache(maxsize=256)
+def _epoch(stamp: bytes) -> float:
+    from datetime import datetime
+    return datetime.fromisoformat(stamp.decode('ascii')).timestamp()
+
+
+def parse_timestamp(prefix: bytes) -> float:
+    """Seconds from a line prefix (epoch for wall clock, else relative); NaN if none"""
+    match = _LINE_PREFIX.match(prefix)
+    if match is None:
+        return math.nan
+    if match.group(2) is not None:
+        return float(match.group(2))
+    # Whole seconds repeat from line to line: convert each once
+    stamp = match.group(1)
+    seconds, _, fraction = stamp.partition(b'.')
+    return _epoch(seconds) + (float(b'0.' + fraction) if fraction else 0.0)
+
+
+def parse_time(text: str) -> float:
+    """Epoch seconds from a command-line time: epoch number or ISO date/time"""
+    try:
+        return float(text)
+    except ValueError:
+        from datetime import datetime
+        return datetime.fromisoformat(text).timestamp()
+
+
+def parse_window(text: str) -> float:
+    """Window length in seconds: "90", "90s", "15m", "1h", "1d\""""
+    unit = _UNITS.get(text[-1:].lower())
+    seconds = float(text[:-1]) * unit if unit else float(text)
+    if seconds <= 0:
+        raise ValueError(f"Window must be positive: {text}")
+    return seconds
+
+
+def _number(value: bytes):
+    if b'.' in value:
+        return float(value)
+    return int(value, 16) if b'x' in value else int(value)
+
+
+def iter_perf_samples(data, module_names: Dict[bytes, str] = None) -> Iterator[PerfSample]:
+    """Perf blocks in a log buffer (bytes or mmap), in log order"""
+    module_names = _module_names() if module_names is None else module_names
+    size = len(data)
+    pos = data.find(PERF_MARKER)
+    while pos >= 0:
+        line_start = data.rfind(b'\n', 0, pos) + 1
+        line_end = data.find(b'\n', pos)
+        if line_end < 0:
+            line_end = size
+        line = data[line_start:line_end]
+        banner = _BANNER.search(line)
+        pos = line_end + 1
+        block = _BLOCK.match(data, pos) if banner is not None and pos < size else None
+        if block is not None:
+            name = banner.group(2)
+            module = module_names.get(name) or (banner.group(1) or name.lower()).decode('ascii')
+            counters = {}
+            for key, value in _PAIR.findall(data, pos, block.end()):
+                key = base = key.decode('ascii')
+                repeat = 1
+                while key in counters:
+                    key = f"{base}_{repeat}"
+                    repeat += 1
+                counters[key] = _number(value)
+            yield PerfSample(module, parse_timestamp(line), counters)
+            pos = block.end()
+        pos = data.find(PERF_MARKER, pos)
+
+
+def _missing(typecode: str, count: int) -> array:
+    return array(typecode, [math.nan if typecode == 'd' else MISSING]) * count
+
+
+def _as_float(column: array) -> array:
+    return array('d', (math.nan if v == MISSING else float(v) for v in column))
+
+
+class PerfTable:
+    """Growing columns of one module: f64 time plus one array per counter"""
+
+    def __init__(self, module: str):
+        self.module = module
+        self.time = array('d')
+        self.columns: Dict[str, array] = {}
+
+    def __len__(self):
+        return len(self.time)
+
+    def _column(self, name: str, typecode: str) -> array:
+        """Column for name able to hold typecode values (int64 widens to float64)"""
+        column = self.columns.get(name)
+        if column is None:
+            # Counter first seen now: earlier rows lack it
+            column = self.columns[name] = _missing(typecode, len(self.time))
+        elif column.typecode == 'q' and typecode == 'd':
+            column = self.columns[name] = _as_float(column)
+        return column
+
+    def add(self, time: float, counters: Dict[str, object]):
+        for name, value in counters.items():
+            self._column(name, 'd' if isinstance(value, float) else 'q').append(value)
+        self.time.append(time)
+        rows = len(self.time)
+        for column in self.columns.values():
+            if len(column) < rows:
+                column.append(math.nan if column.typecode == 'd' else MISSING)
+
+    def extend(self, other: 'PerfTable'):
+        """Append the rows of another table of the same module"""
+        for name, values in other.columns.items():
+            column = self._column(name, values.typecode)
+            column.extend(_as_float(values) if column.typecode != values.typecode else values)
+        for name, column in self.columns.items():
+            if name not in other.columns:
+                column.extend(_missing(column.typecode, len(other)))
+        self.time.extend(other.time)
+
+    def sort(self):
+        """Order rows by time (unknown times last), keeping log order for ties"""
+        times = self.time
+        if all(times[i] <= times[i + 1] for i in range(len(times) - 1)):
+            return
+        order = sorted(range(len(times)), key=lambda i: (math.isnan(times[i]), times[i] if times[i] == times[i] else 0))
+        self.time = array('d', (times[i] for i in order))
+        for name, column in self.columns.items():
+            self.columns[name] = array(column.typecode, (column[i] for i in order))
+
+
+def parse_log(path: str) -> Dict[str, PerfTable]:
+    """Perf tables of one log file"""
+    from tracing import span
+
+    tables: Dict[str, PerfTable] = {}
+    with span('perf:parse', file=path) as stage:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return tables
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                module_names = _module_names()
+                for sample in iter_perf_samples(data, module_names):
+                    table = tables.get(sample.module)
+                    if table is None:
+                        table = tables[sample.module] = PerfTable(sample.module)
+                    table.add(sample.time, sample.counters)
+                stage.add_bytes(len(data))
+    return tables
+
+
+def _parse_log_record(path: str) -> Tuple[str, Dict[str, PerfTable]]:
+    return path, parse_log(path)
+
+
+def build_store(output: str, paths, jobs: int = 1) -> Dict[str, PerfTable]:
+    """Parse logs (in parallel with jobs > 1) and write the columnar store"""
+    from batch import run_parallel
+
+    tables: Dict[str, PerfTable] = {}
+    for _, parsed in run_parallel(_parse_log_record, paths, jobs):
+        for module, table in parsed.items():
+            if module in tables:
+                tables[module].extend(table)
+            else:
+                tables[module] = table
+    write_store(output, tables)
+    return tables
+
+
+def write_store(path: str, tables: Dict[str, PerfTable]):
+    from cache import atomic_write
+
+    directory = {'modules': {}}
+    sections = []
+    offset = 0
+    for module in sorted(tables):
+        table = tables[module]
+        table.sort()
+        columns = [('time', table.time)] + sorted(table.columns.items())
+        entry = {'rows': len(table), 'columns': []}
+        for name, column in columns:
+            entry['columns'].append({'name': name, 'type': 'f64' if column.typecode == 'd' else 'i64',
+                                     'offset': offset})
+            if sys.byteorder != 'little':
+                column = array(column.typecode, column)
+                column.byteswap()
+            sections.append(column.tobytes())
+            offset += len(sections[-1])
+        directory['modules'][module] = entry
+
+    encoded = json.dumps(directory, separators=(',', ':')).encode('utf-8')
+    encoded += b' ' * (_pad8(_HEADER.size + len(encoded)) - _HEADER.size - len(encoded))
+    atomic_write(path, _HEADER.pack(STORE_MAGIC, STORE_VERSION, len(encoded), 0) + encoded + b''.join(sections))
+
+
+class PerfStore:
+    """Memory-mapped perf store with windowed aggregation queries"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < _HEADER.size:
+                raise ValueError(f"Not a perf store (truncated): {path}")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._base, self.modules = self._read_directory()
+        except ValueError as e:
+            self._map.close()
+            raise ValueError(f"Not a perf store ({e}): {path}") from None
+        self._view = memoryview(self._map)
+        self._views = []
+
+    def _read_directory(self):
+        """(data base offset, modules) after checking every column fits the file"""
+        magic, version, directory_size, _ = _HEADER.unpack_from(self._map, 0)
+        base = _HEADER.size + directory_size
+        if magic != STORE_MAGIC or version != STORE_VERSION:
+            raise ValueError('or stale version')
+        if base > len(self._map):
+            raise ValueError('truncated')
+        try:
+            modules = dict(json.loads(self._map[_HEADER.size:base])['modules'])
+            extents = [(column['offset'], entry['rows']) for entry in modules.values() for column in entry['columns']]
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('corrupt directory') from None
+        for offset, rows in extents:
+            if offset < 0 or base + offset + rows * 8 > len(self._map):
+                raise ValueError('truncated')
+        return base, modules
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self._map is None:
+            return
+        for view in self._views + [self._view]:
+            view.release()
+        self._map.close()
+        self._map = None
+
+    def rows(self, module: str) -> int:
+        return self._entry(module)['rows']
+
+    def counters(self, module: str) -> List[str]:
+        return [c['name'] for c in self._entry(module)['columns'] if c['name'] != 'time']
+
+    def _entry(self, module: str) -> Dict:
+        entry = self.modules.get(module)
+        if entry is None:
+            raise KeyError(f"No perf data for module '{module}' (have: {', '.join(self.modules) or 'none'})")
+        return entry
+
+    def column(self, module: str, name: str) -> memoryview:
+        """Read-only view of one column ('d' or 'q' items), straight from the mapping"""
+        entry = self._entry(module)
+        for column in entry['columns']:
+            if column['name'] == name:
+                start = self._base + column['offset']
+                view = self._view[start:start + entry['rows'] * 8].cast('d' if column['type'] == 'f64' else 'q')
+                self._views.append(view)
+                return view
+        raise KeyError(f"Module '{module}' has no counter '{name}'")
+
+    def time_range(self, module: str) -> Tuple[float, float]:
+        """(first, last) known timestamp of a module; NaN if none"""
+        times = self.column(module, 'time')
+        _, known = _time_bounds(times, None, None)
+        return (times[0], times[known - 1]) if known else (math.nan, math.nan)
+
+    def aggregate(self, module: str, counter: str, window: float, how: str = 'mean',
+                  start: Optional[float] = None, end: Optional[float] = None) -> List[Tuple[float, float]]:
+        """(window start, value) for every window holding samples of counter
+
+        how is one of AGGREGATES; 'rate' is the counter's increase per
+        second, treating a decrease as a reset to zero.
+        """
+        if how not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate '{how}' (expected one of: {', '.join(AGGREGATES)})")
+        times = self.column(module, 'time')
+        values = self.column(module, counter)
+        # Times ascend with unknown (NaN) ones last: bisect the known prefix
+        lo, hi = _time_bounds(times, start, end)
+        np = _numpy()
+        if np is not None:
+            return _aggregate_numpy(np, times, values, lo, hi, window, how)
+        return _aggregate_python(times, values, lo, hi, window, how)
+
+
+def _time_bounds(times, start: Optional[float], end: Optional[float]) -> Tuple[int, int]:
+    import bisect
+
+    count = len(times)
+    known = count
+    while known and times[known - 1] != times[known - 1]:
+        known -= 1
+    lo = 0 if start is None else bisect.bisect_left(times, start, 0, known)
+    hi = known if end is None else bisect.bisect_left(times, end, 0, known)
+    return lo, max(lo, hi)
+
+
+def _aggregate_numpy(np, times, values, lo: int, hi: int, window: float, how: str):
+    t = np.frombuffer(times, dtype=np.float64)[lo:hi]
+    v = np.frombuffer(values, dtype=np.float64 if values.format == 'd' else np.int64)[lo:hi]
+    valid = ~np.isnan(v) if v.dtype.kind == 'f' else v != MISSING
+    t, v = t[valid], v[valid]
+    if not len(t):
+        return []
+    bucket = np.floor(t / window).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(t)]
+    if how == 'count':
+        result = ends - starts
+    elif how == 'sum':
+        result = np.add.reduceat(v, starts)
+    elif how == 'mean':
+        result = np.add.reduceat(v.astype(np.float64), starts) / (ends - starts)
+    elif how == 'min':
+        result = np.minimum.reduceat(v, starts)
+    elif how == 'max':
+        result = np.maximum.reduceat(v, starts)
+    elif how == 'last':
+        result = v[ends - 1]
+    else:
+        # Increase since the previous sample; after a reset the new value is the increase
+        delta = np.diff(v.astype(np.float64), prepend=np.nan)
+        reset = delta < 0
+        delta[reset] = v[reset]
+        delta[0] = 0.0
+        result = np.add.reduceat(delta, starts) / window
+    return list(zip((bucket[starts] * window).tolist(), result.tolist()))
+
+
+def _aggregate_python(times, values, lo: int, hi: int, window: float, how: str):
+    missing = MISSING if values.format == 'q' else None
+    rows = []
+    current = None
+    previous = None
+    for i in range(lo, hi):
+        value = values[i]
+        if value == missing or value != value:
+            continue
+        bucket = math.floor(times[i] / window)
+        if bucket != current:
+            if current is not None:
+                rows.append((current * window, _finish(state, how, window)))
+            current = bucket
+            state = [0, 0, value, value, value]   # count, sum, min, max, last
+        if how == 'rate':
+            if previous is not None:
+                state[1] += value - previous if value >= previous else value
+        else:
+            state[1] += value
+        state[0] += 1
+        state[2] = min(state[2], value)
+        state[3] = max(state[3], value)
+        state[4] = value
+        previous = value
+    if current is not None:
+        rows.append((current * window, _finish(state, how, window)))
+    return rows
+
+
+def _finish(state, how: str, window: float):
+    count, total, low, high, last = state
+    return {'count': count, 'sum': total, 'mean': total / count, 'min': low, 'max': high,
+            'last': last, 'rate': total / window}[how]
+
+
+def _format_time(seconds: float) -> str:
+    if seconds != seconds:
+        return '-'
+    from datetime import datetime
+    # Relative "[  12.3]" stamps are small; show them as seconds
+    if seconds < 1e9:
+        return f"{seconds:.3f}s"
+    return datetime.fromtimestamp(seconds).isoformat(sep=' ', timespec='seconds')
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Columnar time series from module "Perf info" logs')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help='parse logs into a store')
+    build.add_argument('store')
+    build.add_argument('logs', nargs='+', help="log files, directories or @list files")
+    build.add_argument('--jobs', '-j', type=int, default=1, help='parse logs in N processes')
+    info = sub.add_parser('info', help='modules, rows, counters and time range of a store')
+    info.add_argument('store')
+    query = sub.add_parser('query', help='windowed aggregation of one counter')
+    query.add_argument('store')
+    query.add_argument('module')
+    query.add_argument('counter')
+    query.add_argument('--window', default='1h', help='window length: N, Ns, Nm, Nh or Nd (default: 1h)')
+    query.add_argument('--agg', default='mean', choices=AGGREGATES, help='aggregate (default: mean)')
+    query.add_argument('--start', help='first time (epoch seconds or ISO date/time)')
+    query.add_argument('--end', help='end time, exclusive')
+    query.add_argument('--csv', action='store_true', help='print CSV (window start epoch, value)')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'build':
+            from batch import iter_firmware_paths
+            paths = [path for source in args.logs for path in iter_firmware_paths(source, '*.log')]
+            tables = build_store(args.store, paths, args.jobs)
+            print(f"Store: {args.store} ({os.path.getsize(args.store)} bytes) from {len(paths)} log(s)")
+            for module, table in sorted(tables.items()):
+                print(f"  {module:<6} {len(table):>10} samples  {len(table.columns):>3} counters")
+            return
+
+        with PerfStore(args.store) as store:
+            if args.command == 'info':
+                for module in store.modules:
+                    first, last = store.time_range(module)
+                    print(f"{module:<6} {store.rows(module):>10} samples  {_format_time(first)} .. {_format_time(last)}")
+                    print(f"       {', '.join(store.counters(module))}")
+                return
+
+            window = parse_window(args.window)
+            rows = store.aggregate(args.module, args.counter, window, args.agg,
+                                   parse_time(args.start) if args.start else None,
+                                   parse_time(args.end) if args.end else None)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Error: {e.args[0] if isinstance(e, KeyError) else e}")
+        sys.exit(1)
+
+    if args.csv:
+        print('window_start,' + f"{args.counter}_{args.agg}")
+        for start, value in rows:
+            print(f"{start:.3f},{value:.10g}")
+        return
+    print(f"{'window start':<20} {args.agg + ' ' + args.counter:>24}")
+    for start, value in rows:
+        print(f"{_format_time(start):<20} {value:>24,.6g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Region Map
+====================
+
+Reverse lookup from a file offset to everything known about it: configuration
+fields, capacity limits, string references, ELF sections and (for TDF
+containers) firmware components. Regions may nest, so lookups return every
+region containing the offset, innermost first.
+
+Also renders an annotated hexdump of any window of an image. The dump is
+streamed in fixed-size chunks straight from the memory-mapped image, so large
+windows of secondary.elf are never materialized in memory, and every line is
+labelled with the symbol that owns it.
+
+Usage:
+    python3 region_map.py <firmware_file> at <offset> [offset ...]
+    python3 region_map.py <firmware_file> dump <offset> [length]
+    python3 region_map.py <firmware_file> regions
+
+Examples:
+    python3 region_map.py ../extracted/secondary.elf at 0x66d71c
+    python3 region_map.py secondary.elf dump 0x66d6f0 0x100
+    python3 region_map.py release.Drobo5D3.4-2-3.tdf regions
+"""
+
+import bisect
+import sys
+from collections import namedtuple
+from typing import Iterable, Iterator, List, Optional, TextIO
+from offsets import OffsetRegistry, OffsetSet
+
+# Bytes per hexdump line, and per chunk read from the mapping while dumping
+LINE_SIZE = 16
+DUMP_CHUNK_SIZE = 64 * 1024
+
+# Byte -> hexdump character ('.' for non-printable)
+_PRINTABLE = bytes(b if 0x20 <= b < 0x7f else 0x2e for b in range(256))
+
+Region = namedtuple('Region', ['start', 'end', 'name', 'kind'])
+
+
+class IntervalIndex:
+    """Static index answering "which intervals contain x?" for nested ranges
+
+    A centered interval tree: each node keeps the intervals spanning its
+    center point, sorted by start and by end, and children hold the intervals
+    wholly to either side. A stabbing query visits one node per level and
+    stops scanning a node's lists at the first miss, so it costs O(log n + k)
+    for k results even when one interval (an ELF section, say) spans
+    everything else.
+    """
+
+    def __init__(self, regions: Iterable[Region]):
+        self.regions = sorted((r for r in regions if r.end > r.start), key=lambda r: (r.start, -r.end))
+        self._starts = [r.start for r in self.regions]
+        self._root = self._build(self.regions)
+
+    @classmethod
+    def _build(cls, regions: List[Region]):
+        """(center, by_start, by_end_desc, left, right) node, or None"""
+        if not regions:
+            return None
+        center = regions[len(regions) // 2].start
+        left, here, right = [], [], []
+        for region in regions:
+            if region.end <= center:
+                left.append(region)
+            elif region.start > center:
+                right.append(region)
+            else:
+                here.append(region)
+        by_end = sorted(here, key=lambda r: r.end, reverse=True)
+        return (center, here, by_end, cls._build(left), cls._build(right))
+
+    def __len__(self):
+        return len(self.regions)
+
+    def lookup(self, offset: int) -> List[Region]:
+        """Regions containing offset, innermost (smallest) first"""
+        found = []
+        node = self._root
+        while node is not None:
+            center, by_start, by_end, left, right = node
+            if offset < center:
+                # Every region here ends past center, so only the start matters
+                for region in by_start:
+                    if region.start > offset:
+                        break
+                    found.append(region)
+                node = left
+            else:
+                # Every region here starts at or before center
+                for region in by_end:
+                    if region.end <= offset:
+                        break
+                    found.append(region)
+                node = right
+        found.sort(key=lambda r: r.end - r.start)
+        return found
+
+    def owner(self, offset: int) -> Optional[Region]:
+        found = self.lookup(offset)
+        return found[0] if found else None
+
+    def next_start(self, offset: int) -> Optional[Region]:
+        """First region starting strictly after offset"""
+        i = bisect.bisect_right(self._starts, offset)
+        return self.regions[i] if i < len(self.regions) else None
+
+
+def secondary_regions(offset_set: OffsetSet) -> List[Region]:
+    """Known secondary.elf regions from the offsets data"""
+    secondary = offset_set.data.get('secondary_elf_offsets', {})
+    regions = []
+
+    block = secondary.get('configuration_block', {})
+    if 'base_offset' in block:
+        base = int(block['base_offset'], 16)
+        block_end = base + OffsetSet.CONFIG_BLOCK_SIZE
+        regions.append(Region(base, block_end, 'configuration_block', 'block'))
+        fields = sorted((int(f['offset'], 16), name) for name, f in block.get('fields', {}).items())
+        for i, (offset, name) in enumerate(fields):
+            end = fields[i + 1][0] if i + 1 < len(fields) else block_end
+            regions.append(Region(offset, end, name, 'field'))
+
+    for name, entry in secondary.get('capacity_limits', {}).items():
+        offset = int(entry['offset'], 16)
+        regions.append(Region(offset, offset + OffsetSet.LIMIT_SIZE, name, 'limit'))
+
+    for group in secondary.get('string_references', {}).values():
+        for name, entry in group.items():
+            offset = int(entry['offset'], 16)
+            # Include the NUL terminator
+            regions.append(Region(offset, offset + len(entry['string']) + 1, name, 'string'))
+
+    return regions
+
+
+def container_regions(offset_set: OffsetSet, size: int) -> List[Region]:
+    """TDF header and component regions of a container of the given size"""
+    components = offset_set.components()
+    regions = []
+    if components:
+        regions.append(Region(0, components[0][1], 'tdih_header', 'header'))
+    for i, (name, offset) in enumerate(components):
+        end = components[i + 1][1] if i + 1 < len(components) else size
+        regions.append(Region(offset, end, name, 'component'))
+    return regions
+
+
+def elf_regions(image) -> List[Region]:
+    from elf_parser import ElfFile, SHT_NOBITS
+    try:
+        elf = ElfFile.from_image(image)
+    except ValueError:
+        return []
+    return [
+        Region(s.offset, s.offset + s.size, s.name, 'section')
+        for s in elf.sections
+        if s.name and s.size and s.type != SHT_NOBITS
+    ]
+
+
+def build_region_index(image, offset_set: OffsetSet = None) -> IntervalIndex:
+    """Interval index over every known region of an image"""
+    offset_set = offset_set or OffsetRegistry.default().for_image(image)
+    if OffsetRegistry.detect_version(image.data[:0x100]) is not None:
+        regions = container_regions(offset_set, len(image))
+    else:
+        regions = secondary_regions(offset_set)
+        if image.is_elf():
+            regions += elf_regions(image)
+    return IntervalIndex(regions)
+
+
+def describe(offset: int, regions: List[Region]) -> str:
+    if not regions:
+        return "unknown"
+    return ' < '.join(f"{r.name}+0x{offset - r.start:x} ({r.kind})" for r in regions)
+
+
+def iter_hexdump(image, index: IntervalIndex, start: int, length: int) -> Iterator[str]:
+    """Yield annotated hexdump lines for image[start:start + length]
+
+    The window is read DUMP_CHUNK_SIZE bytes at a time from the mapping.
+    Lines show the owning symbol of their first byte, plus any region that
+    starts part-way through the line. Region lookups are only repeated when
+    a line crosses a region boundary.
+    """
+    end = min(start + length, len(image))
+    position = start
+    boundary = start      # next offset at which the owner/next region may change
+    owner = following = None
+    while position < end:
+        chunk_end = min(position + DUMP_CHUNK_SIZE, end)
+        chunk = image.view(position, chunk_end - position)
+        try:
+            for line_start in range(0, len(chunk), LINE_SIZE):
+                offset = position + line_start
+                line = bytes(chunk[line_start:line_start + LINE_SIZE])
+                line_end = offset + len(line)
+
+                if offset >= boundary or (following is not None and following.start < line_end):
+                    owner = index.owner(offset)
+                    following = index.next_start(offset)
+                    boundary = min(owner.end if owner else end, following.start if following else end)
+
+                label = f"{owner.name}+0x{offset - owner.start:x}" if owner else ''
+                if following is not None and following.start < line_end:
+                    label = (label + ' ' if label else '') + f"-> {following.name}@+{following.start - offset:x}"
+
+                text = line.translate(_PRINTABLE).decode('ascii')
+                yield f"{offset:08x}  {line.hex(' '):<{LINE_SIZE * 3 - 1}}  |{text:<{LINE_SIZE}}|  {label}"
+        finally:
+            chunk.release()
+        position = chunk_end
+
+
+def write_hexdump(image, index: IntervalIndex, start: int, length: int, out: TextIO = sys.stdout):
+    for line in iter_hexdump(image, index, start, length):
+        out.write(line + '\n')
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[2] not in ('at', 'dump', 'regions'):
+        print("Usage: python3 region_map.py <firmware_file> at <offset> [offset ...]")
+        print("       python3 region_map.py <firmware_file> dump <offset> [length]")
+        print("       python3 region_map.py <firmware_file> regions")
+        print("Examples:")
+        print("  python3 region_map.py ../extracted/secondary.elf at 0x66d71c")
+        print("  python3 region_map.py secondary.elf dump 0x66d6f0 0x100")
+        sys.exit(1)
+
+    from firmware_image import FirmwareImage
+
+    filename, command = sys.argv[1], sys.argv[2]
+
+    with FirmwareImage(filename) as image:
+        index = build_region_index(image)
+        try:
+            if command == 'regions':
+                for region in index.regions:
+                    print(f"0x{region.start:08x}-0x{region.end:08x}  {region.kind:<9} {region.name}")
+            elif command == 'at':
+                for arg in sys.argv[3:]:
+                    offset = int(arg, 0)
+                    print(f"0x{offset:08x}: {describe(offset, index.lookup(offset))}")
+            else:
+                if len(sys.argv) < 4:
+                    print("Error: dump needs an offset")
+                    sys.exit(1)
+                start = int(sys.argv[3], 0)
+                length = int(sys.argv[4], 0) if len(sys.argv) > 4 else 0x100
+                write_hexdump(image, index, start, length)
+        except BrokenPipeError:
+            sys.stderr.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Serial Console Client
+===============================
+
+Drives the VxWorks shell on the TTL serial console without screen/minicom.
+Commands are pipelined: up to --window commands are written ahead of their
+prompts, and each "-> " prompt (matched with a compiled pattern) completes the
+oldest outstanding command, since the shell reads and answers its input in
+order. A prompt only completes a command once the shell has echoed that
+command, so stale prompts and boot messages are never mistaken for answers
+(--no-echo falls back to counting prompts). Every received line is
+timestamped, and the run reports per-command latency (command written to
+prompt received) and throughput.
+
+The default command set only queries state: the DebugInterfaces disk commands
+except "k disk freeAll", the protection commands without their arguments
+(the bare forms report the current setting) and the perf info of every
+ManagementModules module. Use --fake to run against a local pty-based fake
+Drobo (fake_drobo.py) with no hardware attached.
+
+Environment Variables:
+    DROBO_SERIAL_PORT - Serial device of the console (default /dev/ttyUSB0)
+
+Usage:
+    python3 serial_console.py [--port DEV] [--baud N] [--window N] [--timeout S]
+                              [--set disk,protection,modules] [--repeat N]
+                              [--no-echo] [--log FILE] [--quiet] [--fake] [command ...]
+
+Examples:
+    python3 serial_console.py
+    python3 serial_console.py --set modules --window 8 --log console.log
+    python3 serial_console.py --port /dev/ttyUSB1 bypassLocks dm
+    python3 serial_console.py --fake --repeat 20 --quiet
+"""
+
+import os
+import re
+import sys
+import time
+from collections import deque
+
+DEFAULT_SERIAL_PORT = os.environ.get('DROBO_SERIAL_PORT', '/dev/ttyUSB0')
+DEFAULT_BAUD = 115200
+DEFAULT_WINDOW = 4
+DEFAULT_TIMEOUT = 10.0
+
+# VxWorks shell prompt; only recognized at the start of a line
+PROMPT_PATTERN = re.compile(rb'-> ')
+
+# Command sets built from the offsets module
+COMMAND_SETS = ('disk', 'protection', 'modules')
+
+# Commands that change device state are never part of a command set
+UNSAFE_COMMANDS = {'k disk freeAll'}
+
+# Optional ("[on]") and alternative ("on|off") arguments in command syntax
+_SYNTAX_ARGUMENT = re.compile(r'\s+(\[[^\]]*\]|\S+\|\S+)')
+
+
+class ConsoleError(OSError):
+    """The console stopped answering or went away"""
+
+
+def query_form(command: str) -> str:
+    """Command without its optional or alternative arguments
+
+    "useSelfMirrored [on]" -> "useSelfMirrored"
+    """
+    return _SYNTAX_ARGUMENT.sub('', command).strip()
+
+
+def command_set(name: str):
+    """Commands of a named set (see COMMAND_SETS)"""
+    from offsets import DebugInterfaces, ManagementModules
+
+    if name == 'disk':
+        return [c for c in DebugInterfaces.DISK_COMMANDS if c not in UNSAFE_COMMANDS]
+    if name == 'protection':
+        return [query_form(c) for c in DebugInterfaces.PROTECTION_COMMANDS]
+    if name == 'modules':
+        return list(ManagementModules.ALL_MODULES)
+    raise ValueError(f"Unknown command set '{name}' (expected one of: {', '.join(COMMAND_SETS)})")
+
+
+def configure_tty(fd: int, baud: int):
+    """Put a serial tty in raw 8N1 mode at baud; returns the previous attributes"""
+    import termios
+    import tty
+
+    speed = getattr(termios, f'B{baud}', None)
+    if speed is None:
+        raise ValueError(f"Unsupported baud rate: {baud}")
+    saved = termios.tcgetattr(fd)
+    tty.setraw(fd)
+    attrs = termios.tcgetattr(fd)
+    attrs[2] = (attrs[2] & ~termios.CSTOPB) | termios.CLOCAL | termios.CREAD
+    attrs[4] = attrs[5] = speed
+    termios.tcsetattr(fd, termios.TCSANOW, attrs)
+    # Drop whatever the device printed before we were listening
+    termios.tcflush(fd, termios.TCIFLUSH)
+    return saved
+
+
+class ConsoleLine:
+    """One line of console output with its receive time (perf_counter seconds)"""
+
+    __slots__ = ('time', 'text')
+
+    def __init__(self, time: float, text: str):
+        self.time = time
+        self.text = text
+
+
+class CommandResult:
+    """A command and the output lines between its echo and the next prompt"""
+
+    __slots__ = ('command', 'sent', 'completed', 'lines', 'echoed', 'done')
+
+    def __init__(self, command: str, done):
+        self.command = command
+        self.sent = None
+        self.completed = None
+        self.lines = []
+        self.echoed = False
+        self.done = done
+
+    @property
+    def latency(self) -> float:
+        """Seconds from writing the command to receiving its prompt"""
+        return self.completed - self.sent
+
+
+class ConsoleClient:
+    """Pipelined command client for the VxWorks shell on a serial tty"""
+
+    def __init__(self, port: str, baud: int = DEFAULT_BAUD, window: int = DEFAULT_WINDOW,
+                 timeout: float = DEFAULT_TIMEOUT, prompt=PROMPT_PATTERN, log=None, echo: bool = True):
+        self.port = port
+        self.baud = baud
+        self.window = window
+        self.timeout = timeout
+        self.prompt = prompt
+        self.log = log
+        self.echo = echo
+        self.fd = None
+        self.bytes_received = 0
+        self.unsolicited = []
+        self._saved_attrs = None
+        self._buffer = bytearray()
+        self._outbox = bytearray()
+        self._pending = deque()
+        self._error = None
+        self._loop = None
+        self._slots = None
+        # Wall clock at perf_counter() == started, for log timestamps
+        self.started = time.perf_counter()
+        self._wall_start = time.time()
+
+    async def open(self):
+        """Open and configure the port, then wait for a first prompt"""
+        # Imported here: asyncio adds ~60 ms to the startup of every tool
+        import asyncio
+
+        self._loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(self.window)
+        self.fd = os.open(self.port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            self._saved_attrs = configure_tty(self.fd, self.baud)
+        except BaseException:
+            os.close(self.fd)
+            self.fd = None
+            raise
+        self._loop.add_reader(self.fd, self._on_readable)
+        # An empty line makes the shell print a fresh prompt
+        try:
+            await self.execute('')
+        except BaseException:
+            await self.close()
+            raise
+        return self
+
+    async def close(self):
+        if self.fd is None:
+            return
+        import termios
+
+        self._loop.remove_reader(self.fd)
+        self._loop.remove_writer(self.fd)
+        try:
+            termios.tcsetattr(self.fd, termios.TCSADRAIN, self._saved_attrs)
+        except OSError:
+            pass
+        os.close(self.fd)
+        self.fd = None
+        self._fail(ConsoleError(f"{self.port} closed"))
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+        return False
+
+    async def execute(self, command: str) -> CommandResult:
+        """Send one command and wait for its prompt
+
+        Up to window commands are outstanding at once; concurrent calls are
+        answered in the order they were written.
+        """
+        import asyncio
+
+        await self._slots.acquire()
+        if self._error is not None:
+            self._slots.release()
+            raise self._error
+        result = CommandResult(command, self._loop.create_future())
+        self._pending.append(result)
+        result.sent = time.perf_counter()
+        self._send(command.encode('ascii') + b'\r')
+        try:
+            await asyncio.wait_for(asyncio.shield(result.done), self.timeout)
+        except asyncio.TimeoutError:
+            # Later prompts can no longer be attributed: stop here
+            error = ConsoleError(f"No prompt within {self.timeout:g}s after '{command}'")
+            self._fail(error)
+            raise error from None
+        return result
+
+    async def run(self, commands):
+        """Pipeline commands; returns their CommandResults in order"""
+        import asyncio
+        return await asyncio.gather(*(self.execute(command) for command in commands))
+
+    def _send(self, data: bytes):
+        self._outbox += data
+        self._flush()
+
+    def _flush(self):
+        try:
+            while self._outbox:
+                written = os.write(self.fd, self._outbox)
+                del self._outbox[:written]
+        except BlockingIOError:
+            self._loop.add_writer(self.fd, self._flush)
+            return
+        except OSError as e:
+            self._fail(ConsoleError(f"Write to {self.port} failed: {e}"))
+            return
+        self._loop.remove_writer(self.fd)
+
+    def _on_readable(self):
+        try:
+            data = os.read(self.fd, 4096)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            data = b''
+            reason = str(e)
+        else:
+            reason = 'end of file'
+        if not data:
+            self._loop.remove_reader(self.fd)
+            self._fail(ConsoleError(f"{self.port}: {reason}"))
+            return
+        self.bytes_received += len(data)
+        self._buffer += data
+        self._parse(time.perf_counter())
+
+    def _parse(self, now: float):
+        buffer = self._buffer
+        while True:
+            newline = buffer.find(b'\n')
+            if newline < 0:
+                # The prompt is the one thing not followed by a newline
+                if buffer and self.prompt.fullmatch(buffer):
+                    buffer.clear()
+                    self._on_prompt(now)
+                return
+            line = bytes(buffer[:newline]).rstrip(b'\r')
+            del buffer[:newline + 1]
+            match = self.prompt.match(line)
+            if match:
+                # "-> cmd": the prompt, then the echo of the next command
+                self._on_prompt(now)
+                line = line[match.end():]
+                if not line:
+                    continue
+            self._on_line(now, line.decode('latin-1'))
+
+    def _on_prompt(self, now: float):
+        if not self._pending:
+            return
+        if self.echo and not self._pending[0].echoed:
+            # Printed before the shell read the command: not its answer
+            return
+        result = self._pending.popleft()
+        result.completed = now
+        if not result.done.done():
+            result.done.set_result(result)
+        self._slots.release()
+
+    def _on_line(self, now: float, text: str):
+        line = ConsoleLine(now, text)
+        if self.log is not None:
+            wall = self._wall_start + (now - self.started)
+            stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(wall))
+            self.log.write(f"{stamp}.{int(wall * 1e6) % 1000000:06d} {text}\n")
+        if not self._pending:
+            self.unsolicited.append(line)
+            return
+        result = self._pending[0]
+        if not result.echoed:
+            if text == result.command:
+                result.echoed = True
+                return
+            if self.echo:
+                self.unsolicited.append(line)
+                return
+        result.lines.append(line)
+
+    def _fail(self, error: Exception):
+        """Fail every outstanding command; later ones raise at once"""
+        if self._error is None:
+            self._error = error
+        while self._pending:
+            result = self._pending.popleft()
+            if not result.done.done():
+                result.done.set_exception(error)
+                # Retrieved by execute(), or nobody is waiting any more
+                result.done.exception()
+            self._slots.release()
+
+
+def latency_summary(results):
+    """(p50, p95, max) command latency in seconds"""
+    latencies = sorted(result.latency for result in results)
+    if not latencies:
+        return 0.0, 0.0, 0.0
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+    return percentile(0.50), percentile(0.95), latencies[-1]
+
+
+async def run_session(port: str, commands, baud: int = DEFAULT_BAUD, window: int = DEFAULT_WINDOW,
+                      timeout: float = DEFAULT_TIMEOUT, log=None, echo: bool = True, fake: bool = False):
+    """Run commands on the console at port (or on a fresh fake Drobo)
+
+    Returns (client, results, elapsed seconds).
+    """
+    from tracing import span
+
+    device = None
+    if fake:
+        from fake_drobo import FakeDrobo
+        device = await FakeDrobo(baud=baud).start()
+        port = device.path
+    try:
+        async with ConsoleClient(port, baud, window, timeout, log=log, echo=echo) as client:
+            with span('console', port=port, commands=len(commands), window=window) as stage:
+                start = time.perf_counter()
+                received = client.bytes_received
+                results = await client.run(commands)
+                elapsed = time.perf_counter() - start
+                stage.add_bytes(client.bytes_received - received)
+        return client, results, elapsed
+    finally:
+        if device is not None:
+            await device.close()
+
+
+def print_results(client, results, elapsed: float, quiet: bool = False):
+    if not quiet:
+        for result in results:
+            print(f"-> {result.command}")
+            for line in result.lines:
+                print(f"[{line.time - client.started:12.6f}] {line.text}")
+    p50, p95, worst = latency_summary(results)
+    received = sum(len(line.text) + 2 for result in results for line in result.lines)
+    print(f"Commands: {len(results)} in {elapsed:.3f} s ({len(results) / max(elapsed, 1e-9):.1f} commands/s, "
+          f"window {client.window})")
+    print(f"Output:   {received / 1024:.1f} KiB in {sum(len(r.lines) for r in results)} lines "
+          f"({received / 1024 / max(elapsed, 1e-9):.1f} KiB/s)")
+    print(f"Latency:  p50 {p50 * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms, max {worst * 1000:.1f} ms")
+
+
+def main():
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description='Pipelined client for the Drobo serial console')
+    parser.add_argument('commands', nargs='*', help='commands to run (default: the --set command sets)')
+    parser.add_argument('--port', default=DEFAULT_SERIAL_PORT, help=f'serial device (default: {DEFAULT_SERIAL_PORT})')
+    parser.add_argument('--baud', type=int, default=DEFAULT_BAUD, help=f'baud rate (default: {DEFAULT_BAUD})')
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW,
+                        help=f'commands in flight at once (default: {DEFAULT_WINDOW}; 1 = one at a time)')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help=f'seconds to wait for each prompt (default: {DEFAULT_TIMEOUT:g})')
+    parser.add_argument('--set', default=','.join(COMMAND_SETS),
+                        help=f"comma-separated command sets (default: {','.join(COMMAND_SETS)})")
+    parser.add_argument('--repeat', type=int, default=1, help='run the command list N times')
+    parser.add_argument('--no-echo', dest='echo', action='store_false',
+                        help='console does not echo commands: complete them on prompts alone')
+    parser.add_argument('--log', metavar='FILE', help='append every line with a wall-clock timestamp to FILE')
+    parser.add_argument('--quiet', action='store_true', help='print only the summary')
+    parser.add_argument('--fake', action='store_true', help='run against a local fake Drobo on a pty')
+    args = parser.parse_args()
+
+    if args.window < 1:
+        print("Error: --window must be at least 1")
+        sys.exit(1)
+    try:
+        commands = list(args.commands)
+        if not commands:
+            for name in args.set.split(','):
+                commands.extend(command_set(name))
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    log = open(args.log, 'a') if args.log else None
+    try:
+        client, results, elapsed = asyncio.run(run_session(
+            args.port, commands * args.repeat, args.baud, args.window, args.timeout, log, args.echo, args.fake))
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        if log is not None:
+            log.close()
+    print_results(client, results, elapsed, args.quiet)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Streaming Copy Helpers
+================================
+
+Kernel-side copying of byte ranges between files, used to extract TDF
+components without pulling them through Python memory. Each copy tries
+os.copy_file_range, then os.sendfile, then fixed-size pread/write chunks, so
+peak RSS stays flat regardless of component size.
+
+Duplicate outputs are produced with a reflink (copy-on-write clone) where the
+filesystem supports it, then a hard link, and only then a streamed copy.
+"""
+
+import errno
+import os
+
+# Chunk size for the pread/write fallback
+CHUNK_SIZE = 1024 * 1024
+
+# Linux FICLONE ioctl (_IOW(0x94, 9, int))
+FICLONE = 0x40049409
+
+# Errors meaning "this mechanism is unavailable here", not "the copy failed"
+_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF}
+
+
+def _copy_file_range(src_fd, dst_fd, offset, length):
+    copied = 0
+    while copied < length:
+        n = os.copy_file_range(src_fd, dst_fd, length - copied, offset + copied)
+        if n == 0:
+            break
+        copied += n
+    return copied
+
+
+def _sendfile(src_fd, dst_fd, offset, length):
+    copied = 0
+    while copied < length:
+        n = os.sendfile(dst_fd, src_fd, offset + copied, length - copied)
+        if n == 0:
+            break
+        copied += n
+    return copied
+
+
+def _chunked(src_fd, dst_fd, offset, length):
+    copied = 0
+    while copied < length:
+        chunk = os.pread(src_fd, min(CHUNK_SIZE, length - copied), offset + copied)
+        if not chunk:
+            break
+        view = memoryview(chunk)
+        while view:
+            written = os.write(dst_fd, view)
+            view = view[written:]
+        copied += len(chunk)
+    return copied
+
+
+def copy_range(src_fd: int, dst_fd: int, offset: int, length: int) -> int:
+    """Copy length bytes from src_fd at offset to dst_fd's current position
+
+    Returns the number of bytes copied (short only if the source ends early).
+    """
+    methods = []
+    if hasattr(os, 'copy_file_range'):
+        methods.append(_copy_file_range)
+    if hasattr(os, 'sendfile'):
+        methods.append(_sendfile)
+    methods.append(_chunked)
+
+    for method in methods:
+        start = os.lseek(dst_fd, 0, os.SEEK_CUR)
+        try:
+            return method(src_fd, dst_fd, offset, length)
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED or method is _chunked:
+                raise
+            # Discard any partial output before trying the next mechanism
+            os.lseek(dst_fd, start, os.SEEK_SET)
+            os.ftruncate(dst_fd, start)
+    return 0
+
+
+def extract_range(src_fd: int, output_path: str, offset: int, length: int) -> int:
+    """Stream a byte range of an open file into a new output file"""
+    fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        return copy_range(src_fd, fd, offset, length)
+    finally:
+        os.close(fd)
+
+
+def _reflink(src_path: str, dst_path: str) -> bool:
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    src_fd = os.open(src_path, os.O_RDONLY)
+    try:
+        dst_fd = os.open(dst_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            fcntl.ioctl(dst_fd, FICLONE, src_fd)
+            return True
+        except OSError:
+            pass
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    os.unlink(dst_path)
+    return False
+
+
+def duplicate_file(src_path: str, dst_path: str, allow_hardlink: bool = True) -> str:
+    """Make dst_path a copy of src_path without rewriting the data if possible
+
+    Hard links share the inode, so pass allow_hardlink=False when either
+    file may later be modified in place. Returns the mechanism used:
+    'reflink', 'hardlink' or 'copy'.
+    """
+    if os.path.lexists(dst_path):
+        os.unlink(dst_path)
+
+    if _reflink(src_path, dst_path):
+        return 'reflink'
+
+    if allow_hardlink:
+        try:
+            os.link(src_path, dst_path)
+            return 'hardlink'
+        except OSError:
+            pass
+
+    src_fd = os.open(src_path, os.O_RDONLY)
+    try:
+        extract_range(src_fd, dst_path, 0, os.fstat(src_fd).st_size)
+    finally:
+        os.close(src_fd)
+    return 'copy'
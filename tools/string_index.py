@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Persistent String Index
+=================================
+
+Builds a string index for a firmware image once and caches it on disk keyed
+by the image SHA-256. Later runs memory-map the cached index and answer exact,
+prefix and substring lookups without rescanning the image.
+
+Index file layout (little-endian, every section 8-byte aligned):
+    header   magic 'DSIX', version, count, min_length, blob size
+    offsets  u64[count]      image offset of each string (ascending)
+    starts   u64[count + 1]  start of each string in the blob
+    widths   u8[count]       bytes per character in the image (1 or 2)
+    order    u32[count]      string indices sorted by text
+    blob     UTF-8 strings separated by NUL bytes
+
+Environment Variables:
+    DROBO_CACHE_PATH - Cache root directory (default: ~/.cache/drobo-fw)
+
+Usage:
+    python3 string_index.py <firmware_file> <exact|prefix|substring|at|verify> [query]
+
+Examples:
+    python3 string_index.py secondary.elf exact "RegionSize"
+    python3 string_index.py secondary.elf prefix "DPM::discoverDis"
+    python3 string_index.py secondary.elf substring "ZoneManager"
+    python3 string_index.py secondary.elf at 0x66d700
+    python3 string_index.py secondary.elf verify
+"""
+
+import bisect
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import List, Optional, Tuple
+from cache import atomic_write, cache_path
+from strings_extractor import DEFAULT_MIN_LENGTH, iter_tagged_strings
+
+INDEX_MAGIC = b'DSIX'
+INDEX_VERSION = 1
+_HEADER = struct.Struct('<4sIIIQQ')
+
+_WIDTHS = {'ascii': 1, 'utf-16le': 2}
+
+
+def _pad8(size: int) -> int:
+    return (size + 7) & ~7
+
+
+class _SortedKeys:
+    """Sequence view of blob strings in sorted order, for bisect"""
+
+    def __init__(self, index):
+        self._index = index
+
+    def __len__(self):
+        return len(self._index)
+
+    def __getitem__(self, position):
+        return self._index._raw(self._index._order[position])
+
+
+class StringIndex:
+    """Memory-mapped string index with exact, prefix and substring lookups"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._map) < _HEADER.size:
+            self._map.close()
+            raise ValueError(f"Truncated string index: {path}")
+        magic, version, count, min_length, blob_size, _ = _HEADER.unpack_from(self._map, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            self._map.close()
+            raise ValueError(f"Not a string index (or stale version): {path}")
+        size = _HEADER.size + count * 8 + (count + 1) * 8 + _pad8(count) + _pad8(count * 4) + blob_size
+        if len(self._map) != size:
+            self._map.close()
+            raise ValueError(f"Truncated or corrupt string index: {path}")
+        self.count = count
+        self.min_length = min_length
+
+        view = memoryview(self._map)
+        pos = _HEADER.size
+        self._offsets = view[pos:pos + count * 8].cast('Q')
+        pos += count * 8
+        self._starts = view[pos:pos + (count + 1) * 8].cast('Q')
+        pos += (count + 1) * 8
+        self._widths = view[pos:pos + count]
+        pos += _pad8(count)
+        self._order = view[pos:pos + count * 4].cast('I')
+        pos += _pad8(count * 4)
+        self._blob_start = pos
+        self._blob_end = pos + blob_size
+        self._view = view
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        if self._map is None:
+            return
+        for view in (self._offsets, self._starts, self._widths, self._order, self._view):
+            view.release()
+        self._map.close()
+        self._map = None
+
+    def _raw(self, i: int) -> bytes:
+        start = self._blob_start + self._starts[i]
+        end = self._blob_start + self._starts[i + 1] - 1    # strip NUL separator
+        return self._map[start:end]
+
+    def string(self, i: int) -> str:
+        return self._raw(i).decode('utf-8')
+
+    def offset(self, i: int) -> int:
+        return self._offsets[i]
+
+    def entries(self):
+        """Iterate (offset, string) in image order"""
+        for i in range(self.count):
+            yield self._offsets[i], self.string(i)
+
+    def exact(self, text: str) -> List[int]:
+        """Image offsets of strings equal to text"""
+        key = text.encode('utf-8')
+        keys = _SortedKeys(self)
+        results = []
+        position = bisect.bisect_left(keys, key)
+        while position < self.count and keys[position] == key:
+            results.append(self._offsets[self._order[position]])
+            position += 1
+        return sorted(results)
+
+    def prefix(self, text: str) -> List[Tuple[int, str]]:
+        """(offset, string) for strings starting with text"""
+        key = text.encode('utf-8')
+        keys = _SortedKeys(self)
+        results = []
+        position = bisect.bisect_left(keys, key)
+        while position < self.count:
+            raw = keys[position]
+            if not raw.startswith(key):
+                break
+            results.append((self._offsets[self._order[position]], raw.decode('utf-8')))
+            position += 1
+        return sorted(results)
+
+    def substring(self, text: str) -> List[Tuple[int, str]]:
+        """(offset, string) for every occurrence of text inside a string
+
+        The offset is the image offset of the match itself, not of the
+        containing string.
+        """
+        key = text.encode('utf-8')
+        if not key or b'\x00' in key:
+            return []
+        results = []
+        pos = self._map.find(key, self._blob_start, self._blob_end)
+        while pos != -1:
+            blob_pos = pos - self._blob_start
+            i = bisect.bisect_right(self._starts, blob_pos) - 1
+            within = blob_pos - self._starts[i]
+            # Strings are printable ASCII, so UTF-8 bytes map 1:1 to characters
+            results.append((self._offsets[i] + within * self._widths[i], self.string(i)))
+            pos = self._map.find(key, pos + 1, self._blob_end)
+        return results
+
+    def find(self, text: str) -> int:
+        """Image offset of the first occurrence of text, -1 if absent"""
+        matches = self.substring(text)
+        return matches[0][0] if matches else -1
+
+    def string_at(self, offset: int) -> Optional[Tuple[int, str]]:
+        """(start offset, string) of the string containing an image offset"""
+        i = bisect.bisect_right(self._offsets, offset) - 1
+        if i < 0:
+            return None
+        start = self._offsets[i]
+        length = (self._starts[i + 1] - self._starts[i] - 1) * self._widths[i]
+        if offset >= start + length:
+            return None
+        return start, self.string(i)
+
+    @classmethod
+    def build(cls, image, path: str, min_length: int = DEFAULT_MIN_LENGTH) -> 'StringIndex':
+        """Scan an image and write its index to path"""
+        offsets = array('Q')
+        starts = array('Q', [0])
+        widths = bytearray()
+        blob = bytearray()
+        for offset, text, encoding in iter_tagged_strings(image.data, min_length):
+            offsets.append(offset)
+            widths.append(_WIDTHS[encoding])
+            blob += text.encode('utf-8')
+            blob += b'\x00'
+            starts.append(len(blob))
+
+        count = len(offsets)
+        order = array('I', sorted(
+            range(count),
+            key=lambda i: blob[starts[i]:starts[i + 1] - 1],
+        ))
+
+        parts = [
+            _HEADER.pack(INDEX_MAGIC, INDEX_VERSION, count, min_length, len(blob), 0),
+            offsets.tobytes(),
+            starts.tobytes(),
+            bytes(widths).ljust(_pad8(count), b'\x00'),
+            order.tobytes().ljust(_pad8(count * 4), b'\x00'),
+            bytes(blob),
+        ]
+        atomic_write(path, b''.join(parts))
+        return cls(path)
+
+    @classmethod
+    def for_image(cls, image, min_length: int = DEFAULT_MIN_LENGTH) -> 'StringIndex':
+        """Load the cached index for an image, building it on first use"""
+        path = cache_path('strings', f"{image.sha256()}-n{min_length}.idx")
+        if os.path.exists(path):
+            try:
+                return cls(path)
+            except (ValueError, struct.error):
+                pass
+        return cls.build(image, path, min_length)
+
+
+def verify_string_offsets(index: StringIndex) -> List[Tuple[str, int, bool, str]]:
+    """Check StringOffsets entries against the strings documented in the JSON data"""
+    from offsets import DroboOffsets
+
+    data = DroboOffsets.load_from_json() or {}
+    string_refs = data.get('secondary_elf_offsets', {}).get('string_references', {})
+
+    results = []
+    for group in string_refs.values():
+        for name, entry in group.items():
+            offset = int(entry['offset'], 16)
+            expected = entry['string']
+            found = index.string_at(offset)
+            actual = found[1][offset - found[0]:] if found else ''
+            results.append((name, offset, actual.startswith(expected), actual))
+    return results
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: python3 string_index.py <firmware_file> <exact|prefix|substring|at|verify> [query]")
+        print("Examples:")
+        print('  python3 string_index.py secondary.elf prefix "DPM::discoverDis"')
+        print("  python3 string_index.py secondary.elf at 0x66d700")
+        print("  python3 string_index.py secondary.elf verify")
+        sys.exit(1)
+
+    from firmware_image import FirmwareImage
+
+    filename, command = sys.argv[1], sys.argv[2]
+    query = sys.argv[3] if len(sys.argv) > 3 else None
+    if command != 'verify' and query is None:
+        print(f"Error: '{command}' needs a query")
+        sys.exit(1)
+
+    with FirmwareImage(filename) as image:
+        index = StringIndex.for_image(image)
+
+    with index:
+        if command == 'exact':
+            for offset in index.exact(query):
+                print(f"0x{offset:08x}  {query}")
+        elif command in ('prefix', 'substring'):
+            lookup = index.prefix if command == 'prefix' else index.substring
+            for offset, text in lookup(query):
+                print(f"0x{offset:08x}  {text}")
+        elif command == 'at':
+            found = index.string_at(int(query, 0))
+            print(f"0x{found[0]:08x}  {found[1]}" if found else "No string at that offset")
+        elif command == 'verify':
+            for name, offset, ok, actual in verify_string_offsets(index):
+                print(f"  {'✓' if ok else '✗'} {name:<24} 0x{offset:08x}  {actual[:48]!r}")
+        else:
+            print(f"Error: Unknown command '{command}'")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
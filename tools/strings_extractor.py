@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Strings Extractor
+===========================
+
+In-process replacement for the `strings` utility. Printable runs are found
+directly in the memory-mapped image and yielded lazily as (offset, string)
+tuples, so nothing is buffered and every hit keeps its file offset.
+
+Supports ASCII and UTF-16LE strings with a configurable minimum length, and a
+capacity-message search that applies all capacity regexes as one combined
+pattern in a single pass.
+
+Usage:
+    python3 strings_extractor.py <firmware_file> [-n MIN_LENGTH] [-e ENCODING] [--capacity]
+
+Examples:
+    python3 strings_extractor.py ../extracted/secondary.elf -n 8
+    python3 strings_extractor.py secondary.elf -e utf-16le
+    python3 strings_extractor.py secondary.elf --capacity
+"""
+
+import argparse
+import heapq
+import re
+import sys
+from typing import Iterator, Sequence, Tuple
+
+DEFAULT_MIN_LENGTH = 4
+ENCODINGS = ('ascii', 'utf-16le')
+
+# Printable characters as accepted by GNU strings (plus tab)
+_PRINTABLE = rb'[\x20-\x7e\t]'
+
+# Capacity-related message patterns (case-insensitive)
+CAPACITY_PATTERNS = [
+    r'[0-9]+\s*[TG]B',
+    r'[Ll]imit.*[0-9]+',
+    r'[Mm]ax.*[Cc]apacity',
+    r'[Ee]xceed.*[Cc]apacity',
+    r'[Tt]oo.*[Ll]arge',
+    r'[Dd]rive.*[Ss]ize.*[Ll]imit',
+]
+
+_regex_cache = {}
+
+
+def _strings_regex(encoding: str, min_length: int):
+    key = (encoding, min_length)
+    if key not in _regex_cache:
+        if encoding == 'ascii':
+            pattern = _PRINTABLE + rb'{%d,}' % min_length
+        elif encoding == 'utf-16le':
+            pattern = rb'(?:' + _PRINTABLE + rb'\x00){%d,}' % min_length
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+        _regex_cache[key] = re.compile(pattern)
+    return _regex_cache[key]
+
+
+def _iter_encoding(data, encoding: str, min_length: int) -> Iterator[Tuple[int, str]]:
+    for match in _strings_regex(encoding, min_length).finditer(data):
+        yield match.start(), match.group().decode(encoding)
+
+
+def _iter_tagged(data, encoding: str, min_length: int) -> Iterator[Tuple[int, str, str]]:
+    for match in _strings_regex(encoding, min_length).finditer(data):
+        yield match.start(), match.group().decode(encoding), encoding
+
+
+def iter_strings(data, min_length: int = DEFAULT_MIN_LENGTH,
+                 encodings: Sequence[str] = ENCODINGS) -> Iterator[Tuple[int, str]]:
+    """Lazily yield (offset, string) for every printable run, in offset order"""
+    streams = [_iter_encoding(data, encoding, min_length) for encoding in encodings]
+    if len(streams) == 1:
+        return streams[0]
+    return heapq.merge(*streams)
+
+
+def iter_tagged_strings(data, min_length: int = DEFAULT_MIN_LENGTH,
+                        encodings: Sequence[str] = ENCODINGS) -> Iterator[Tuple[int, str, str]]:
+    """Like iter_strings() but yields (offset, string, encoding)"""
+    return heapq.merge(*[_iter_tagged(data, encoding, min_length) for encoding in encodings])
+
+
+def capacity_regex():
+    """All capacity patterns combined into one regex with a named group each"""
+    if 'capacity' not in _regex_cache:
+        combined = '|'.join(f'(?P<p{i}>{pattern})' for i, pattern in enumerate(CAPACITY_PATTERNS))
+        _regex_cache['capacity'] = re.compile(combined, re.IGNORECASE)
+    return _regex_cache['capacity']
+
+
+def search_capacity_strings(data, min_length: int = DEFAULT_MIN_LENGTH,
+                            encodings: Sequence[str] = ENCODINGS) -> Iterator[Tuple[int, str, int]]:
+    """Yield (offset, string, pattern_index) for capacity-related strings"""
+    search = capacity_regex().search
+    for offset, text in iter_strings(data, min_length, encodings):
+        match = search(text)
+        if match:
+            yield offset, text, int(match.lastgroup[1:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract printable strings with file offsets')
+    parser.add_argument('firmware_file')
+    parser.add_argument('-n', '--min-length', type=int, default=DEFAULT_MIN_LENGTH,
+                        help=f'minimum string length (default: {DEFAULT_MIN_LENGTH})')
+    parser.add_argument('-e', '--encoding', choices=list(ENCODINGS) + ['both'], default='both',
+                        help='string encoding to extract (default: both)')
+    parser.add_argument('--capacity', action='store_true',
+                        help='only print capacity-related strings')
+    args = parser.parse_args()
+
+    from firmware_image import FirmwareImage
+
+    encodings = ENCODINGS if args.encoding == 'both' else (args.encoding,)
+
+    with FirmwareImage(args.firmware_file) as image:
+        try:
+            if args.capacity:
+                for offset, text, index in search_capacity_strings(image.data, args.min_length, encodings):
+                    print(f"0x{offset:08x}  [{CAPACITY_PATTERNS[index]}]  {text}")
+            else:
+                for offset, text in iter_strings(image.data, args.min_length, encodings):
+                    print(f"0x{offset:08x}  {text}")
+        except BrokenPipeError:
+            sys.stderr.close()
+
+
+if __name__ == "__main__":
+    main()
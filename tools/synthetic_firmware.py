@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Synthetic Firmware Generator
+======================================
+
+Builds firmware-shaped test images for CI and benchmarks, where the real
+release.Drobo5D3.4-2-3.tdf cannot be shipped. Images are deterministic for a
+given size and seed.
+
+A synthetic secondary.elf is a valid little-endian ARM ELF32 with .text
+(ARM-looking instruction words), .rodata (NUL-separated messages) and .data
+sections. Every DroboOffsets location is planted: configuration fields,
+both capacity limits and the known strings at their recorded offsets, plus
+extra capacity constants and capacity messages for the scanners to find.
+
+A synthetic .tdf container has a TDIH header carrying the firmware version
+string, a small main VxWorks ELF, a synthetic secondary.elf and a WIND
+kernel blob at the FirmwareComponents offsets.
+
+Usage:
+    python3 synthetic_firmware.py secondary <output.elf> [--size-mb N] [--seed N] [--patched]
+    python3 synthetic_firmware.py tdf <output.tdf> [--size-mb N] [--seed N] [--patched]
+
+Examples:
+    python3 synthetic_firmware.py secondary /tmp/secondary.elf
+    python3 synthetic_firmware.py tdf /tmp/release.synthetic.tdf --size-mb 64
+"""
+
+import random
+import struct
+import sys
+from typing import List, Tuple
+from offsets import DroboOffsets, OffsetRegistry, ProtectionModes
+
+# Virtual address the synthetic secondary.elf is linked at
+LOAD_ADDRESS = 0x00100000
+
+# Section layout of a synthetic secondary.elf; .data runs to the end of the payload
+TEXT_START = 0x1000
+RODATA_START = 0x600000
+DATA_START = 0x66d000
+
+# Smallest secondary.elf holding every planted offset
+MIN_SECONDARY_SIZE = DroboOffsets.CONFIG.BASE_OFFSET + 0x10000
+
+DEFAULT_SECONDARY_SIZE = 8 * 1024 * 1024
+DEFAULT_TDF_SIZE = 24 * 1024 * 1024
+
+# Kernel blob that follows the secondary ELF in a container
+MIN_KERNEL_SIZE = 0x10000
+
+# Copies of each capacity constant planted in .data (besides the real limits)
+CONSTANT_COPIES = 4
+
+# Messages sprinkled through .rodata; a few match the capacity searches
+MESSAGES = [
+    "Drive size limit exceeded", "Maximum capacity reached", "Pack is too large",
+    "Disk %d of %d: %s", "zone %u rebuilt in %u ms", "RegionSize mismatch",
+    "Cannot exceed capacity of 16TB", "LBA out of range", "hlbat flush",
+    "Redundancy lost on slot %d", "Data protection in progress",
+]
+
+_WORDS = [
+    "zone", "pack", "disk", "slot", "region", "tracker", "cache", "flush", "rebuild",
+    "mirror", "sector", "block", "host", "queue", "error", "state", "config", "manager",
+]
+
+_EHDR = struct.Struct('<16sHHIIIIIHHHHHH')
+_PHDR = struct.Struct('<8I')
+_SHDR = struct.Struct('<10I')
+
+SHT_PROGBITS = 1
+SHT_STRTAB = 3
+SHF_WRITE = 0x1
+SHF_ALLOC = 0x2
+SHF_EXECINSTR = 0x4
+EM_ARM = 40
+
+# Top nibble of each instruction word forced to 0xE (ARM "always" condition)
+_ARM_CONDITION = bytes(0xE0 | (b & 0x0F) for b in range(256))
+# Non-zero 7-bit values for .data filler, so planted constants are the only
+# zero-padded integers there
+_DATA_VALUES = bytes(b % 0x7F + 1 for b in range(256))
+
+
+def _code(rng: random.Random, size: int) -> bytes:
+    words = bytearray(rng.randbytes(size))
+    words[3::4] = bytes(words[3::4]).translate(_ARM_CONDITION)
+    return bytes(words)
+
+
+def _rodata(rng: random.Random, size: int) -> bytes:
+    parts = []
+    total = 0
+    while total < size:
+        if rng.random() < 0.1:
+            text = rng.choice(MESSAGES)
+        else:
+            text = ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(1, 5)))
+        part = text.encode('ascii') + b'\x00' * rng.randint(1, 4)
+        parts.append(part)
+        total += len(part)
+    return b''.join(parts)[:size]
+
+
+def _data(rng: random.Random, size: int) -> bytes:
+    return rng.randbytes(size).translate(_DATA_VALUES)
+
+
+def _write_elf(buf: bytearray, sections: List[Tuple[str, int, int, int, int]], payload_end: int):
+    """Write ELF32 headers into buf: one PT_LOAD over [0, payload_end) and the
+    given (name, type, flags, offset, size) sections, with .shstrtab and the
+    section header table placed after payload_end"""
+    names = b'\x00'
+    name_offsets = []
+    for name, *_ in sections + [('.shstrtab', 0, 0, 0, 0)]:
+        name_offsets.append(len(names))
+        names += name.encode('ascii') + b'\x00'
+
+    shstrtab_offset = payload_end
+    shoff = (shstrtab_offset + len(names) + 3) & ~3
+    shnum = len(sections) + 2
+    if shoff + shnum * _SHDR.size > len(buf):
+        raise ValueError("Image too small for its ELF headers")
+
+    ident = b'\x7fELF' + bytes([1, 1, 1]) + bytes(9)
+    _EHDR.pack_into(buf, 0, ident, 2, EM_ARM, 1, LOAD_ADDRESS + TEXT_START, _EHDR.size, shoff,
+                    0x05000000, _EHDR.size, _PHDR.size, 1, _SHDR.size, shnum, shnum - 1)
+    _PHDR.pack_into(buf, _EHDR.size, 1, 0, LOAD_ADDRESS, LOAD_ADDRESS, payload_end, payload_end, 7, 0x1000)
+
+    buf[shstrtab_offset:shstrtab_offset + len(names)] = names
+    _SHDR.pack_into(buf, shoff, *([0] * 10))
+    for i, (name, sh_type, flags, offset, size) in enumerate(sections, start=1):
+        _SHDR.pack_into(buf, shoff + i * _SHDR.size, name_offsets[i - 1], sh_type, flags,
+                        LOAD_ADDRESS + offset, offset, size, 0, 0, 4, 0)
+    _SHDR.pack_into(buf, shoff + (shnum - 1) * _SHDR.size, name_offsets[-1], SHT_STRTAB, 0, 0,
+                    shstrtab_offset, len(names), 0, 0, 1, 0)
+
+
+def _trailer_size(section_count: int) -> int:
+    """Bytes after the payload: .shstrtab (padded) plus the section header table"""
+    return 64 + (section_count + 2) * _SHDR.size
+
+
+def plant_offsets(buf: bytearray, patched: bool = False, version: str = None):
+    """Write configuration fields, known strings and capacity limits at their offsets"""
+    config = DroboOffsets.CONFIG
+    limits = DroboOffsets.CAPACITY_LIMITS
+
+    # Strings before the config fields: a label such as PROTECTION_MODE_LABEL
+    # is longer than the gap to the next field, which must keep its value
+    secondary = OffsetRegistry.default().get(version).data.get('secondary_elf_offsets', {})
+    for group in secondary.get('string_references', {}).values():
+        for entry in group.values():
+            offset = int(entry['offset'], 16)
+            text = entry['string'].encode('ascii') + b'\x00'
+            buf[offset:offset + len(text)] = text
+
+    struct.pack_into('<I', buf, config.PROTECTION_MODE, ProtectionModes.DUAL_REDUNDANCY)
+    struct.pack_into('<I', buf, config.MANAGE_CAPACITY_LEDS, 1)
+    struct.pack_into('<I', buf, config.SHOW_CAPACITY_HOST_VIEW, 0)
+    struct.pack_into('<I', buf, config.LARGE_PACK_MODE, 1)
+    struct.pack_into('<I', buf, config.LAST_UI_CALL_TIME, 0x5F5E1000)
+
+    bytes_limit = limits.PATCH_BYTES_LIMIT if patched else limits.ORIGINAL_BYTES_LIMIT
+    sectors_limit = limits.PATCH_SECTORS_LIMIT if patched else limits.ORIGINAL_SECTORS_LIMIT
+    struct.pack_into('<Q', buf, limits.BYTES_BASED, bytes_limit)
+    struct.pack_into('<Q', buf, limits.SECTORS_BASED, sectors_limit)
+
+
+def build_secondary_elf(size: int = DEFAULT_SECONDARY_SIZE, seed: int = 0, patched: bool = False) -> bytearray:
+    """Synthetic secondary.elf of exactly size bytes"""
+    if size < MIN_SECONDARY_SIZE:
+        raise ValueError(f"secondary.elf must be at least {MIN_SECONDARY_SIZE:,} bytes")
+    from pattern_scanner import CAPACITY_CONSTANTS
+
+    rng = random.Random(seed)
+    buf = bytearray(size)
+    payload_end = (size - _trailer_size(3)) & ~0xF
+    sections = [
+        ('.text', SHT_PROGBITS, SHF_ALLOC | SHF_EXECINSTR, TEXT_START, RODATA_START - TEXT_START),
+        ('.rodata', SHT_PROGBITS, SHF_ALLOC, RODATA_START, DATA_START - RODATA_START),
+        ('.data', SHT_PROGBITS, SHF_ALLOC | SHF_WRITE, DATA_START, payload_end - DATA_START),
+    ]
+    for name, _, _, offset, length in sections:
+        fill = {'.text': _code, '.rodata': _rodata, '.data': _data}[name]
+        buf[offset:offset + length] = fill(rng, length)
+
+    # Extra capacity constants past the configuration block, 8-byte aligned
+    first = (DroboOffsets.CONFIG.BASE_OFFSET + 0x100 + 7) & ~7
+    for value in CAPACITY_CONSTANTS.values():
+        for _ in range(CONSTANT_COPIES):
+            struct.pack_into('<Q', buf, rng.randrange(first, payload_end - 8) & ~7, value)
+
+    plant_offsets(buf, patched)
+    _write_elf(buf, sections, payload_end)
+    return buf
+
+
+def build_tdf(size: int = DEFAULT_TDF_SIZE, seed: int = 0, patched: bool = False,
+              version: str = None) -> bytearray:
+    """Synthetic TDF container of exactly size bytes"""
+    firmware = DroboOffsets.FIRMWARE
+    if size < firmware.VXWORKS_KERNEL_BIN + MIN_KERNEL_SIZE:
+        raise ValueError(f"TDF container must be at least {firmware.VXWORKS_KERNEL_BIN + MIN_KERNEL_SIZE:,} bytes")
+    version = version or DroboOffsets.FIRMWARE_VERSION
+
+    rng = random.Random(seed)
+    buf = bytearray(size)
+    struct.pack_into('<II4sI16s', buf, 0, firmware.MAIN_VXWORKS_ELF, 0, b'TDIH', 1, b'Drobo5D3')
+    banner = f"Drobo5D3 {version} build".encode('ascii')
+    buf[0x30:0x30 + len(banner)] = banner
+
+    # Main VxWorks loader: a plain ELF with a single .text section
+    main_size = firmware.SECONDARY_ELF - firmware.MAIN_VXWORKS_ELF
+    main = bytearray(main_size)
+    main_end = (main_size - _trailer_size(1)) & ~0xF
+    main[TEXT_START:main_end] = _code(rng, main_end - TEXT_START)
+    main[TEXT_START:TEXT_START + 8] = b'VxWorks\x00'
+    _write_elf(main, [('.text', SHT_PROGBITS, SHF_ALLOC | SHF_EXECINSTR, TEXT_START, main_end - TEXT_START)],
+               main_end)
+    buf[firmware.MAIN_VXWORKS_ELF:firmware.SECONDARY_ELF] = main
+
+    buf[firmware.SECONDARY_ELF:firmware.VXWORKS_KERNEL_BIN] = build_secondary_elf(
+        firmware.VXWORKS_KERNEL_BIN - firmware.SECONDARY_ELF, seed, patched)
+
+    kernel = bytearray(_code(rng, size - firmware.VXWORKS_KERNEL_BIN))
+    kernel[:16] = b'WIND version 2.6'
+    buf[firmware.VXWORKS_KERNEL_BIN:] = kernel
+    return buf
+
+
+def main():
+    import argparse
+    from cache import atomic_write
+
+    parser = argparse.ArgumentParser(description='Generate synthetic Drobo firmware images')
+    parser.add_argument('kind', choices=['secondary', 'tdf'])
+    parser.add_argument('output')
+    parser.add_argument('--size-mb', type=float, default=None,
+                        help=f'image size (default: {DEFAULT_SECONDARY_SIZE >> 20} MB secondary, '
+                             f'{DEFAULT_TDF_SIZE >> 20} MB tdf)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--patched', action='store_true', help='plant 32TB limits instead of 2TB')
+    args = parser.parse_args()
+
+    try:
+        if args.kind == 'secondary':
+            size = int(args.size_mb * 1024 * 1024) if args.size_mb else DEFAULT_SECONDARY_SIZE
+            image = build_secondary_elf(size, args.seed, args.patched)
+        else:
+            size = int(args.size_mb * 1024 * 1024) if args.size_mb else DEFAULT_TDF_SIZE
+            image = build_tdf(size, args.seed, args.patched)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    atomic_write(args.output, image)
+    print(f"Wrote {len(image):,} byte synthetic {args.kind} image to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 TDF Repacker
+======================
+
+Builds a new .tdf container from an original one and patched components
+(e.g. a secondary.elf edited by capacity_patcher.py). The TDIH header is
+modelled field by field and written back byte for byte; every component the
+patch did not touch is streamed straight from the original container with
+copy_file_range (see stream_copy.py), so only the replaced components pass
+through Python at all.
+
+Component offsets are fixed by the firmware (see FirmwareComponents), so a
+replacement must fit its slot; a shorter one is padded with zeros, as the
+manual rebuild in the top-level README did.
+
+The TDIH header has no checksum field known so far, so the container
+checksum is kept next to it: `<container>.crc32` records the CRC-32 of the
+whole container and of each component. `repack` computes it in one pass the
+first time it sees a container; after that the CRC-32 of a repacked
+container is derived from the original one and the CRC-32s of the replaced
+bytes alone (CRC-32 is affine over GF(2)), without rereading the unchanged
+components. `info` and `verify` never write it; `verify` recomputes
+everything from scratch.
+
+Usage:
+    python3 tdf_repack.py info <container.tdf>
+    python3 tdf_repack.py repack <container.tdf> <output.tdf> NAME=FILE [NAME=FILE ...]
+    python3 tdf_repack.py verify <container.tdf>
+
+Examples:
+    python3 tdf_repack.py info ../firmware/release.Drobo5D3.4-2-3.tdf
+    python3 tdf_repack.py repack ../firmware/release.Drobo5D3.4-2-3.tdf release.PATCHED.tdf \\
+        secondary.elf=../extracted/secondary.elf
+    python3 tdf_repack.py verify release.PATCHED.tdf
+"""
+
+import argparse
+import functools
+import json
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from collections import namedtuple
+from typing import Dict, List, Tuple
+
+CHECKSUM_VERSION = 1
+CHECKSUM_SUFFIX = '.crc32'
+
+# Reflected CRC-32 polynomial used by zlib
+CRC32_POLY = 0xEDB88320
+
+HEADER_FORMAT = '<II4sI16s16s32s'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+TDIH_MAGIC = b'TDIH'
+
+TdfComponent = namedtuple('TdfComponent', ['name', 'offset', 'size'])
+
+
+class TdihHeader(namedtuple('TdihHeader', [
+        'payload_offset', 'unknown1', 'magic', 'identifier', 'target', 'unknown2', 'firmware', 'extra'])):
+    """TDIH container header, everything up to the first component
+
+    payload_offset  offset of the first component (0x22C)
+    unknown1        u32 at 0x04
+    magic           b'TDIH'
+    identifier      u32 at 0x0C
+    target          NUL-padded target name, e.g. "Drobo5D3"
+    unknown2        16 bytes at 0x20
+    firmware        NUL-padded firmware string at 0x30, e.g. "Drobo5D3 4.2.3 build"
+    extra           remaining header bytes up to payload_offset, kept verbatim
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def parse(cls, data) -> 'TdihHeader':
+        if len(data) < HEADER_SIZE:
+            raise ValueError(f"TDIH header needs {HEADER_SIZE} bytes, got {len(data)}")
+        fields = struct.unpack_from(HEADER_FORMAT, data, 0)
+        if fields[2] != TDIH_MAGIC:
+            raise ValueError(f"Not a TDIH container (magic {fields[2]!r})")
+        payload_offset = fields[0]
+        if payload_offset < HEADER_SIZE:
+            raise ValueError(f"TDIH payload offset 0x{payload_offset:x} overlaps the header")
+        if len(data) < payload_offset:
+            raise ValueError(f"TDIH header needs {payload_offset} bytes, got {len(data)}")
+        return cls(*fields, bytes(data[HEADER_SIZE:payload_offset]))
+
+    def pack(self) -> bytes:
+        return struct.pack(HEADER_FORMAT, *self[:-1]) + self.extra
+
+    @property
+    def target_name(self) -> str:
+        return self.target.split(b'\x00', 1)[0].decode('ascii', errors='ignore')
+
+    @property
+    def firmware_string(self) -> str:
+        return self.firmware.split(b'\x00', 1)[0].decode('ascii', errors='ignore')
+
+
+def read_header(image) -> TdihHeader:
+    """TDIH header of a container image"""
+    payload_offset = image.u32(0) if len(image) >= 4 else 0
+    return TdihHeader.parse(image.read(0, min(len(image), max(payload_offset, HEADER_SIZE))))
+
+
+def container_components(image, header: TdihHeader) -> List[TdfComponent]:
+    """Components of a container, each ending where the next starts
+
+    Offsets come from the offset set matching the header's firmware version.
+    """
+    from offsets import OffsetRegistry
+
+    entries = OffsetRegistry.default().for_image(image).components()
+    if not entries:
+        raise ValueError("No TDF component offsets for this firmware version")
+    if entries[0][1] != header.payload_offset:
+        raise ValueError(f"TDIH payload offset 0x{header.payload_offset:x} does not match "
+                         f"{entries[0][0]} at 0x{entries[0][1]:x}")
+    if entries[-1][1] >= len(image):
+        raise ValueError(f"Container ends before {entries[-1][0]} at 0x{entries[-1][1]:x}")
+    ends = [offset for _, offset in entries[1:]] + [len(image)]
+    return [TdfComponent(name, offset, end - offset) for (name, offset), end in zip(entries, ends)]
+
+
+# CRC-32 arithmetic over GF(2), after zlib's crc32_combine: polynomials are
+# reflected, so bit 31 is x^0
+
+def _multmodp(a: int, b: int) -> int:
+    """a * b modulo the CRC-32 polynomial"""
+    m = 1 << 31
+    product = 0
+    while True:
+        if a & m:
+            product ^= b
+            if not a & (m - 1):
+                return product
+        m >>= 1
+        b = (b >> 1) ^ CRC32_POLY if b & 1 else b >> 1
+
+
+def _x2n_table() -> List[int]:
+    table = [1 << 30]                 # x^1
+    for _ in range(31):
+        table.append(_multmodp(table[-1], table[-1]))
+    return table
+
+
+_X2N = _x2n_table()
+
+
+def _x8nmodp(length: int) -> int:
+    """x^(8 * length) modulo the CRC-32 polynomial: the effect of length zero bytes"""
+    p = 1 << 31                       # x^0
+    k = 3
+    while length:
+        if length & 1:
+            p = _multmodp(_X2N[k & 31], p)
+        length >>= 1
+        k += 1
+    return p
+
+
+def crc32_combine(crc1: int, crc2: int, length2: int) -> int:
+    """CRC-32 of A + B from the CRC-32s of A and B and the length of B"""
+    return _multmodp(_x8nmodp(length2), crc1) ^ crc2
+
+
+@functools.lru_cache(maxsize=None)
+def crc32_zeros(length: int) -> int:
+    """CRC-32 of length zero bytes, without hashing them"""
+    return _multmodp(_x8nmodp(length), 0xFFFFFFFF) ^ 0xFFFFFFFF
+
+
+def crc32_splice(crc: int, length: int, offset: int, size: int, old_crc: int, new_crc: int) -> int:
+    """CRC-32 of a length-byte message after its size bytes at offset change
+
+    old_crc and new_crc are the CRC-32s of the old and new bytes. For
+    equal-length messages crc(a ^ b ^ c) == crc(a) ^ crc(b) ^ crc(c), so the
+    change is the CRC-32 of old ^ new, zero-extended to the whole message.
+    """
+    delta = old_crc ^ new_crc ^ crc32_zeros(size)
+    tail = length - offset - size
+    delta = crc32_combine(crc32_combine(crc32_zeros(offset), delta, size), crc32_zeros(tail), tail)
+    return crc ^ delta ^ crc32_zeros(length)
+
+
+def checksum_path(filename: str) -> str:
+    return filename + CHECKSUM_SUFFIX
+
+
+def compute_checksums(image, header: TdihHeader, components: List[TdfComponent]) -> Dict:
+    """Container and per-component CRC-32s in one pass over the image"""
+    crc = zlib.crc32(header.pack())
+    entries = []
+    for component in components:
+        view = image.view(component.offset, component.size)
+        try:
+            component_crc = zlib.crc32(view)
+        finally:
+            view.release()
+        crc = crc32_combine(crc, component_crc, component.size)
+        entries.append(dict(component._asdict(), crc32=component_crc))
+    return {'size': len(image), 'crc32': crc, 'components': entries}
+
+
+def load_checksums(filename: str):
+    """Recorded checksums of a container, None if missing or stale"""
+    try:
+        with open(checksum_path(filename), 'r') as f:
+            payload = json.load(f)
+        stat = os.stat(filename)
+    except (OSError, ValueError):
+        return None
+    if (payload.get('version') != CHECKSUM_VERSION or payload.get('size') != stat.st_size
+            or payload.get('mtime_ns') != stat.st_mtime_ns):
+        return None
+    return payload
+
+
+def save_checksums(filename: str, checksums: Dict):
+    from cache import atomic_write
+
+    stat = os.stat(filename)
+    payload = dict(checksums, version=CHECKSUM_VERSION, mtime_ns=stat.st_mtime_ns)
+    atomic_write(checksum_path(filename), json.dumps(payload, indent=2).encode('utf-8'))
+
+
+def container_checksums(filename: str, image, header: TdihHeader, components: List[TdfComponent],
+                        record: bool = False) -> Dict:
+    """Recorded checksums of a container, computing them if needed
+
+    With record, freshly computed checksums are saved for the next repack.
+    """
+    checksums = load_checksums(filename)
+    if checksums is None or [tuple(c[f] for f in TdfComponent._fields) for c in checksums['components']] != components:
+        checksums = compute_checksums(image, header, components)
+        if record:
+            try:
+                save_checksums(filename, checksums)
+            except OSError:
+                pass    # e.g. a read-only firmware directory; recomputed next time
+    return checksums
+
+
+def _component_name(key: str, components: List[TdfComponent]) -> str:
+    """Component named by key: its offsets-data name or its extracted file name"""
+    name = key.replace('.', '_')
+    if name not in {component.name for component in components}:
+        known = ', '.join(component.name for component in components)
+        raise ValueError(f"Unknown component '{key}' (known: {known})")
+    return name
+
+
+def repack(container: str, output: str, replacements: Dict[str, str]) -> Tuple[Dict, List[Tuple[TdfComponent, str]]]:
+    """Write output as container with some components replaced by files
+
+    Returns the output's checksums and (component, source) of each component,
+    source being the replacement path or None if streamed from the container.
+    """
+    from firmware_image import FirmwareImage
+    from cache import fsync_directory, new_file_mode
+    from stream_copy import copy_range
+    from tracing import span
+
+    with span('tdf_repack', file=container) as stage, FirmwareImage(container) as image:
+        header = read_header(image)
+        components = container_components(image, header)
+        sources = {_component_name(key, components): path for key, path in replacements.items()}
+        for component in components:
+            if component.name in sources:
+                size = os.path.getsize(sources[component.name])
+                if size > component.size:
+                    raise ValueError(f"{sources[component.name]} is {size:,} bytes, "
+                                     f"{component.name} has room for {component.size:,}")
+
+        with span('tdf_repack:checksums'):
+            checksums = container_checksums(container, image, header, components, record=True)
+
+        directory = os.path.dirname(os.path.abspath(output))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            os.fchmod(fd, new_file_mode(output))
+            os.write(fd, header.pack())
+            crc = checksums['crc32']
+            entries = []
+            for component, entry in zip(components, checksums['components']):
+                source = sources.get(component.name)
+                if source is None:
+                    with span(f"tdf_repack:{component.name}", source='container') as copy:
+                        copy.add_bytes(copy_range(image.fileno(), fd, component.offset, component.size))
+                    entries.append(entry)
+                    continue
+                with span(f"tdf_repack:{component.name}", source=source) as copy, \
+                        FirmwareImage(source) as replacement:
+                    size = len(replacement)
+                    if copy_range(replacement.fileno(), fd, 0, size) != size:
+                        raise ValueError(f"{source} changed while being copied")
+                    # Zero padding up to the next component, left as a hole
+                    end = os.lseek(fd, 0, os.SEEK_CUR) + component.size - size
+                    os.ftruncate(fd, end)
+                    os.lseek(fd, end, os.SEEK_SET)
+                    new_crc = crc32_combine(zlib.crc32(replacement.data), crc32_zeros(component.size - size),
+                                            component.size - size)
+                    copy.add_bytes(size)
+                crc = crc32_splice(crc, len(image), component.offset, component.size, entry['crc32'], new_crc)
+                entries.append(dict(entry, crc32=new_crc))
+            os.fsync(fd)
+            os.close(fd)
+            fd = None
+            os.replace(tmp_path, output)
+        except BaseException:
+            if fd is not None:
+                os.close(fd)
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        fsync_directory(directory)
+        stage.add_bytes(len(image))
+
+    checksums = {'size': checksums['size'], 'crc32': crc, 'components': entries}
+    save_checksums(output, checksums)
+    return checksums, [(component, sources.get(component.name)) for component in components]
+
+
+def print_container(header: TdihHeader, checksums: Dict):
+    print("TDIH Header:")
+    print(f"  Payload offset: 0x{header.payload_offset:x}")
+    print(f"  Unknown1:       0x{header.unknown1:x}")
+    print(f"  Identifier:     0x{header.identifier:x}")
+    print(f"  Target:         {header.target_name}")
+    print(f"  Unknown2:       {header.unknown2.hex()}")
+    print(f"  Firmware:       {header.firmware_string}")
+    print(f"  Extra:          {len(header.extra)} bytes")
+    print(f"\nComponents ({checksums['size']:,} bytes, CRC-32 {checksums['crc32']:08x}):")
+    for entry in checksums['components']:
+        print(f"  {entry['name']:<20} 0x{entry['offset']:08x} {entry['size']:>12,}  {entry['crc32']:08x}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Repack a TDF container with patched components')
+    commands = parser.add_subparsers(dest='command', required=True)
+    info = commands.add_parser('info', help='show the header, components and checksums')
+    info.add_argument('container')
+    pack = commands.add_parser('repack', help='write a container with replaced components')
+    pack.add_argument('container')
+    pack.add_argument('output')
+    pack.add_argument('replacements', nargs='+', metavar='NAME=FILE',
+                      help='component (e.g. secondary_elf or secondary.elf) and its replacement file')
+    verify = commands.add_parser('verify', help='recompute the checksums and compare with the recorded ones')
+    verify.add_argument('container')
+    args = parser.parse_args()
+
+    from firmware_image import FirmwareImage
+
+    try:
+        if args.command == 'repack':
+            replacements = {}
+            for item in args.replacements:
+                name, sep, path = item.partition('=')
+                if not sep or not name or not path:
+                    raise ValueError(f"Expected NAME=FILE, got '{item}'")
+                replacements[name] = path
+            if os.path.abspath(args.output) == os.path.abspath(args.container):
+                raise ValueError("Output must differ from the original container")
+            checksums, sources = repack(args.container, args.output, replacements)
+            for component, source in sources:
+                print(f"  {component.name:<20} 0x{component.offset:08x} {component.size:>12,}  "
+                      f"{'<- ' + source if source else 'unchanged'}")
+            print(f"✓ Wrote {args.output}: {checksums['size']:,} bytes, CRC-32 {checksums['crc32']:08x}")
+            return
+
+        with FirmwareImage(args.container) as image:
+            header = read_header(image)
+            components = container_components(image, header)
+            if args.command == 'info':
+                print_container(header, container_checksums(args.container, image, header, components))
+                return
+            recorded = load_checksums(args.container)
+            actual = compute_checksums(image, header, components)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if recorded is None:
+        print(f"No current checksums recorded for {args.container}; computed CRC-32 {actual['crc32']:08x}")
+        sys.exit(1)
+    mismatched = [entry['name'] for entry, expected in zip(actual['components'], recorded['components'])
+                  if entry['crc32'] != expected['crc32']]
+    if actual['crc32'] != recorded['crc32'] or mismatched:
+        print(f"✗ CRC-32 {actual['crc32']:08x}, recorded {recorded['crc32']:08x}"
+              f"{' (' + ', '.join(mismatched) + ')' if mismatched else ''}")
+        sys.exit(1)
+    print(f"✓ CRC-32 {actual['crc32']:08x} matches for the container and {len(actual['components'])} components")
+
+
+if __name__ == "__main__":
+    main()
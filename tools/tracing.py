@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Stage Tracing
+=======================
+
+Lightweight spans around the stages of a run (extraction, scanning,
+patching, ...). Each span records wall time, bytes processed and the read
+and write syscalls issued while it was open (from /proc/self/io on Linux).
+Spans export as Chrome trace-event JSON, viewable in chrome://tracing or
+https://ui.perfetto.dev, with nested stages shown as nested slices.
+
+Tracing is off unless DROBO_TRACE names an output file (or enable() is
+called, e.g. by `drobo.py --trace FILE`). When off, span() returns a shared
+no-op object and nothing is recorded or timed. Spans recorded in batch
+worker processes are shipped back with each result and merged into the
+parent's trace; only the process DROBO_TRACE was set for writes the file
+(DROBO_TRACE_PID marks it for the processes it starts).
+
+Environment Variables:
+    DROBO_TRACE - Chrome trace JSON written here at exit (enables tracing)
+
+Usage:
+    from tracing import span
+
+    with span('extract', file=filename) as stage:
+        stage.add_bytes(extract_range(...))
+
+    python3 tracing.py <trace.json>
+
+Examples:
+    DROBO_TRACE=trace.json python3 firmware_analyzer.py --batch /data/dumps -j 8
+    python3 tracing.py trace.json
+"""
+
+import os
+import sys
+import time
+
+_IO_STATS = '/proc/self/io'
+
+# Set alongside DROBO_TRACE to the pid of the process that writes the trace
+TRACE_OWNER_ENV = 'DROBO_TRACE_PID'
+
+# Active tracer, None while tracing is disabled
+_tracer = None
+
+
+def _io_counters():
+    """(read syscalls, write syscalls, bytes read, bytes written) so far, None if unavailable"""
+    try:
+        with open(_IO_STATS, 'rb') as f:
+            fields = dict(line.split(b':') for line in f.read().splitlines())
+    except (OSError, ValueError):
+        return None
+    return (int(fields[b'syscr']), int(fields[b'syscw']), int(fields[b'rchar']), int(fields[b'wchar']))
+
+
+class _NullSpan:
+    """Stand-in returned by span() while tracing is disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def add_bytes(self, count: int):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """One timed stage; becomes a Chrome "complete" (ph=X) event when closed"""
+
+    __slots__ = ('tracer', 'name', 'args', 'bytes', '_start', '_io')
+
+    def __init__(self, tracer, name: str, args: dict):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.bytes = 0
+
+    def __enter__(self):
+        self._io = _io_counters()
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter_ns()
+        args = dict(self.args)
+        if self.bytes:
+            args['bytes'] = self.bytes
+            seconds = (end - self._start) / 1e9
+            if seconds > 0:
+                args['mb_per_s'] = round(self.bytes / (1024 * 1024) / seconds, 1)
+        io = _io_counters()
+        if self._io is not None and io is not None:
+            # Less the reads of /proc/self/io done by the span itself
+            delta = [max(0, now - then - own) for now, then, own in zip(io, self._io, self.tracer.io_overhead)]
+            args['read_syscalls'], args['write_syscalls'], args['read_bytes'], args['write_bytes'] = delta
+        if exc_type is not None:
+            args['error'] = exc_type.__name__
+        self.tracer.record({
+            'name': self.name,
+            'cat': self.name.split(':', 1)[0],
+            'ph': 'X',
+            # perf_counter is system-wide monotonic, so worker spans line up
+            'ts': self._start / 1000.0,
+            'dur': (end - self._start) / 1000.0,
+            'pid': os.getpid(),
+            'tid': self.tracer.thread_id(),
+            'args': args,
+        })
+        return False
+
+    def add_bytes(self, count: int):
+        """Count bytes processed by this stage (for throughput in the trace)"""
+        self.bytes += count
+
+
+class Tracer:
+    """Collects finished spans of this process"""
+
+    def __init__(self, output: str = None):
+        # threading is only imported once tracing is on
+        import threading
+        self.output = output
+        self.pid = os.getpid()
+        self.events = []
+        self.thread_id = threading.get_native_id
+        self._lock = threading.Lock()
+        first, second = _io_counters(), _io_counters()
+        self.io_overhead = tuple(b - a for a, b in zip(first, second)) if first and second else (0, 0, 0, 0)
+
+    def record(self, event: dict):
+        with self._lock:
+            self.events.append(event)
+
+    def take(self):
+        """Remove and return the recorded events"""
+        with self._lock:
+            events, self.events = self.events, []
+        return events
+
+    def document(self) -> dict:
+        names = {}
+        for event in self.events:
+            names.setdefault(event['pid'], os.path.basename(sys.argv[0]) if event['pid'] == os.getpid()
+                             else 'worker')
+        metadata = [
+            {'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0, 'args': {'name': f"{name} ({pid})"}}
+            for pid, name in names.items()
+        ]
+        return {'traceEvents': metadata + sorted(self.events, key=lambda e: e['ts']),
+                'displayTimeUnit': 'ms'}
+
+    def export(self, path: str = None):
+        """Write the Chrome trace JSON to path (default: the tracer's output)"""
+        import json
+        from cache import atomic_write
+
+        path = path or self.output
+        # A forked worker inherits the parent's tracer; only the parent writes
+        if not path or os.getpid() != self.pid:
+            return
+        atomic_write(path, json.dumps(self.document()).encode('utf-8'))
+        print(f"Trace: {len(self.events)} spans written to {path}", file=sys.stderr)
+
+
+def enable(output: str = None) -> Tracer:
+    """Start tracing this process; the trace is written to output at exit"""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(output)
+        if output:
+            import atexit
+            atexit.register(_tracer.export)
+    elif output and not _tracer.output:
+        import atexit
+        _tracer.output = output
+        atexit.register(_tracer.export)
+    return _tracer
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def span(name: str, **args):
+    """Context manager timing a stage; a shared no-op while tracing is disabled"""
+    if _tracer is None:
+        return _NULL_SPAN
+    return Span(_tracer, name, args)
+
+
+def call_collecting(func, item):
+    """Run func(item) in a worker, returning (result, spans recorded meanwhile)
+
+    Used by batch.run_parallel so worker spans reach the parent's trace.
+    """
+    tracer = enable()
+    tracer.take()
+    result = func(item)
+    return result, tracer.take()
+
+
+def merge(events):
+    """Add spans recorded in another process"""
+    if _tracer is not None and events:
+        for event in events:
+            _tracer.record(event)
+
+
+def summarize(events):
+    """Total time, bytes and syscalls per span name, slowest first"""
+    totals = {}
+    for event in events:
+        if event.get('ph') != 'X':
+            continue
+        entry = totals.setdefault(event['name'], {'count': 0, 'ms': 0.0, 'bytes': 0, 'syscalls': 0})
+        args = event.get('args', {})
+        entry['count'] += 1
+        entry['ms'] += event['dur'] / 1000.0
+        entry['bytes'] += args.get('bytes', 0)
+        entry['syscalls'] += args.get('read_syscalls', 0) + args.get('write_syscalls', 0)
+    return sorted(totals.items(), key=lambda item: -item[1]['ms'])
+
+
+if os.environ.get('DROBO_TRACE'):
+    # Only the process DROBO_TRACE was set for writes the file: worker
+    # processes inherit the variable, and their spans reach the parent
+    # through call_collecting instead
+    if os.environ.setdefault(TRACE_OWNER_ENV, str(os.getpid())) == str(os.getpid()):
+        enable(os.environ['DROBO_TRACE'])
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python3 tracing.py <trace.json>")
+        print("Examples:")
+        print("  DROBO_TRACE=trace.json python3 firmware_analyzer.py ../extracted/secondary.elf")
+        print("  python3 tracing.py trace.json")
+        sys.exit(1)
+
+    import json
+    with open(sys.argv[1], 'r') as f:
+        events = json.load(f).get('traceEvents', [])
+
+    print(f"{'stage':<32} {'count':>6} {'total ms':>10} {'MB':>9} {'syscalls':>9}")
+    for name, entry in summarize(events):
+        print(f"{name:<32} {entry['count']:>6} {entry['ms']:>10.1f} "
+              f"{entry['bytes'] / (1024 * 1024):>9.1f} {entry['syscalls']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Drobo 5D3 Offline String Cross-Reference Index
+==============================================
+
+Pure-Python replacement for the Ghidra `find_functions_by_string` pass.
+Scans secondary.elf for code and data that point at the string table and
+caches a string -> referencing-offset index keyed by image SHA-256, so the
+JBOD/passthrough analysis targets can be triaged without starting Ghidra.
+
+Reference kinds:
+    literal     32-bit literal-pool word holding a string address
+    ldr         ARM LDR Rd, [PC, #imm] loading a string address
+    adr         ARM ADR (ADD/SUB Rd, PC, #imm) producing a string address
+    thumb-ldr   Thumb LDR Rd, [PC, #imm] (16-bit and 32-bit encodings)
+    thumb-adr   Thumb ADR Rd, PC, #imm
+
+Environment Variables:
+    DROBO_CACHE_PATH - Cache root directory (default: ~/.cache/drobo-fw)
+
+Usage:
+    python3 xref_index.py <firmware_file> find <text>
+    python3 xref_index.py <firmware_file> triage [analysis_targets.json]
+
+Examples:
+    python3 xref_index.py secondary.elf find bypassLocks
+    python3 xref_index.py secondary.elf triage
+"""
+
+import bisect
+import json
+import os
+import struct
+import sys
+from array import array
+from collections import namedtuple
+from typing import Dict, List, Tuple
+from cache import atomic_write, cache_path
+from elf_parser import ElfFile, Segment, PT_LOAD, PF_X
+from string_index import StringIndex
+
+XREF_INDEX_VERSION = 1
+
+DEFAULT_TARGETS_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'docs', 'analysis', 'analysis_targets.json'
+)
+
+Xref = namedtuple('Xref', ['offset', 'address', 'kind'])
+
+
+def load_segments(image) -> List[Segment]:
+    """Loadable segments of an ELF image, or one flat segment for raw images"""
+    if not image.is_elf():
+        return [Segment(PT_LOAD, 0, 0, 0, len(image), len(image), PF_X, 1)]
+    return ElfFile.from_image(image).loadable_segments()
+
+
+def _code_units(image, start: int, count: int, fmt: str):
+    """Little-endian u32/u16 sequence over an image range without copying
+
+    Falls back to a byte-swapped array copy on big-endian hosts.
+    """
+    view = image.view(start, count * struct.calcsize(fmt))
+    if sys.byteorder == 'little':
+        return view.cast(fmt)
+    units = array(fmt, view)
+    view.release()
+    units.byteswap()
+    return units
+
+
+def _arm_immediate(word: int) -> int:
+    """Decode an ARM data-processing rotated immediate"""
+    rotate = ((word >> 8) & 0xF) * 2
+    imm8 = word & 0xFF
+    return ((imm8 >> rotate) | (imm8 << (32 - rotate))) & 0xFFFFFFFF
+
+
+class _AddressMap:
+    """Virtual address -> file offset translation over loadable segments"""
+
+    def __init__(self, segments: List[Segment]):
+        self._segments = sorted(segments, key=lambda s: s.vaddr)
+        self._starts = [s.vaddr for s in self._segments]
+        self.low = min(s.vaddr for s in segments)
+        self.high = max(s.vaddr + s.filesz for s in segments)
+
+    def to_offset(self, address: int) -> int:
+        i = bisect.bisect_right(self._starts, address) - 1
+        if i < 0:
+            return -1
+        segment = self._segments[i]
+        if address >= segment.vaddr + segment.filesz:
+            return -1
+        return segment.offset + address - segment.vaddr
+
+
+class XrefIndex:
+    """String -> referencing offsets for one image"""
+
+    def __init__(self, refs: Dict[int, List[Xref]], strings: StringIndex):
+        self.refs = refs
+        self.strings = strings
+
+    def close(self):
+        self.strings.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def refs_to(self, string_offset: int) -> List[Xref]:
+        """References to the string starting at an image offset"""
+        return self.refs.get(string_offset, [])
+
+    def search(self, text: str) -> List[Tuple[int, str, List[Xref]]]:
+        """(string offset, string, refs) for every string containing text"""
+        results = []
+        seen = set()
+        for match_offset, _ in self.strings.substring(text):
+            start, string = self.strings.string_at(match_offset)
+            if start in seen:
+                continue
+            seen.add(start)
+            results.append((start, string, self.refs_to(start)))
+        return results
+
+    @classmethod
+    def build(cls, image, strings: StringIndex) -> 'XrefIndex':
+        """Scan literal pools and PC-relative encodings for string pointers"""
+        segments = load_segments(image)
+        addresses = _AddressMap(segments)
+        data = image.data
+        refs = {}
+
+        def string_start(address):
+            """Image offset of the string an address points into, or -1"""
+            if not addresses.low <= address < addresses.high:
+                return -1
+            offset = addresses.to_offset(address)
+            if offset < 0:
+                return -1
+            found = strings.string_at(offset)
+            return found[0] if found else -1
+
+        def word_at(address):
+            offset = addresses.to_offset(address)
+            if offset < 0 or offset + 4 > len(image):
+                return None
+            return struct.unpack_from('<I', data, offset)[0]
+
+        def add(string_offset, ref_offset, ref_address, kind):
+            refs.setdefault(string_offset, []).append(Xref(ref_offset, ref_address, kind))
+
+        low, high = addresses.low, addresses.high
+        for segment in segments:
+            # Word-aligned pass: literal pools and ARM-mode instructions
+            skew = (-segment.vaddr) % 4
+            start = segment.offset + skew
+            count = (segment.filesz - skew) // 4
+            words = _code_units(image, start, count, 'I')
+            base = segment.vaddr + skew
+            for i, word in enumerate(words):
+                if low <= word < high:
+                    target = string_start(word)
+                    if target >= 0:
+                        add(target, start + i * 4, base + i * 4, 'literal')
+                if not segment.executable:
+                    continue
+                if (word & 0x0F7F0000) == 0x051F0000:
+                    pc = base + i * 4 + 8
+                    literal = pc + (word & 0xFFF) if word & 0x00800000 else pc - (word & 0xFFF)
+                    value = word_at(literal)
+                    if value is not None:
+                        target = string_start(value)
+                        if target >= 0:
+                            add(target, start + i * 4, base + i * 4, 'ldr')
+                elif (word & 0x0FFF0000) in (0x028F0000, 0x024F0000):
+                    pc = base + i * 4 + 8
+                    imm = _arm_immediate(word)
+                    address = pc + imm if (word & 0x0FFF0000) == 0x028F0000 else pc - imm
+                    target = string_start(address & 0xFFFFFFFF)
+                    if target >= 0:
+                        add(target, start + i * 4, base + i * 4, 'adr')
+            if isinstance(words, memoryview):
+                words.release()
+
+            if not segment.executable:
+                continue
+
+            # Halfword-aligned pass: Thumb PC-relative loads and ADR
+            skew = segment.vaddr % 2
+            start = segment.offset + skew
+            count = (segment.filesz - skew) // 2
+            halves = _code_units(image, start, count, 'H')
+            base = segment.vaddr + skew
+            for i, half in enumerate(halves):
+                top = half & 0xF800
+                if top == 0x4800 or top == 0xA000:
+                    address = ((base + i * 2 + 4) & ~3) + (half & 0xFF) * 4
+                    if top == 0x4800:
+                        value = word_at(address)
+                        if value is None:
+                            continue
+                        target = string_start(value)
+                        kind = 'thumb-ldr'
+                    else:
+                        target = string_start(address)
+                        kind = 'thumb-adr'
+                    if target >= 0:
+                        add(target, start + i * 2, base + i * 2, kind)
+                elif (half & 0xFF7F) == 0xF85F and i + 1 < count:
+                    imm12 = halves[i + 1] & 0xFFF
+                    pc = (base + i * 2 + 4) & ~3
+                    address = pc + imm12 if half & 0x0080 else pc - imm12
+                    value = word_at(address)
+                    if value is None:
+                        continue
+                    target = string_start(value)
+                    if target >= 0:
+                        add(target, start + i * 2, base + i * 2, 'thumb-ldr')
+            if isinstance(halves, memoryview):
+                halves.release()
+
+        return cls(refs, strings)
+
+    def save(self, path: str, sha256: str):
+        payload = {
+            'version': XREF_INDEX_VERSION,
+            'image_sha256': sha256,
+            'refs': {
+                f"0x{offset:x}": [[f"0x{r.offset:x}", f"0x{r.address:x}", r.kind] for r in refs]
+                for offset, refs in sorted(self.refs.items())
+            },
+        }
+        atomic_write(path, json.dumps(payload).encode('utf-8'))
+
+    @classmethod
+    def load(cls, path: str, strings: StringIndex) -> 'XrefIndex':
+        with open(path, 'r') as f:
+            payload = json.load(f)
+        if payload.get('version') != XREF_INDEX_VERSION:
+            raise ValueError(f"Stale cross-reference index: {path}")
+        refs = {
+            int(offset, 16): [Xref(int(o, 16), int(a, 16), kind) for o, a, kind in entries]
+            for offset, entries in payload['refs'].items()
+        }
+        return cls(refs, strings)
+
+    @classmethod
+    def for_image(cls, image) -> 'XrefIndex':
+        """Load the cached index for an image, building it on first use"""
+        strings = StringIndex.for_image(image)
+        path = cache_path('xrefs', f"{image.sha256()}.json")
+        if os.path.exists(path):
+            try:
+                return cls.load(path, strings)
+            except (ValueError, KeyError):
+                pass
+        index = cls.build(image, strings)
+        index.save(path, image.sha256())
+        return index
+
+
+def load_analysis_targets(path: str = DEFAULT_TARGETS_PATH) -> Dict:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def triage_targets(index: XrefIndex, targets: Dict):
+    """Print reference counts for every string/function name in ANALYSIS_TARGETS"""
+    for category, details in targets.items():
+        print(f"\n{category} [{details.get('priority', '?')}]")
+        print("-" * 40)
+        for term in details.get('strings', []) + details.get('functions', []):
+            matches = index.search(term)
+            ref_count = sum(len(refs) for _, _, refs in matches)
+            print(f"  {term!r}: {len(matches)} strings, {ref_count} refs")
+            for start, _, refs in matches[:3]:
+                sites = ', '.join(f"0x{r.address:08x}({r.kind})" for r in refs[:4])
+                print(f"    0x{start:08x} <- {sites or 'no references'}")
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: python3 xref_index.py <firmware_file> find <text>")
+        print("       python3 xref_index.py <firmware_file> triage [analysis_targets.json]")
+        print("Examples:")
+        print("  python3 xref_index.py secondary.elf find bypassLocks")
+        print("  python3 xref_index.py secondary.elf triage")
+        sys.exit(1)
+
+    from firmware_image import FirmwareImage
+
+    filename, command = sys.argv[1], sys.argv[2]
+
+    with FirmwareImage(filename) as image:
+        index = XrefIndex.for_image(image)
+
+    with index:
+        try:
+            if command == 'find' and len(sys.argv) > 3:
+                for start, string, refs in index.search(sys.argv[3]):
+                    print(f"0x{start:08x}  {string}")
+                    for ref in refs:
+                        print(f"    <- 0x{ref.address:08x} (file 0x{ref.offset:08x}, {ref.kind})")
+            elif command == 'triage':
+                targets_path = sys.argv[3] if len(sys.argv) > 3 else DEFAULT_TARGETS_PATH
+                triage_targets(index, load_analysis_targets(targets_path))
+            else:
+                print(f"Error: Unknown command '{command}'")
+                sys.exit(1)
+            sys.stdout.flush()
+        except BrokenPipeError:
+            # Point stdout at devnull so the flush at interpreter exit stays quiet
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()